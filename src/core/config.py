@@ -13,6 +13,9 @@ class Settings(BaseSettings):
     deepseek_api_key: Optional[str] = None
     deepseek_base_url: str = "https://api.deepseek.com"
     deepseek_model: str = "deepseek-chat"
+    deepseek_timeout: float = 60.0  # 单次调用超时（秒）
+    deepseek_max_retries: int = 3  # 异步客户端最大重试次数
+    deepseek_max_concurrency: int = 16  # 异步客户端最大并发请求数
     
     # 向量数据库配置
     milvus_host: str = "localhost"
@@ -22,15 +25,52 @@ class Settings(BaseSettings):
     qdrant_port: int = 6333
     
     chroma_persist_directory: str = "./chroma_db"
+    chroma_async_workers: int = 4  # Chroma 异步接口使用的线程数
+    
+    numpy_store_directory: str = "./numpy_store"  # NumPy 向量库（进程内暴力检索）的存储目录
+    numpy_search_block_rows: int = 65536  # 暴力检索时每次矩阵乘的向量行数
+    
+    # IVF-PQ 向量库配置（存储目录同 numpy_store_directory）
+    ivfpq_nlist: int = 1024  # 粗聚类数（训练样本不足时按每个聚类 32 个样本减少）
+    ivfpq_m: int = 32  # PQ 子空间数，即每个向量的编码字节数，需整除向量维度
+    ivfpq_nprobe: int = 16  # 每个查询扫描的聚类数
+    ivfpq_train_size: int = 65536  # 训练样本数
+    ivfpq_train_min_rows: int = 10000  # 有效行达到该数量时自动训练，0 表示只手动调用 train()
+    ivfpq_rerank_factor: int = 10  # 从磁盘全精度向量精排 top_k × 该倍数个候选，0 表示不精排
     
     # Embedding 配置
     embedding_model: str = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
     embedding_dimension: int = 768
+    query_embedding_cache_size: int = 10000  # 查询向量 LRU 缓存条目数，0 表示不缓存
+    query_embedding_cache_ttl: float = 3600.0  # 查询向量缓存有效期（秒），0 表示不过期
+    embedding_cache_dir: Optional[str] = None  # 文档向量的磁盘缓存目录，设置后重新索引时已见过的文本不再推理
+    embedding_cache_dtype: str = "float16"  # 磁盘缓存的存储精度：float16 / float32
+    embedding_token_budget: int = 8192  # 每批 padding 后的 token 数上限（按长度排序分批），0 表示按固定条数分批
+    embedding_num_workers: int = 1  # 批量编码的工作进程数，大于 1 时启用编码池（每个进程加载一份模型）
+    embedding_worker_threads: int = 0  # 每个工作进程的线程数（绑定同样数量的 CPU 核），0 表示按进程数平分
+    embedding_pool_min_texts: int = 256  # 少于该条数的编码请求在主进程中完成
+    embedding_backend: str = "torch"  # 推理后端：torch / onnx / onnx-int8（需安装 optimum[onnxruntime]）
+    embedding_onnx_dir: str = "./onnx_models"  # 导出的 ONNX 模型目录
+    embedding_onnx_quantization: str = "avx2"  # int8 量化的目标指令集：arm64 / avx2 / avx512 / avx512_vnni
+    embedding_batch_wait_ms: float = 0.0  # 并发查询微批合并的最长等待（毫秒），0 表示不合并（embedding 服务默认 2 毫秒）
+    embedding_batch_max_size: int = 64  # 每批最多合并的查询数
+    embedding_server_address: Optional[str] = None  # embedding 服务地址（Unix 套接字路径或 host:port），设置后引擎不在本进程加载模型
+    embedding_server_authkey: Optional[str] = None  # embedding 服务的连接认证密钥（使用服务时必填，服务端与客户端须一致）
+    embedding_server_allow_remote: bool = False  # 是否允许 embedding 服务监听非回环 TCP 地址（连接上传输 pickle 数据，仅限可信网络）
     
     # 检索配置
     top_k: int = 20
     final_top_k: int = 5
     
+    # 文档库配置（检索结果的内容在融合截断后从文档库中取回）
+    document_store_path: str = "./document_store.{collection}.db"  # {collection} 替换为向量库集合名；":memory:" 表示只保存在内存中
+    
+    # BM25 分词配置
+    bm25_analyzer: str = "bigram"  # char（逐字）/ bigram（中日韩二字切分）/ jieba（需安装 jieba）
+    bm25_stopwords_path: Optional[str] = None  # 停用词文件，每行一个词
+    bm25_tokenize_workers: int = 1  # 批量分词的进程数，1 表示不使用进程池，0 表示使用全部 CPU 核
+    bm25_num_shards: int = 1  # BM25 分片数，大于 1 时每个分片由一个工作进程持有并行打分
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,19 +1,51 @@
 """
-Pydantic 数据模型定义
+Pydantic 数据模型定义（以及检索热路径使用的轻量命中记录）
 """
-from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional, List
+import numpy as np
+from pydantic import BaseModel, Field, WithJsonSchema, field_serializer, field_validator
+from typing import Annotated, Dict, Any, Optional, List
 from datetime import datetime
 
 
+# 向量：连续的 float32 数组（JSON 中为数字列表）
+Embedding = Annotated[np.ndarray, WithJsonSchema({"type": "array", "items": {"type": "number"}})]
+
+
 class Document(BaseModel):
     """文档数据模型"""
     id: str = Field(..., description="文档唯一标识符")
     content: str = Field(..., description="文档文本内容")
-    embedding: Optional[List[float]] = Field(None, description="文档向量表示")
+    embedding: Optional[Embedding] = Field(None, description="文档向量表示")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="文档元数据")
     
+    @field_validator("embedding", mode="before")
+    @classmethod
+    def _as_float32(cls, value: Any) -> Optional[np.ndarray]:
+        """列表或其他精度的数组统一转为连续 float32 数组（已是则不复制），只接受一维向量"""
+        if value is None:
+            return None
+        array = np.asarray(value, dtype=np.float32)
+        if array.ndim != 1:
+            raise ValueError(f"embedding 必须是一维向量，实际形状为 {array.shape}")
+        return np.ascontiguousarray(array)
+    
+    @field_serializer("embedding")
+    def _serialize_embedding(self, value: Optional[np.ndarray]) -> Optional[List[float]]:
+        """序列化为 JSON 时转为列表"""
+        return None if value is None else value.tolist()
+    
+    def __eq__(self, other: Any) -> bool:
+        """按字段比较，embedding 逐元素比较（BaseModel 默认的比较对数组取真值会报错）"""
+        if not isinstance(other, Document):
+            return NotImplemented
+        if (self.id, self.content, self.metadata) != (other.id, other.content, other.metadata):
+            return False
+        if self.embedding is None or other.embedding is None:
+            return self.embedding is None and other.embedding is None
+        return np.array_equal(self.embedding, other.embedding)
+    
     class Config:
+        arbitrary_types_allowed = True
         json_schema_extra = {
             "example": {
                 "id": "doc_001",
@@ -47,6 +79,39 @@ class SearchResult(BaseModel):
         }
 
 
+class Hit:
+    """
+    检索命中的轻量表示（引擎内部使用）
+    
+    向量检索、RRF 融合和多查询合并阶段只传递 ID、分数和排名，不构造 pydantic 模型；
+    截断后从文档库补全内容时才转换为 SearchResult。
+    """
+    
+    __slots__ = ("id", "score", "rank")
+    
+    def __init__(self, id: str, score: float, rank: Optional[int] = None):
+        self.id = id
+        self.score = score
+        self.rank = rank
+    
+    @classmethod
+    def from_search_result(cls, result: "SearchResult") -> "Hit":
+        """从 SearchResult 取出 ID、分数和排名"""
+        return cls(result.document.id, result.score, result.rank)
+    
+    def to_search_result(self, document: Document) -> SearchResult:
+        """
+        转换为 SearchResult（document 已经过校验，不再重复校验）
+        
+        Args:
+            document: 补全内容后的文档
+        """
+        return SearchResult.model_construct(document=document, score=self.score, rank=self.rank)
+    
+    def __repr__(self) -> str:
+        return f"Hit(id={self.id!r}, score={self.score!r}, rank={self.rank!r})"
+
+
 class QueryRequest(BaseModel):
     """查询请求模型"""
     query: str = Field(..., description="用户查询文本")
@@ -1,10 +1,32 @@
 """
 大语言模型模块 - DeepSeek 和 Embedding
+各客户端在首次访问时才导入（openai、sentence_transformers 的导入开销较大）
 """
-from .deepseek_client import DeepSeekClient
-from .embedding_manager import EmbeddingManager
+import importlib
+
+# 导出名 -> 所在子模块
+_EXPORTS = {
+    "DeepSeekClient": ".deepseek_client",
+    "AsyncDeepSeekClient": ".deepseek_client",
+    "EmbeddingManager": ".embedding_manager",
+}
 
 __all__ = [
     "DeepSeekClient",
+    "AsyncDeepSeekClient",
     "EmbeddingManager",
 ]
+
+
+def __getattr__(name: str):
+    """按需导入（PEP 562）"""
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    """包含尚未导入的导出名"""
+    return sorted(set(globals()) | set(__all__))
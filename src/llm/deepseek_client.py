@@ -1,11 +1,120 @@
 """
 DeepSeek API 客户端
 """
-from openai import OpenAI
-from typing import List, Optional
+import asyncio
+import random
+import threading
+import weakref
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
+from typing import List, Optional, Tuple
 from src.core.config import settings
 
 
+def _build_multi_query_messages(query: str, num_queries: int) -> List[dict]:
+    """构建 Multi-Query 改写的对话消息"""
+    prompt = f"""你是一个专业的查询优化助手。请将以下用户查询改写为 {num_queries} 个语义相近但表达不同的查询，用于提高检索召回率。
+
+原始查询: {query}
+
+要求：
+1. 保持核心语义不变
+2. 使用不同的表达方式和同义词
+3. 每行一个查询
+4. 不要添加序号或其他标记
+
+改写后的查询："""
+    
+    return [
+        {"role": "system", "content": "你是一个专业的查询优化助手。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _parse_multi_queries(query: str, response: str, num_queries: int) -> List[str]:
+    """解析返回的查询列表（包含原始查询）"""
+    queries = [q.strip() for q in response.split('\n') if q.strip()]
+    all_queries = [query] + queries[:num_queries-1]
+    return all_queries[:num_queries]
+
+
+def _build_hyde_messages(query: str) -> List[dict]:
+    """构建 HyDE 假设性文档生成的对话消息"""
+    prompt = f"""请针对以下问题，生成一个详细、专业的回答。不要说"我不知道"，请直接生成一个可能的答案。
+
+问题: {query}
+
+回答:"""
+    
+    return [
+        {"role": "system", "content": "你是一个知识丰富的AI助手，擅长生成高质量的答案。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _build_rerank_messages(query: str, documents: List[str]) -> List[dict]:
+    """构建重排序打分的对话消息"""
+    docs_text = "\n\n".join([f"文档{i+1}:\n{doc[:500]}" for i, doc in enumerate(documents)])
+    
+    prompt = f"""请对以下文档与查询的相关性进行评分（0-10分，10分最相关）。
+
+查询: {query}
+
+{docs_text}
+
+请按照以下格式输出，每行一个文档的评分：
+1: 分数
+2: 分数
+3: 分数
+...
+
+评分结果："""
+    
+    return [
+        {"role": "system", "content": "你是一个专业的信息检索评估专家。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _parse_rerank_scores(response: str, num_documents: int, top_k: int) -> List[tuple]:
+    """解析评分结果，返回按分数排序的 (文档索引, 分数) 列表"""
+    scores = []
+    for line in response.split('\n'):
+        if ':' in line:
+            try:
+                idx_str, score_str = line.split(':')
+                idx = int(idx_str.strip()) - 1
+                score = float(score_str.strip())
+                if 0 <= idx < num_documents:
+                    scores.append((idx, score))
+            except:
+                continue
+    
+    # 按分数排序
+    scores.sort(key=lambda x: x[1], reverse=True)
+    return scores[:top_k]
+
+
+def _build_answer_messages(query: str, contexts: List[str]) -> List[dict]:
+    """构建基于上下文回答问题的对话消息"""
+    context_text = "\n\n".join([f"[文档{i+1}]\n{ctx}" for i, ctx in enumerate(contexts)])
+    
+    prompt = f"""请基于以下检索到的文档，回答用户的问题。如果文档中没有相关信息，请诚实地说明。
+
+检索到的文档：
+{context_text}
+
+用户问题: {query}
+
+回答:"""
+    
+    return [
+        {"role": "system", "content": "你是一个专业的AI助手，擅长基于给定的文档回答问题。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
 class DeepSeekClient:
     """DeepSeek API 客户端封装"""
     
@@ -66,30 +175,9 @@ class DeepSeekClient:
         Returns:
             改写后的查询列表
         """
-        prompt = f"""你是一个专业的查询优化助手。请将以下用户查询改写为 {num_queries} 个语义相近但表达不同的查询，用于提高检索召回率。
-
-原始查询: {query}
-
-要求：
-1. 保持核心语义不变
-2. 使用不同的表达方式和同义词
-3. 每行一个查询
-4. 不要添加序号或其他标记
-
-改写后的查询："""
-
-        messages = [
-            {"role": "system", "content": "你是一个专业的查询优化助手。"},
-            {"role": "user", "content": prompt}
-        ]
-        
+        messages = _build_multi_query_messages(query, num_queries)
         response = self.chat(messages, temperature=0.8, max_tokens=300)
-        
-        # 解析返回的查询列表
-        queries = [q.strip() for q in response.split('\n') if q.strip()]
-        # 包含原始查询
-        all_queries = [query] + queries[:num_queries-1]
-        return all_queries[:num_queries]
+        return _parse_multi_queries(query, response, num_queries)
     
     def generate_hypothetical_document(self, query: str) -> str:
         """
@@ -101,17 +189,7 @@ class DeepSeekClient:
         Returns:
             生成的假设性文档
         """
-        prompt = f"""请针对以下问题，生成一个详细、专业的回答。不要说"我不知道"，请直接生成一个可能的答案。
-
-问题: {query}
-
-回答:"""
-
-        messages = [
-            {"role": "system", "content": "你是一个知识丰富的AI助手，擅长生成高质量的答案。"},
-            {"role": "user", "content": prompt}
-        ]
-        
+        messages = _build_hyde_messages(query)
         response = self.chat(messages, temperature=0.7, max_tokens=500)
         return response
     
@@ -135,46 +213,9 @@ class DeepSeekClient:
         if not documents:
             return []
         
-        # 构建打分提示
-        docs_text = "\n\n".join([f"文档{i+1}:\n{doc[:500]}" for i, doc in enumerate(documents)])
-        
-        prompt = f"""请对以下文档与查询的相关性进行评分（0-10分，10分最相关）。
-
-查询: {query}
-
-{docs_text}
-
-请按照以下格式输出，每行一个文档的评分：
-1: 分数
-2: 分数
-3: 分数
-...
-
-评分结果："""
-
-        messages = [
-            {"role": "system", "content": "你是一个专业的信息检索评估专家。"},
-            {"role": "user", "content": prompt}
-        ]
-        
+        messages = _build_rerank_messages(query, documents)
         response = self.chat(messages, temperature=0.3, max_tokens=200)
-        
-        # 解析评分结果
-        scores = []
-        for line in response.split('\n'):
-            if ':' in line:
-                try:
-                    idx_str, score_str = line.split(':')
-                    idx = int(idx_str.strip()) - 1
-                    score = float(score_str.strip())
-                    if 0 <= idx < len(documents):
-                        scores.append((idx, score))
-                except:
-                    continue
-        
-        # 按分数排序
-        scores.sort(key=lambda x: x[1], reverse=True)
-        return scores[:top_k]
+        return _parse_rerank_scores(response, len(documents), top_k)
     
     def answer_with_context(self, query: str, contexts: List[str]) -> str:
         """
@@ -187,21 +228,186 @@ class DeepSeekClient:
         Returns:
             生成的答案
         """
-        context_text = "\n\n".join([f"[文档{i+1}]\n{ctx}" for i, ctx in enumerate(contexts)])
-        
-        prompt = f"""请基于以下检索到的文档，回答用户的问题。如果文档中没有相关信息，请诚实地说明。
-
-检索到的文档：
-{context_text}
+        messages = _build_answer_messages(query, contexts)
+        response = self.chat(messages, temperature=0.7, max_tokens=1000)
+        return response
 
-用户问题: {query}
 
-回答:"""
-
-        messages = [
-            {"role": "system", "content": "你是一个专业的AI助手，擅长基于给定的文档回答问题。"},
-            {"role": "user", "content": prompt}
-        ]
+class AsyncDeepSeekClient:
+    """
+    DeepSeek API 异步客户端
+    
+    所有请求共享一个 keep-alive 连接池，通过信号量限制并发请求数，
+    每次调用带超时，并对可重试错误做带抖动的指数退避重试。
+    
+    信号量和连接池都绑定到创建它们的事件循环，因此在每个事件循环中首次调用时分别创建：
+    同一实例可以先后在多个 asyncio.run() 或多个线程各自的事件循环中使用。
+    """
+    
+    # 可重试的错误类型（网络错误、超时、限流、服务端错误）
+    RETRYABLE_ERRORS = (
+        asyncio.TimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0
+    ):
+        """
+        初始化异步客户端
         
-        response = self.chat(messages, temperature=0.7, max_tokens=1000)
-        return response
+        Args:
+            api_key: API Key，默认读取配置
+            base_url: API 地址，默认读取配置（可指向本地 OpenAI 兼容服务做测试）
+            model: 模型名称，默认读取配置
+            max_concurrency: 最大并发请求数
+            timeout: 单次调用超时（秒）
+            max_retries: 最大重试次数
+            backoff_base: 退避基准时间（秒）
+            backoff_max: 单次退避上限（秒）
+        """
+        self._api_key = api_key or settings.deepseek_api_key
+        self._base_url = base_url or settings.deepseek_base_url
+        self.model = model or settings.deepseek_model
+        self.max_concurrency = max_concurrency or settings.deepseek_max_concurrency
+        self.timeout = timeout or settings.deepseek_timeout
+        self.max_retries = settings.deepseek_max_retries if max_retries is None else max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # 事件循环 -> (信号量, 连接池, OpenAI 客户端)，事件循环被回收后条目自动移除
+        self._loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        
+        if not self._api_key:
+            print("⚠️  警告: 未配置 DeepSeek API Key，高级功能将不可用")
+    
+    def _get_loop_client(self) -> Tuple[asyncio.Semaphore, AsyncOpenAI]:
+        """获取当前事件循环的信号量和客户端（首次在该事件循环中调用时创建）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._loop_clients.get(loop)
+            if entry is None:
+                # 共享连接池，连接数与并发上限一致
+                http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_concurrency,
+                        max_keepalive_connections=self.max_concurrency
+                    ),
+                    timeout=self.timeout
+                )
+                # 重试由本类统一处理，关闭 SDK 自带的重试
+                client = AsyncOpenAI(
+                    api_key=self._api_key,
+                    base_url=self._base_url,
+                    http_client=http_client,
+                    max_retries=0
+                )
+                entry = (asyncio.Semaphore(self.max_concurrency), http_client, client)
+                self._loop_clients[loop] = entry
+        return entry[0], entry[2]
+    
+    async def chat(
+        self,
+        messages: List[dict],
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ) -> str:
+        """
+        异步调用 DeepSeek Chat API
+        
+        Args:
+            messages: 对话消息列表
+            temperature: 温度参数
+            max_tokens: 最大生成长度
+        
+        Returns:
+            生成的文本，失败时返回空字符串
+        """
+        if not self._api_key:
+            print("✗ DeepSeek API 未配置")
+            return ""
+        
+        semaphore, client = self._get_loop_client()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    response = await asyncio.wait_for(
+                        client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            temperature=temperature,
+                            max_tokens=max_tokens
+                        ),
+                        timeout=self.timeout
+                    )
+                return response.choices[0].message.content
+            except self.RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    print(f"✗ DeepSeek API 调用失败（已重试 {attempt} 次）: {e!r}")
+                    return ""
+                # 退避期间不占用并发名额
+                await asyncio.sleep(self._backoff_delay(attempt))
+            except Exception as e:
+                print(f"✗ DeepSeek API 调用失败: {e}")
+                return ""
+        
+        return ""
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """计算第 attempt 次重试前的等待时间（full jitter 指数退避）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    async def generate_multi_queries(self, query: str, num_queries: int = 3) -> List[str]:
+        """Multi-Query: 将一个查询改写为多个同义查询"""
+        messages = _build_multi_query_messages(query, num_queries)
+        response = await self.chat(messages, temperature=0.8, max_tokens=300)
+        return _parse_multi_queries(query, response, num_queries)
+    
+    async def generate_hypothetical_document(self, query: str) -> str:
+        """HyDE: 生成假设性文档（伪答案）"""
+        messages = _build_hyde_messages(query)
+        return await self.chat(messages, temperature=0.7, max_tokens=500)
+    
+    async def rerank_documents(
+        self,
+        query: str,
+        documents: List[str],
+        top_k: int = 5
+    ) -> List[tuple]:
+        """使用 DeepSeek 对文档进行重排序，返回 (文档索引, 相关性分数) 列表"""
+        if not documents:
+            return []
+        
+        messages = _build_rerank_messages(query, documents)
+        response = await self.chat(messages, temperature=0.3, max_tokens=200)
+        return _parse_rerank_scores(response, len(documents), top_k)
+    
+    async def answer_with_context(self, query: str, contexts: List[str]) -> str:
+        """基于检索上下文回答问题"""
+        messages = _build_answer_messages(query, contexts)
+        return await self.chat(messages, temperature=0.7, max_tokens=1000)
+    
+    async def aclose(self):
+        """关闭当前事件循环的连接池（其他事件循环的连接池需在各自的循环中关闭）"""
+        with self._lock:
+            entry = self._loop_clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[1].aclose()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
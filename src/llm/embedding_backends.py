@@ -0,0 +1,97 @@
+"""
+Embedding 推理后端
+- torch: SentenceTransformer 默认的 PyTorch 全精度推理
+- onnx: 导出为 ONNX 后用 ONNX Runtime 推理
+- onnx-int8: 在 ONNX 基础上做动态 int8 量化（模型体积约为 1/4，CPU 推理更快）
+ONNX 模型在首次使用时导出到 settings.embedding_onnx_dir，之后直接加载。
+需要 sentence-transformers>=3.2 和 optimum[onnxruntime]，未安装时回退为 torch
+"""
+import os
+import re
+from typing import TYPE_CHECKING, Any, Dict, Optional
+import numpy as np
+from src.core.config import settings
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def load_model(model_name: str, backend: str = "torch", device: Optional[str] = None) -> "SentenceTransformer":
+    """
+    按后端加载 embedding 模型
+    
+    Args:
+        model_name: 模型名或本地路径
+        backend: torch / onnx / onnx-int8
+        device: 运行设备，None 表示自动选择
+    
+    Returns:
+        SentenceTransformer 模型（encode 等接口与后端无关）
+    """
+    # 延迟导入：sentence_transformers 会连带导入 torch，只在真正加载模型时付出这笔开销
+    from sentence_transformers import SentenceTransformer
+    
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的 embedding 后端: {backend}（可选 {' / '.join(BACKENDS)}）")
+    if backend == "torch":
+        return SentenceTransformer(model_name, device=device)
+    
+    try:
+        import onnxruntime  # noqa: F401
+        import optimum.onnxruntime  # noqa: F401
+    except ImportError:
+        print(f"✗ 未安装 optimum[onnxruntime]，embedding 后端 {backend} 回退为 torch")
+        return SentenceTransformer(model_name, device=device)
+    
+    export_dir = onnx_export_dir(model_name)
+    file_name = "onnx/model.onnx"
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        print(f"正在导出 ONNX 模型: {export_dir}")
+        SentenceTransformer(model_name, device=device, backend="onnx").save_pretrained(export_dir)
+    
+    if backend == "onnx-int8":
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        
+        config = settings.embedding_onnx_quantization
+        file_name = f"onnx/model_qint8_{config}.onnx"
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            print(f"正在进行 int8 动态量化（{config}）: {export_dir}")
+            export_dynamic_quantized_onnx_model(
+                SentenceTransformer(export_dir, device=device, backend="onnx"),
+                config,
+                export_dir
+            )
+    
+    return SentenceTransformer(export_dir, device=device, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def onnx_export_dir(model_name: str) -> str:
+    """模型导出为 ONNX 后的保存目录"""
+    return os.path.join(settings.embedding_onnx_dir, re.sub(r"[^\w.-]+", "_", model_name))
+
+
+def cosine_parity(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, Any]:
+    """
+    对比两个后端对同一批文本的编码结果（逐行余弦相似度）
+    
+    Args:
+        reference: 参考后端（通常为 torch）的向量矩阵
+        candidate: 待检查后端的向量矩阵
+    
+    Returns:
+        余弦相似度的均值、最小值，以及最小值所在的行
+    """
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    if reference.shape != candidate.shape:
+        raise ValueError(f"向量形状不一致: {reference.shape} vs {candidate.shape}")
+    if not len(reference):
+        return {"mean": 1.0, "min": 1.0, "argmin": None}
+    
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    cosines = np.einsum("ij,ij->i", reference, candidate) / np.maximum(norms, 1e-12)
+    worst = int(np.argmin(cosines))
+    return {"mean": float(cosines.mean()), "min": float(cosines[worst]), "argmin": worst}
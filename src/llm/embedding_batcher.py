@@ -0,0 +1,145 @@
+"""
+embedding 微批合并
+并发到达的编码请求在后台线程中合并：收到第一个请求后最多再等待 max_wait_ms 毫秒
+或凑满 max_batch_size 条，然后一次前向完成，结果按请求拆分返回
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    微批合并器（线程安全）
+    
+    每个请求增加的延迟不超过 max_wait_ms 加一次合并前向的耗时；
+    单个请求本身超过 max_batch_size 条时不拆分，单独成批。
+    """
+    
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0
+    ):
+        """
+        启动合并线程
+        
+        Args:
+            encode_fn: 批量编码函数，返回与输入一一对应的向量矩阵
+            max_batch_size: 每批最多合并的文本数
+            max_wait_ms: 收到第一个请求后最多等待的毫秒数
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Optional[Tuple[List[str], Future]]]" = queue.Queue()
+        # 保证 close() 之后不再有请求入队（否则合并线程已退出，Future 永远不会完成）
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, texts: List[str]) -> Future:
+        """
+        提交编码请求
+        
+        Args:
+            texts: 文本列表
+        
+        Returns:
+            Future，结果为与 texts 一一对应的向量矩阵
+        
+        Raises:
+            RuntimeError: 合并器已关闭
+        """
+        future: Future = Future()
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("embedding 微批合并器已关闭")
+            self._queue.put((texts, future))
+        return future
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """提交编码请求并等待结果"""
+        return self.submit(texts).result()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        合并统计
+        
+        Returns:
+            批次数、请求数、文本数和平均每批请求数
+        """
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "texts": self.texts,
+                "requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            }
+    
+    def close(self):
+        """处理完已提交的请求后停止合并线程"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        """合并线程主循环"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            
+            batch = [item]
+            count = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while count < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                count += len(item[0])
+            
+            self._flush(batch)
+            if stop:
+                break
+    
+    def _flush(self, batch: List[Tuple[List[str], Future]]):
+        """一次前向编码整批请求，按请求拆分结果"""
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        try:
+            embeddings = self.encode_fn(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        with self._stats_lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.texts += len(texts)
+        
+        offset = 0
+        for request_texts, future in batch:
+            future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
@@ -1,17 +1,136 @@
 """
 Embedding 管理器
 """
-from sentence_transformers import SentenceTransformer
-from typing import List, Union
+import re
+import unicodedata
+import numpy as np
+from tqdm import tqdm
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 from src.core.config import settings
+from src.llm.embedding_backends import load_model
+from src.llm.embedding_batcher import MicroBatcher
+from src.llm.embedding_pool import EmbeddingPool
+from src.utils.embedding_cache import EmbeddingCache
+from src.utils.lru_cache import LRUCache
+
+if TYPE_CHECKING:
+    # sentence_transformers 会连带导入 torch，仅在加载模型时（load_model 中）导入
+    from sentence_transformers import SentenceTransformer
+
+
+def plan_token_batches(lengths: List[int], token_budget: int) -> List[List[int]]:
+    """
+    按 token 预算划分批次
+    
+    文本按长度降序排列后依次装入批次，每批 (条数 × 批内最长长度) 不超过 token_budget，
+    长度相近的文本落在同一批，padding 最少；超过预算的单条文本自成一批。
+    
+    Args:
+        lengths: 每条文本的 token 数
+        token_budget: 每批 padding 后的 token 数上限
+    
+    Returns:
+        批次列表，每批为文本下标列表
+    """
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    batches = []
+    current: List[int] = []
+    for i in order:
+        # 降序排列，批内最长的是第一条
+        if current and (len(current) + 1) * lengths[current[0]] > token_budget:
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def encode_texts(
+    model: "SentenceTransformer",
+    texts: List[str],
+    batch_size: int,
+    token_budget: int,
+    show_progress_bar: bool = False
+) -> np.ndarray:
+    """
+    按 token 预算分批编码，编码后恢复原顺序（主进程和编码池工作进程共用）
+    
+    token_budget 为 0 时按固定条数（batch_size）分批；否则 batch_size 不生效，
+    每批条数由预算和批内最长文本决定（短文本批次更大，长文本批次更小）。
+    
+    Args:
+        model: SentenceTransformer 模型
+        texts: 文本列表
+        batch_size: 固定分批时的批大小
+        token_budget: 每批 padding 后的 token 数上限
+        show_progress_bar: 是否显示进度条
+    
+    Returns:
+        与 texts 一一对应的 float32 向量矩阵
+    """
+    if token_budget <= 0 or len(texts) <= 1:
+        return model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=show_progress_bar,
+            convert_to_numpy=True
+        )
+    
+    batches = plan_token_batches(token_lengths(model, texts), token_budget)
+    embeddings = np.empty((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    for batch in tqdm(batches, desc="Batches", disable=not show_progress_bar):
+        embeddings[batch] = model.encode(
+            [texts[i] for i in batch],
+            batch_size=len(batch),
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+    return embeddings
+
+
+def token_lengths(model: "SentenceTransformer", texts: List[str]) -> List[int]:
+    """每条文本截断到模型最大长度后的 token 数（模型没有分词器时按字符数估计）"""
+    tokenizer = getattr(model, "tokenizer", None)
+    max_length = model.max_seq_length
+    if tokenizer is None:
+        return [min(len(text), max_length) for text in texts]
+    input_ids = tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]
+    return [len(ids) for ids in input_ids]
 
 
 class EmbeddingManager:
     """Embedding 模型管理器"""
     
     def __init__(self):
-        print(f"正在加载 Embedding 模型: {settings.embedding_model}")
-        self.model = SentenceTransformer(settings.embedding_model)
+        print(f"正在加载 Embedding 模型: {settings.embedding_model}（{settings.embedding_backend}）")
+        self.model_name = settings.embedding_model
+        self.backend = settings.embedding_backend
+        self.model = load_model(self.model_name, self.backend)
+        self.token_budget = settings.embedding_token_budget
+        # 批量编码的进程池（大批量时首次使用才启动）
+        self.num_workers = settings.embedding_num_workers
+        self._pool: Optional[EmbeddingPool] = None
+        # 并发查询的微批合并（可选）
+        self._batcher: Optional[MicroBatcher] = None
+        if settings.embedding_batch_wait_ms > 0:
+            self.enable_batching(settings.embedding_batch_max_size, settings.embedding_batch_wait_ms)
+        # 查询向量缓存：热门查询和 Multi-Query 中重复的原始查询不再经过模型
+        self.query_cache = LRUCache(
+            settings.query_embedding_cache_size,
+            settings.query_embedding_cache_ttl
+        )
+        # 文档向量的磁盘缓存（可选）
+        self.disk_cache: Optional[EmbeddingCache] = None
+        if settings.embedding_cache_dir:
+            # 量化后的向量与全精度略有差异，不同后端使用各自的缓存
+            self.disk_cache = EmbeddingCache(
+                settings.embedding_cache_dir,
+                self.model_name if self.backend == "torch" else f"{self.model_name}@{self.backend}",
+                self.dimension,
+                dtype=settings.embedding_cache_dtype
+            )
+            print(f"✓ 已启用 embedding 磁盘缓存: {self.disk_cache.directory}（{len(self.disk_cache)} 条）")
         print("✓ Embedding 模型加载完成")
     
     def encode(
@@ -23,6 +142,9 @@ class EmbeddingManager:
         """
         将文本编码为向量
         
+        同一批中重复的文本只编码一次；启用磁盘缓存时，已缓存的文本直接读盘，
+        新文本编码后写入缓存。
+        
         Args:
             texts: 单个文本或文本列表
             batch_size: 批处理大小
@@ -35,20 +157,186 @@ class EmbeddingManager:
         if is_single:
             texts = [texts]
         
-        embeddings = self.model.encode(
-            texts,
-            batch_size=batch_size,
-            show_progress_bar=show_progress_bar,
-            convert_to_numpy=True
-        )
-        
         # 转换为列表
-        embeddings_list = [emb.tolist() for emb in embeddings]
+        embeddings_list = self.encode_array(texts, batch_size, show_progress_bar).tolist()
+        
+        if is_single:
+            return embeddings_list[0]
+        return embeddings_list
+    
+    def encode_array(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        """
+        将文本编码为 float32 矩阵（不转换为列表，供索引路径直接使用）
+        
+        去重和磁盘缓存行为与 encode 相同。
+        
+        Args:
+            texts: 文本列表
+            batch_size: 批处理大小
+            show_progress_bar: 是否显示进度条
+        
+        Returns:
+            (len(texts), dimension) 的连续 float32 矩阵
+        """
+        return self._encode_unique(texts, batch_size, show_progress_bar, self.disk_cache)
+    
+    def encode_query(
+        self,
+        queries: Union[str, List[str]],
+        batch_size: int = 32
+    ) -> Union[List[float], List[List[float]]]:
+        """
+        编码查询文本（经过 LRU 缓存）
+        
+        缓存键为 (模型名, 规范化后的文本)，只有未命中的查询才送入模型，
+        同一批中重复的查询只编码一次。文档编码请使用 encode()，以免挤占查询缓存。
+        
+        Args:
+            queries: 单个查询或查询列表
+            batch_size: 批处理大小
+        
+        Returns:
+            向量或向量列表（与 encode() 相同）
+        """
+        is_single = isinstance(queries, str)
+        if is_single:
+            queries = [queries]
         
+        keys = [(self.model_name, self._normalize_query(q)) for q in queries]
+        cached = {key: self.query_cache.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, embedding in cached.items() if embedding is None]
+        if missing:
+            texts = [text for _, text in missing]
+            if self._batcher is not None:
+                # 与其他线程的并发查询合并为一次前向
+                embeddings = self._batcher.encode(texts).tolist()
+            else:
+                # 查询不写入磁盘缓存
+                embeddings = self._encode_unique(texts, batch_size, False, None).tolist()
+            for key, embedding in zip(missing, embeddings):
+                self.query_cache.put(key, embedding)
+                cached[key] = embedding
+        
+        # 返回副本，调用方修改结果不会影响缓存
+        embeddings_list = [list(cached[key]) for key in keys]
         if is_single:
             return embeddings_list[0]
         return embeddings_list
     
+    def cache_stats(self) -> Dict[str, Any]:
+        """查询向量缓存、磁盘缓存和微批合并（未启用时为 None）的统计"""
+        return {
+            "query": self.query_cache.stats(),
+            "disk": self.disk_cache.stats() if self.disk_cache is not None else None,
+            "batcher": self._batcher.stats() if self._batcher is not None else None,
+        }
+    
+    def enable_batching(self, max_batch_size: int, max_wait_ms: float):
+        """
+        启用查询微批合并：多个线程同时编码查询时，未命中缓存的查询合并为一次前向
+        
+        Args:
+            max_batch_size: 每批最多合并的查询数
+            max_wait_ms: 收到第一个查询后最多等待的毫秒数
+        """
+        if self._batcher is not None:
+            self._batcher.close()
+        self._batcher = MicroBatcher(
+            lambda texts: self._encode_unique(texts, max_batch_size, False, None),
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms
+        )
+    
+    def close(self):
+        """停止微批合并线程和编码进程池，关闭磁盘缓存"""
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+            self.disk_cache = None
+    
+    def _encode_unique(
+        self,
+        texts: List[str],
+        batch_size: int,
+        show_progress_bar: bool,
+        cache: Optional[EmbeddingCache]
+    ) -> np.ndarray:
+        """
+        去重后编码，可选读写磁盘缓存
+        
+        Args:
+            texts: 文本列表（可含重复）
+            batch_size: 批处理大小
+            show_progress_bar: 是否显示进度条
+            cache: 磁盘缓存，None 表示不使用
+        
+        Returns:
+            与 texts 一一对应的 float32 向量矩阵
+        """
+        unique = list(dict.fromkeys(texts))
+        vectors = cache.get_many(unique) if cache is not None else [None] * len(unique)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self._encode_batched([unique[i] for i in missing], batch_size, show_progress_bar)
+            if cache is not None:
+                cache.put_many([unique[i] for i in missing], computed)
+                # 与读盘结果保持相同精度，命中与否不影响向量
+                computed = computed.astype(cache.dtype).astype(np.float32)
+            if len(missing) == len(texts):
+                # 无重复且全部新编码：直接使用模型输出
+                return np.ascontiguousarray(computed, dtype=np.float32)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        
+        if not unique:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        position = {text: i for i, text in enumerate(unique)}
+        return np.stack(vectors)[[position[text] for text in texts]]
+    
+    def _encode_batched(self, texts: List[str], batch_size: int, show_progress_bar: bool) -> np.ndarray:
+        """
+        编码一批（已去重的）文本：条数达到 EMBEDDING_POOL_MIN_TEXTS 且启用了编码池时分发到工作进程，
+        否则在当前进程中按 token 预算分批编码
+        
+        Args:
+            texts: 文本列表
+            batch_size: 固定分批时的批大小
+            show_progress_bar: 是否显示进度条
+        
+        Returns:
+            与 texts 一一对应的 float32 向量矩阵
+        """
+        if self.num_workers > 1 and len(texts) >= settings.embedding_pool_min_texts:
+            return self._get_pool().encode(texts, batch_size, show_progress_bar)
+        return encode_texts(self.model, texts, batch_size, self.token_budget, show_progress_bar)
+    
+    def _get_pool(self) -> EmbeddingPool:
+        """获取编码进程池（首次使用时启动）"""
+        if self._pool is None:
+            self._pool = EmbeddingPool(
+                self.model_name,
+                self.num_workers,
+                backend=self.backend,
+                threads_per_worker=settings.embedding_worker_threads,
+                token_budget=self.token_budget
+            )
+        return self._pool
+    
+    @staticmethod
+    def _normalize_query(text: str) -> str:
+        """查询规范化：Unicode NFKC（全角转半角等）+ 去除首尾空白 + 合并连续空白"""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+    
     @property
     def dimension(self) -> int:
         """获取向量维度"""
@@ -0,0 +1,219 @@
+"""
+多进程 embedding 编码池
+每个工作进程加载一份模型，绑定到一组互不重叠的 CPU 核，并把自己的 intra-op 线程数设为核数，
+大批量编码按块轮流分发到各进程并行执行，结果按输入顺序流式取回
+"""
+import multiprocessing
+import os
+import threading
+from typing import Iterator, List, Optional
+import numpy as np
+from tqdm import tqdm
+
+
+class EmbeddingPool:
+    """
+    多进程编码池（线程安全，同一时刻只执行一个编码请求）
+    
+    第 i 块总是发给第 i % N 个进程，各进程按先进先出处理，因此依次接收即为输入顺序；
+    每个进程同一时刻只有一块在处理，取回它的结果后才发出下一块，内存占用与输入总量无关。
+    
+    不能向同一进程预发多块：管道缓冲区放不下一块的文本或结果时，主进程阻塞在发送下一块、
+    工作进程阻塞在发送上一块的结果，双方互相等待而死锁。
+    """
+    
+    # 每块的文本数
+    CHUNK_SIZE = 256
+    
+    def __init__(
+        self,
+        model_name: str,
+        num_workers: int,
+        threads_per_worker: int = 0,
+        backend: str = "torch",
+        token_budget: int = 0
+    ):
+        """
+        启动工作进程
+        
+        Args:
+            model_name: 模型名
+            num_workers: 工作进程数
+            threads_per_worker: 每个进程的线程数（绑定同样数量的 CPU 核），0 表示可用核数按进程数平分
+            backend: 推理后端（torch / onnx / onnx-int8）
+            token_budget: 各进程内按 token 预算分批的预算，0 表示按固定条数分批
+        """
+        if num_workers < 1:
+            raise ValueError(f"工作进程数必须为正数: {num_workers}")
+        self.num_workers = num_workers
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        self._closed = False
+        
+        cores = self._available_cores()
+        if threads_per_worker <= 0:
+            threads_per_worker = max(1, len(cores) // num_workers)
+        self.threads_per_worker = threads_per_worker
+        
+        # 父进程中已加载模型并可能持有线程池，使用 spawn 避免 fork 继承锁状态
+        context = multiprocessing.get_context("spawn")
+        self._conns = []
+        self._processes = []
+        for worker in range(num_workers):
+            # 核数不足时循环分配
+            worker_cores = [cores[(worker * threads_per_worker + i) % len(cores)] for i in range(threads_per_worker)]
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_encode_worker,
+                args=(child_conn, model_name, backend, sorted(set(worker_cores)), threads_per_worker, token_budget),
+                name=f"embedding-worker-{worker}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._processes.append(process)
+        print(f"✓ 已启动 embedding 编码池: {num_workers} 个进程 × {threads_per_worker} 线程")
+    
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """
+        编码文本
+        
+        Args:
+            texts: 文本列表
+            batch_size: 各进程内固定分批时的批大小
+            show_progress_bar: 是否显示进度条
+        
+        Returns:
+            与 texts 一一对应的 float32 向量矩阵
+        """
+        chunks = []
+        with tqdm(total=len(texts), desc="Batches", disable=not show_progress_bar) as progress:
+            for chunk in self.encode_iter(texts, batch_size):
+                chunks.append(chunk)
+                progress.update(len(chunk))
+        if not chunks:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(chunks)
+    
+    def encode_iter(self, texts: List[str], batch_size: int = 32) -> Iterator[np.ndarray]:
+        """
+        流式编码：按输入顺序逐块返回向量矩阵
+        
+        Args:
+            texts: 文本列表
+            batch_size: 各进程内固定分批时的批大小
+        
+        Yields:
+            每块文本的 float32 向量矩阵（最多 CHUNK_SIZE 行）
+        """
+        starts = range(0, len(texts), self.CHUNK_SIZE)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("embedding 编码池已关闭")
+            sent = 0
+            received = 0
+            error: Optional[BaseException] = None
+            try:
+                # 先给每个进程各发一块
+                while sent < min(len(starts), self.num_workers):
+                    self._send_chunk(texts, starts[sent], sent, batch_size)
+                    sent += 1
+                
+                while received < len(starts):
+                    ok, result = self._conns[received % self.num_workers].recv()
+                    received += 1
+                    # 该进程已空闲，发给它下一块（第 received - 1 + N 块同样属于它）
+                    if sent < len(starts):
+                        self._send_chunk(texts, starts[sent], sent, batch_size)
+                        sent += 1
+                    if not ok:
+                        error = result
+                        break
+                    yield result
+            finally:
+                # 出错或调用方提前停止迭代时，取回已发出的块，保持管道同步
+                while received < sent:
+                    self._conns[received % self.num_workers].recv()
+                    received += 1
+            if error is not None:
+                raise error
+    
+    def _send_chunk(self, texts: List[str], start: int, index: int, batch_size: int):
+        """把第 index 块（从 start 开始）发给第 index % N 个进程"""
+        self._conns[index % self.num_workers].send((texts[start:start + self.CHUNK_SIZE], batch_size))
+    
+    def close(self):
+        """停止全部工作进程"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for conn in self._conns:
+                try:
+                    conn.send(None)
+                except (EOFError, OSError):
+                    pass
+                conn.close()
+        for process in self._processes:
+            process.join()
+    
+    @staticmethod
+    def _available_cores() -> List[int]:
+        """当前进程可用的 CPU 核"""
+        if hasattr(os, "sched_getaffinity"):
+            return sorted(os.sched_getaffinity(0))
+        return list(range(os.cpu_count() or 1))
+
+
+def _encode_worker(
+    conn,
+    model_name: str,
+    backend: str,
+    cores: List[int],
+    num_threads: int,
+    token_budget: int
+):
+    """
+    编码进程主循环：接收 (文本块, 批大小)，回复 (是否成功, 向量矩阵或异常)；收到 None 时退出
+    
+    Args:
+        conn: 与主进程通信的管道
+        model_name: 模型名
+        backend: 推理后端
+        cores: 绑定的 CPU 核
+        num_threads: intra-op 线程数
+        token_budget: 按 token 预算分批的预算
+    """
+    # 线程数需在导入 torch 之前设置
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(num_threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError:
+            pass
+    
+    from src.llm.embedding_backends import load_model
+    from src.llm.embedding_manager import encode_texts
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+    model = load_model(model_name, backend, device="cpu")
+    
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        texts, batch_size = request
+        try:
+            embeddings = encode_texts(model, texts, batch_size, token_budget)
+            conn.send((True, np.ascontiguousarray(embeddings, dtype=np.float32)))
+        except Exception as e:
+            conn.send((False, e))
@@ -0,0 +1,255 @@
+"""
+embedding 服务
+一个进程加载模型并监听本地套接字，多个工作进程（如 Web 服务的多个 worker）通过 EmbeddingClient 共享同一份模型；
+各连接上并发到达的查询经微批合并后一次前向完成。
+
+启动：python -m src.llm.embedding_server [地址]
+地址为 Unix 套接字路径（如 /tmp/rag-embedding.sock）或 host:port（Windows 只支持后者），
+默认读取 settings.embedding_server_address；服务端和客户端都必须配置 settings.embedding_server_authkey。
+连接上传输的是 pickle 数据，TCP 地址默认只允许回环地址，settings.embedding_server_allow_remote 为 True 时才可监听其他地址
+"""
+import ipaddress
+import sys
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+from src.core.config import settings
+
+
+def parse_address(address: str) -> Union[str, tuple]:
+    """将 host:port 解析为 TCP 地址，其余视为 Unix 套接字路径"""
+    host, sep, port = address.rpartition(":")
+    if sep and host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def resolve_authkey(authkey: Optional[str] = None) -> bytes:
+    """
+    获取连接认证密钥（不提供默认值，避免使用公开的弱密钥）
+    
+    Args:
+        authkey: 显式指定的密钥，None 表示使用 settings.embedding_server_authkey
+    
+    Returns:
+        密钥字节串
+    """
+    authkey = authkey or settings.embedding_server_authkey
+    if not authkey:
+        raise ValueError("未配置 embedding 服务认证密钥，请设置 EMBEDDING_SERVER_AUTHKEY")
+    return authkey.encode("utf-8")
+
+
+def check_listen_address(address: str):
+    """
+    检查监听地址：未允许远程访问时只接受 Unix 套接字路径和回环 TCP 地址
+    
+    Args:
+        address: 监听地址
+    
+    Raises:
+        ValueError: 地址不是回环地址且未设置 embedding_server_allow_remote
+    """
+    parsed = parse_address(address)
+    if not isinstance(parsed, tuple) or settings.embedding_server_allow_remote:
+        return
+    host = parsed[0].strip("[]")
+    try:
+        loopback = host == "localhost" or ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise ValueError(
+            f"embedding 服务只允许监听回环地址: {address}"
+            "（确需远程访问时设置 EMBEDDING_SERVER_ALLOW_REMOTE=true）"
+        )
+
+
+class EmbeddingServer:
+    """
+    embedding 服务端
+    
+    每个客户端连接由一个线程处理，请求格式与 BM25 分片进程相同：(方法名, 参数)，
+    回复 (是否成功, 返回值或异常)。
+    """
+    
+    # 允许客户端调用的 EmbeddingManager 方法
+    METHODS = ("encode_query", "encode_array", "encode", "cache_stats")
+    # 未配置 embedding_batch_wait_ms 时服务端使用的合并等待（毫秒）
+    DEFAULT_WAIT_MS = 2.0
+    
+    def __init__(self, manager, address: str, authkey: Optional[str] = None):
+        """
+        初始化服务端（查询微批合并在此处启用）
+        
+        Args:
+            manager: EmbeddingManager 实例
+            address: 监听地址
+            authkey: 连接认证密钥，None 表示使用 settings.embedding_server_authkey
+        
+        Raises:
+            ValueError: 未配置密钥，或未允许远程访问时监听了非回环地址
+        """
+        check_listen_address(address)
+        self.manager = manager
+        self.address = address
+        self.authkey = resolve_authkey(authkey)
+        if settings.embedding_batch_wait_ms <= 0:
+            manager.enable_batching(settings.embedding_batch_max_size, self.DEFAULT_WAIT_MS)
+        self._listener: Optional[Listener] = None
+    
+    def serve_forever(self):
+        """监听并处理连接，直到 close() 被调用"""
+        self._listener = Listener(parse_address(self.address), authkey=self.authkey)
+        print(f"✓ embedding 服务已启动: {self.address}")
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                # close() 关闭了监听套接字
+                break
+            except Exception as e:
+                print(f"✗ 拒绝连接: {e}")
+                continue
+            threading.Thread(target=self._handle, args=(conn,), name="embedding-conn", daemon=True).start()
+    
+    def close(self):
+        """停止监听"""
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+    
+    def _handle(self, conn):
+        """处理一个客户端连接上的全部请求"""
+        with conn:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    if method == "dimension":
+                        result = self.manager.dimension
+                    elif method in self.METHODS:
+                        result = getattr(self.manager, method)(*args)
+                    else:
+                        raise ValueError(f"不支持的 embedding 服务方法: {method}")
+                    conn.send((True, result))
+                except Exception as e:
+                    conn.send((False, e))
+
+
+class EmbeddingClient:
+    """
+    embedding 服务客户端（线程安全，接口与 EmbeddingManager 的编码方法相同）
+    
+    每个线程使用独立的连接，同一进程内的并发查询在服务端同样会被合并。
+    """
+    
+    def __init__(self, address: str, authkey: Optional[str] = None):
+        """
+        连接 embedding 服务
+        
+        Args:
+            address: 服务地址
+            authkey: 连接认证密钥，None 表示使用 settings.embedding_server_authkey
+        """
+        self.address = address
+        self.authkey = resolve_authkey(authkey)
+        self.model_name = settings.embedding_model
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []
+        self._dimension = self._call("dimension")
+        print(f"✓ 已连接 embedding 服务: {address}")
+    
+    def encode(
+        self,
+        texts: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False
+    ) -> Union[List[float], List[List[float]]]:
+        """将文本编码为向量（见 EmbeddingManager.encode）"""
+        return self._call("encode", texts, batch_size)
+    
+    def encode_array(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        """将文本编码为 float32 矩阵（见 EmbeddingManager.encode_array）"""
+        return self._call("encode_array", texts, batch_size)
+    
+    def encode_query(
+        self,
+        queries: Union[str, List[str]],
+        batch_size: int = 32
+    ) -> Union[List[float], List[List[float]]]:
+        """编码查询文本（见 EmbeddingManager.encode_query，缓存和微批合并在服务端）"""
+        return self._call("encode_query", queries, batch_size)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """服务端的缓存和微批合并统计"""
+        return self._call("cache_stats")
+    
+    @property
+    def dimension(self) -> int:
+        """获取向量维度"""
+        return self._dimension
+    
+    def close(self):
+        """关闭全部连接"""
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns = []
+        self._local = threading.local()
+    
+    def _call(self, method: str, *args) -> Any:
+        """在当前线程的连接上调用服务端方法"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(parse_address(self.address), authkey=self.authkey)
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        
+        conn.send((method, args))
+        ok, result = conn.recv()
+        if not ok:
+            raise result
+        return result
+
+
+def main():
+    """启动 embedding 服务"""
+    from src.llm.embedding_manager import EmbeddingManager
+    
+    address = sys.argv[1] if len(sys.argv) > 1 else settings.embedding_server_address
+    if not address:
+        print("✗ 请指定服务地址（参数或 EMBEDDING_SERVER_ADDRESS）")
+        sys.exit(1)
+    
+    # 加载模型前先检查配置
+    try:
+        check_listen_address(address)
+        resolve_authkey()
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    
+    manager = EmbeddingManager()
+    server = EmbeddingServer(manager, address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,24 +2,43 @@
 高级 RAG 引擎
 整合所有功能的主引擎
 """
-from typing import List, Optional, Dict, Any
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, Iterable, Union
 from src.vectorstores.vector_store_base import RAGVectorStore
-from src.core.models import Document, SearchResult, QueryRequest
-from src.llm.deepseek_client import DeepSeekClient
+from src.core.models import Document, Hit, SearchResult, QueryRequest
+from src.core.config import settings
 from src.llm.embedding_manager import EmbeddingManager
+from src.llm.embedding_server import EmbeddingClient
 from src.retrievers.bm25_retriever import BM25Retriever
 from src.retrievers.hybrid_search import HybridSearchEngine
 from src.retrievers.chunking_strategy import ChunkingStrategy
+from src.utils.pipeline import StreamingPipeline, iter_batches
+from src.utils.index_manifest import IndexManifest, ManifestEntry
+from src.utils.document_store import DocumentStore
+from src.utils.resource_registry import registry
 from tqdm import tqdm
 
+if TYPE_CHECKING:
+    from src.llm.deepseek_client import DeepSeekClient, AsyncDeepSeekClient
+
 
 class AdvancedRAGEngine:
     """高级 RAG 引擎"""
     
+    # 父子分块参数
+    CHILD_SIZE = 512
+    PARENT_SIZE = 2048
+    
     def __init__(
         self,
         vector_store: RAGVectorStore,
-        use_parent_child: bool = False
+        use_parent_child: bool = False,
+        max_search_workers: int = 8,
+        manifest_path: Optional[str] = None,
+        document_store_path: Optional[str] = None
     ):
         """
         初始化 RAG 引擎
@@ -27,14 +46,30 @@ class AdvancedRAGEngine:
         Args:
             vector_store: 向量数据库实例
             use_parent_child: 是否使用父子分块策略
+            max_search_workers: 并行检索时的最大线程数
+            manifest_path: 增量索引清单路径（使用 sync_documents 时需要）
+            document_store_path: 文档库路径，默认使用配置（settings.document_store_path，
+                其中的 {collection} 替换为向量库集合名，不同集合的引擎不会共用同一个文档库）
         """
         self.vector_store = vector_store
         self.use_parent_child = use_parent_child
         self.child_to_parent: Dict[str, str] = {}  # 子块到父块的映射
+        self.max_search_workers = max_search_workers
+        self._search_executor: Optional[ThreadPoolExecutor] = None
+        self.manifest = IndexManifest(manifest_path) if manifest_path else None
+        self.document_store = DocumentStore(
+            document_store_path
+            or settings.document_store_path.format(collection=vector_store.collection_name)
+        )
         
         # 初始化各个组件
-        self.embedding_manager = EmbeddingManager()
-        self.deepseek_client = DeepSeekClient()
+        # embedding 模型和同步 LLM 客户端在首次使用时从进程级注册表获取（见同名属性），
+        # 只做 BM25 检索或只写文档库的调用方不需要加载模型，多个引擎共享同一份模型
+        self._components_lock = threading.Lock()
+        self._embedding_manager: Optional[Union[EmbeddingManager, EmbeddingClient]] = None
+        self._deepseek_client: Optional["DeepSeekClient"] = None
+        self._async_deepseek_client: Optional["AsyncDeepSeekClient"] = None
+        self._resource_keys: List[tuple] = []
         self.bm25_retriever = BM25Retriever()
         self.hybrid_engine = HybridSearchEngine()
         
@@ -46,7 +81,7 @@ class AdvancedRAGEngine:
         show_progress: bool = True
     ) -> bool:
         """
-        索引文档到向量数据库
+        索引文档到向量数据库（追加，已存在的 ID 会被更新）
         
         Args:
             documents: 文档列表
@@ -59,34 +94,16 @@ class AdvancedRAGEngine:
         
         # 如果使用父子分块
         if self.use_parent_child:
-            all_child_docs = []
-            for doc in tqdm(documents, desc="分块处理", disable=not show_progress):
-                child_docs, child_to_parent = ChunkingStrategy.create_parent_child_documents(
-                    doc_id=doc.id,
-                    text=doc.content,
-                    metadata=doc.metadata
-                )
-                all_child_docs.extend(child_docs)
-                self.child_to_parent.update(child_to_parent)
-            
-            documents = all_child_docs
+            documents = self._chunk_documents(documents, show_progress=show_progress)
             print(f"父子分块后共 {len(documents)} 个子块")
         
         # 生成 embeddings
-        texts = [doc.content for doc in documents]
         print("正在生成 embeddings...")
-        embeddings = self.embedding_manager.encode(
-            texts,
-            batch_size=32,
-            show_progress_bar=show_progress
-        )
-        
-        # 将 embeddings 赋值给文档
-        for doc, emb in zip(documents, embeddings):
-            doc.embedding = emb
+        self._embed_documents(documents, batch_size=32, show_progress=show_progress)
         
-        # 插入向量数据库
+        # 插入向量数据库，内容写入文档库
         success = self.vector_store.batch_upsert(documents)
+        self.document_store.put_many(documents)
         
         # 为 BM25 索引准备数据
         bm25_docs = [
@@ -97,6 +114,282 @@ class AdvancedRAGEngine:
         
         return success
     
+    def index_stream(
+        self,
+        documents: Iterable[Document],
+        batch_size: int = 256,
+        embed_batch_size: int = 32,
+        queue_size: int = 4,
+        show_progress: bool = True
+    ) -> Dict[str, Any]:
+        """
+        流式索引文档
+        
+        输入可以是任意可迭代对象（如生成器），按批读取，
+        分块 → embedding → 写入向量数据库 → BM25 四个阶段在各自线程中并行，
+        阶段之间用有界队列连接，内存占用只与批大小和队列长度有关。
+        与 index_documents 不同，BM25 索引是追加而不是替换。
+        
+        Args:
+            documents: 文档可迭代对象
+            batch_size: 每批读取的文档数
+            embed_batch_size: embedding 模型的批大小
+            queue_size: 阶段之间最多缓存的批次数
+            show_progress: 是否显示进度条
+        
+        Returns:
+            索引统计：是否成功、文档数、块数、总耗时以及各阶段吞吐
+        """
+        print("\n开始流式索引文档...")
+        report = {"success": True, "num_documents": 0, "num_chunks": 0}
+        progress = tqdm(desc="流式索引", unit="chunk", disable=not show_progress)
+        
+        def chunk_stage(batch: List[Document]) -> List[Document]:
+            report["num_documents"] += len(batch)
+            if self.use_parent_child:
+                return self._chunk_documents(batch)
+            return batch
+        
+        def embed_stage(batch: List[Document]) -> List[Document]:
+            self._embed_documents(batch, batch_size=embed_batch_size)
+            return batch
+        
+        def upsert_stage(batch: List[Document]) -> List[Document]:
+            if not self.vector_store.batch_upsert(batch):
+                report["success"] = False
+            return batch
+        
+        def bm25_stage(batch: List[Document]) -> None:
+            self.document_store.put_many(batch)
+            self.bm25_retriever.add_documents([
+                {"id": doc.id, "content": doc.content}
+                for doc in batch
+            ])
+            report["num_chunks"] += len(batch)
+            progress.update(len(batch))
+        
+        pipeline = StreamingPipeline(
+            [
+                ("chunk", chunk_stage),
+                ("embed", embed_stage),
+                ("upsert", upsert_stage),
+                ("bm25", bm25_stage),
+            ],
+            queue_size=queue_size
+        )
+        
+        start_time = time.perf_counter()
+        try:
+            pipeline.run(iter_batches(documents, batch_size))
+        except Exception as e:
+            print(f"✗ 流式索引失败: {e}")
+            report["success"] = False
+        finally:
+            progress.close()
+        
+        report["seconds"] = time.perf_counter() - start_time
+        report["stages"] = {name: stats.to_dict() for name, stats in pipeline.stats.items()}
+        
+        print(f"✓ 流式索引完成: {report['num_documents']} 条文档, "
+              f"{report['num_chunks']} 个块, 耗时 {report['seconds']:.2f} 秒")
+        for name, stats in pipeline.stats.items():
+            print(f"  - {name:<7} {stats.items:>8} 条  {stats.throughput:>10.1f} 条/秒")
+        
+        return report
+    
+    def sync_documents(
+        self,
+        documents: Iterable[Document],
+        batch_size: int = 256,
+        delete_missing: bool = True,
+        show_progress: bool = True
+    ) -> Dict[str, int]:
+        """
+        增量同步文档
+        
+        根据清单中记录的内容哈希和索引参数指纹判断每个文档是否变化：
+        未变化的文档跳过 embedding 和写入；新增和变化的文档重新分块、embedding 并写入
+        （写入成功后再删除变化文档不再使用的旧块，写入失败时旧块和清单记录保留、下次同步重试）；
+        清单中有但本次未出现的文档从向量数据库和 BM25 中删除。
+        
+        Args:
+            documents: 完整语料的文档可迭代对象
+            batch_size: 每批处理的文档数
+            delete_missing: 是否删除本次未出现的文档
+            show_progress: 是否显示进度条
+        
+        Returns:
+            各类文档数量：unchanged / added / updated / deleted
+        """
+        if self.manifest is None:
+            raise ValueError("增量同步需要在创建引擎时指定 manifest_path")
+        
+        print("\n开始增量同步文档...")
+        fingerprint = IndexManifest.compute_fingerprint(self._index_params())
+        run_id = self.manifest.begin_run()
+        counts = {"unchanged": 0, "added": 0, "updated": 0, "deleted": 0, "failed": 0}
+        
+        for batch in tqdm(iter_batches(documents, batch_size), desc="增量同步", unit="batch",
+                          disable=not show_progress):
+            hashes = {doc.id: IndexManifest.compute_hash(doc) for doc in batch}
+            existing = self.manifest.get_many(list(hashes))
+            
+            changed, unchanged = [], []
+            for doc in batch:
+                entry = existing.get(doc.id)
+                if entry and entry.content_hash == hashes[doc.id] and entry.fingerprint == fingerprint:
+                    unchanged.append(doc)
+                else:
+                    changed.append(doc)
+            
+            # 未变化的文档：只恢复缺失的内存索引（如新进程中的 BM25 和父块映射）
+            self._restore_in_memory_index(unchanged, existing)
+            self.manifest.touch_many([doc.id for doc in unchanged], run_id)
+            counts["unchanged"] += len(unchanged)
+            
+            if not changed:
+                continue
+            
+            # 变化的文档：先写入新块，成功后再删除旧块，失败时文档仍可按旧内容检索
+            chunk_ids = self._index_batch(changed)
+            if chunk_ids is None:
+                # 写入失败时保留旧的清单记录（内容哈希不变，下次同步会重试），
+                # 并标记为本次出现过，避免被当作已删除的文档清理
+                self.manifest.touch_many([doc.id for doc in changed if doc.id in existing], run_id)
+                counts["failed"] += len(changed)
+                continue
+            
+            # 同 ID 的块已被覆盖写入，只删除不再使用的旧块
+            stale_chunk_ids = []
+            for doc in changed:
+                if doc.id in existing:
+                    new_ids = set(chunk_ids[doc.id])
+                    stale_chunk_ids.extend(
+                        chunk_id for chunk_id in existing[doc.id].chunk_ids if chunk_id not in new_ids
+                    )
+            if stale_chunk_ids:
+                self._delete_chunks(stale_chunk_ids)
+            
+            self.manifest.put_many(
+                {
+                    doc.id: ManifestEntry(hashes[doc.id], fingerprint, chunk_ids[doc.id])
+                    for doc in changed
+                },
+                run_id
+            )
+            updated = sum(1 for doc in changed if doc.id in existing)
+            counts["updated"] += updated
+            counts["added"] += len(changed) - updated
+        
+        # 删除本次未出现的文档
+        if delete_missing:
+            stale = self.manifest.stale_entries(run_id)
+            if stale:
+                self._delete_chunks([chunk_id for _, chunk_ids in stale for chunk_id in chunk_ids])
+                self.manifest.delete_many([doc_id for doc_id, _ in stale])
+            counts["deleted"] = len(stale)
+        
+        print(f"✓ 增量同步完成: 新增 {counts['added']}, 更新 {counts['updated']}, "
+              f"删除 {counts['deleted']}, 未变化 {counts['unchanged']}, 失败 {counts['failed']}")
+        return counts
+    
+    def _index_params(self) -> Dict[str, Any]:
+        """影响索引结果的参数（用于增量同步的指纹）"""
+        return {
+            "use_parent_child": self.use_parent_child,
+            "child_size": self.CHILD_SIZE,
+            "parent_size": self.PARENT_SIZE,
+            "embedding_model": settings.embedding_model,
+        }
+    
+    def _index_batch(self, documents: List[Document]) -> Optional[Dict[str, List[str]]]:
+        """
+        索引一批文档（分块、embedding、写入向量数据库、追加 BM25）
+        
+        Returns:
+            文档 ID 到块 ID 列表的映射；写入向量数据库失败时返回 None
+        """
+        chunks = self._chunk_documents(documents) if self.use_parent_child else documents
+        self._embed_documents(chunks)
+        
+        if not self.vector_store.batch_upsert(chunks):
+            return None
+        
+        self.document_store.put_many(chunks)
+        self.bm25_retriever.add_documents([
+            {"id": chunk.id, "content": chunk.content}
+            for chunk in chunks
+        ])
+        
+        chunk_ids = {doc.id: [] for doc in documents}
+        for chunk in chunks:
+            doc_id = chunk.metadata["parent_doc_id"] if self.use_parent_child else chunk.id
+            chunk_ids[doc_id].append(chunk.id)
+        return chunk_ids
+    
+    def _restore_in_memory_index(
+        self,
+        documents: List[Document],
+        entries: Dict[str, ManifestEntry]
+    ):
+        """为未变化但不在内存索引中的文档重建 BM25、父块映射和文档库内容（不重新 embedding）"""
+        missing = [
+            doc for doc in documents
+            if entries[doc.id].chunk_ids and entries[doc.id].chunk_ids[0] not in self.bm25_retriever
+        ]
+        if not missing:
+            return
+        
+        chunks = self._chunk_documents(missing) if self.use_parent_child else missing
+        self.document_store.put_many(chunks)
+        self.bm25_retriever.add_documents([
+            {"id": chunk.id, "content": chunk.content}
+            for chunk in chunks
+        ])
+    
+    def _delete_chunks(self, chunk_ids: List[str]):
+        """从向量数据库、BM25、文档库和父块映射中删除块"""
+        self.vector_store.delete(chunk_ids)
+        self.bm25_retriever.delete_documents(chunk_ids)
+        self.document_store.delete_many(chunk_ids)
+        for chunk_id in chunk_ids:
+            self.child_to_parent.pop(chunk_id, None)
+    
+    def _chunk_documents(
+        self,
+        documents: List[Document],
+        show_progress: bool = False
+    ) -> List[Document]:
+        """父子分块，返回所有子块并记录子块到父块的映射"""
+        all_child_docs = []
+        for doc in tqdm(documents, desc="分块处理", disable=not show_progress):
+            child_docs, child_to_parent = ChunkingStrategy.create_parent_child_documents(
+                doc_id=doc.id,
+                text=doc.content,
+                metadata=doc.metadata,
+                child_size=self.CHILD_SIZE,
+                parent_size=self.PARENT_SIZE
+            )
+            all_child_docs.extend(child_docs)
+            self.child_to_parent.update(child_to_parent)
+        return all_child_docs
+    
+    def _embed_documents(
+        self,
+        documents: List[Document],
+        batch_size: int = 32,
+        show_progress: bool = False
+    ):
+        """生成 embeddings 并赋值给文档（每个文档持有矩阵的一行，不转换为列表）"""
+        texts = [doc.content for doc in documents]
+        embeddings = self.embedding_manager.encode_array(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=show_progress
+        )
+        for doc, emb in zip(documents, embeddings):
+            doc.embedding = emb
+    
     def search(
         self,
         query: str,
@@ -104,7 +397,8 @@ class AdvancedRAGEngine:
         filters: Optional[Dict[str, Any]] = None,
         enable_hybrid: bool = True,
         enable_multi_query: bool = False,
-        enable_hyde: bool = False
+        enable_hyde: bool = False,
+        enable_parallel: bool = False
     ) -> List[SearchResult]:
         """
         高级检索
@@ -116,6 +410,7 @@ class AdvancedRAGEngine:
             enable_hybrid: 是否启用混合检索
             enable_multi_query: 是否启用 Multi-Query
             enable_hyde: 是否启用 HyDE
+            enable_parallel: 是否并行执行所有 (查询 × 检索器) 分支
         
         Returns:
             检索结果列表
@@ -138,61 +433,304 @@ class AdvancedRAGEngine:
             queries_to_search.append(hypothetical_doc)
         
         # 对所有查询进行检索
-        all_results = []
-        for q in queries_to_search:
-            if enable_hybrid:
-                results = self._hybrid_search(q, top_k, filters)
-            else:
-                results = self._vector_search(q, top_k, filters)
-            all_results.extend(results)
+        if enable_parallel:
+            all_results = self._parallel_search(queries_to_search, top_k, filters, enable_hybrid)
+        else:
+            all_results = [
+                result
+                for results in self._batch_search(queries_to_search, top_k, filters, enable_hybrid)
+                for result in results
+            ]
         
-        # 去重并合并结果
-        unique_results = self._merge_results(all_results)
+        # 去重并合并结果，截断后再从文档库取回内容
+        unique_results = self._hydrate(self._merge_results(all_results)[:top_k])
         
         # 如果使用父子分块，替换为父块内容
         if self.use_parent_child:
             unique_results = self._replace_with_parent(unique_results)
         
-        return unique_results[:top_k]
+        return unique_results
     
     def _vector_search(
         self,
         query: str,
         top_k: int,
         filters: Optional[Dict[str, Any]]
+    ) -> List[Hit]:
+        """纯向量检索（只取回 ID 和分数）"""
+        query_embedding = self.embedding_manager.encode_query(query)
+        return self.vector_store.search_hits(query_embedding, top_k, filters)
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 20,
+        filters: Optional[Dict[str, Any]] = None,
+        enable_hybrid: bool = True
+    ) -> List[List[SearchResult]]:
+        """
+        批量检索
+        
+        所有查询在一次模型前向中完成编码，并通过一次向量数据库请求完成检索，
+        适合 Multi-Query 扩展和离线批量评测。
+        
+        Args:
+            queries: 查询文本列表
+            top_k: 每个查询返回的结果数量
+            filters: 元数据过滤（对所有查询生效）
+            enable_hybrid: 是否启用混合检索
+        
+        Returns:
+            与查询一一对应的检索结果列表
+        """
+        batch_results = self._batch_search(queries, top_k, filters, enable_hybrid)
+        batch_results = self._hydrate_batch([results[:top_k] for results in batch_results])
+        
+        if self.use_parent_child:
+            batch_results = [self._replace_with_parent(results) for results in batch_results]
+        
+        return batch_results
+    
+    def _batch_search(
+        self,
+        queries: List[str],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        enable_hybrid: bool
+    ) -> List[List[Hit]]:
+        """批量编码 + 批量向量检索（只取回 ID 和分数），混合检索时逐个查询与 BM25 结果融合"""
+        if not queries:
+            return []
+        
+        query_embeddings = self.embedding_manager.encode_query(queries)
+        batch_results = self.vector_store.search_hits_batch(query_embeddings, top_k, filters)
+        
+        if enable_hybrid:
+            batch_results = [
+                self._fuse(vector_results, self.bm25_retriever.search(q, top_k), filters)
+                for q, vector_results in zip(queries, batch_results)
+            ]
+        
+        return batch_results
+    
+    def _parallel_search(
+        self,
+        queries: List[str],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        enable_hybrid: bool
+    ) -> List[Hit]:
+        """
+        并行检索：所有 (查询 × 检索器) 分支同时提交到有界线程池，
+        全部完成后按查询顺序融合，结果与串行检索一致
+        """
+        executor = self._get_search_executor()
+        
+        vector_futures = [
+            executor.submit(self._vector_search, q, top_k, filters)
+            for q in queries
+        ]
+        bm25_futures = [
+            executor.submit(self.bm25_retriever.search, q, top_k)
+            for q in queries
+        ] if enable_hybrid else []
+        
+        all_results = []
+        for i, future in enumerate(vector_futures):
+            results = future.result()
+            if enable_hybrid:
+                results = self._fuse(results, bm25_futures[i].result(), filters)
+            all_results.extend(results)
+        
+        return all_results
+    
+    @property
+    def embedding_manager(self) -> Union[EmbeddingManager, EmbeddingClient]:
+        """embedding 模型（首次使用时获取；同一配置的引擎共享一份，配置了 embedding 服务时共享服务进程中的模型）"""
+        if self._embedding_manager is None:
+            with self._components_lock:
+                if self._embedding_manager is None:
+                    if settings.embedding_server_address:
+                        self._embedding_manager = self._acquire(
+                            ("embedding-server", settings.embedding_server_address),
+                            lambda: EmbeddingClient(settings.embedding_server_address)
+                        )
+                    else:
+                        self._embedding_manager = self._acquire(
+                            ("embedding", settings.embedding_model, settings.embedding_backend),
+                            EmbeddingManager
+                        )
+        return self._embedding_manager
+    
+    @property
+    def deepseek_client(self) -> "DeepSeekClient":
+        """DeepSeek 客户端（首次使用时获取，同一配置的引擎共享）"""
+        if self._deepseek_client is None:
+            with self._components_lock:
+                if self._deepseek_client is None:
+                    from src.llm.deepseek_client import DeepSeekClient
+                    self._deepseek_client = self._acquire(
+                        ("deepseek", settings.deepseek_base_url, settings.deepseek_model),
+                        DeepSeekClient
+                    )
+        return self._deepseek_client
+    
+    @property
+    def async_deepseek_client(self) -> "AsyncDeepSeekClient":
+        """
+        异步 DeepSeek 客户端（首次使用时创建）
+        
+        不经注册表共享：连接池绑定事件循环且只能在所属循环中关闭，
+        各引擎持有自己的客户端，由 aclose() 在调用方的事件循环中关闭
+        """
+        if self._async_deepseek_client is None:
+            with self._components_lock:
+                if self._async_deepseek_client is None:
+                    from src.llm.deepseek_client import AsyncDeepSeekClient
+                    self._async_deepseek_client = AsyncDeepSeekClient()
+        return self._async_deepseek_client
+    
+    def _acquire(self, key: tuple, factory) -> Any:
+        """从进程级注册表获取共享资源，并记录 key 以便 close() 时释放"""
+        resource = registry.acquire(key, factory)
+        self._resource_keys.append(key)
+        return resource
+    
+    def _get_search_executor(self) -> ThreadPoolExecutor:
+        """获取并行检索线程池（首次使用时创建）"""
+        if self._search_executor is None:
+            self._search_executor = ThreadPoolExecutor(
+                max_workers=self.max_search_workers,
+                thread_name_prefix="rag-search"
+            )
+        return self._search_executor
+    
+    def close(self):
+        """释放引擎持有的线程池、清单文件、文档库、BM25 合并线程等资源，并释放对共享 embedding 模型和 LLM 客户端的引用"""
+        self.bm25_retriever.close()
+        self.document_store.close()
+        # 共享资源只释放本引擎的引用，最后一个引擎关闭时才真正关闭
+        for key in self._resource_keys:
+            registry.release(key)
+        self._resource_keys = []
+        self._embedding_manager = None
+        self._deepseek_client = None
+        self._async_deepseek_client = None
+        if self._search_executor is not None:
+            self._search_executor.shutdown(wait=True)
+            self._search_executor = None
+        if self.manifest is not None:
+            self.manifest.close()
+            self.manifest = None
+    
+    async def aclose(self):
+        """关闭当前事件循环中的异步 LLM 连接池，再释放 close() 中的全部资源"""
+        if self._async_deepseek_client is not None:
+            await self._async_deepseek_client.aclose()
+        self.close()
+    
+    async def asearch(
+        self,
+        query: str,
+        top_k: int = 20,
+        filters: Optional[Dict[str, Any]] = None,
+        enable_hybrid: bool = True,
+        enable_multi_query: bool = False,
+        enable_hyde: bool = False
     ) -> List[SearchResult]:
-        """纯向量检索"""
-        query_embedding = self.embedding_manager.encode(query)
-        return self.vector_store.search(query_embedding, top_k, filters)
+        """
+        异步检索
+        
+        向量检索通过向量数据库的异步接口执行，不占用线程等待网络往返，
+        适合在同一个事件循环中并发处理大量查询。Multi-Query 与 HyDE
+        的 LLM 调用并发执行，各查询的检索也并发执行。
+        
+        Args:
+            query: 查询文本
+            top_k: 返回结果数量
+            filters: 元数据过滤
+            enable_hybrid: 是否启用混合检索
+            enable_multi_query: 是否启用 Multi-Query
+            enable_hyde: 是否启用 HyDE
+        
+        Returns:
+            检索结果列表
+        """
+        queries_to_search = [query]
+        
+        # Multi-Query 和 HyDE 互不依赖，并发生成
+        expansions = []
+        if enable_multi_query:
+            expansions.append(self.async_deepseek_client.generate_multi_queries(query, num_queries=3))
+        if enable_hyde:
+            expansions.append(self.async_deepseek_client.generate_hypothetical_document(query))
+        
+        if expansions:
+            expanded = await asyncio.gather(*expansions)
+            if enable_multi_query:
+                queries_to_search = expanded[0]
+            if enable_hyde:
+                queries_to_search = queries_to_search + [expanded[-1]]
+        
+        # 对所有查询并发检索
+        all_results = await asyncio.gather(*[
+            self._asearch_single(q, top_k, filters, enable_hybrid)
+            for q in queries_to_search
+        ])
+        
+        # 去重并合并结果，截断后再从文档库取回内容
+        unique_results = self._merge_results([r for results in all_results for r in results])[:top_k]
+        unique_results = await asyncio.to_thread(self._hydrate, unique_results)
+        
+        if self.use_parent_child:
+            unique_results = self._replace_with_parent(unique_results)
+        
+        return unique_results
     
-    def _hybrid_search(
+    async def _asearch_single(
         self,
         query: str,
         top_k: int,
+        filters: Optional[Dict[str, Any]],
+        enable_hybrid: bool
+    ) -> List[Hit]:
+        """单个查询的异步检索（向量检索，可选 BM25 融合；只取回 ID 和分数）"""
+        # 查询编码是 CPU 计算，放到线程中执行
+        query_embedding = await asyncio.to_thread(self.embedding_manager.encode_query, query)
+        results = await self.vector_store.asearch_hits(query_embedding, top_k, filters)
+        
+        if enable_hybrid:
+            # BM25 打分（分片时还要等待进程间通信）同样放到线程中，不阻塞事件循环
+            bm25_results = await asyncio.to_thread(self.bm25_retriever.search, query, top_k)
+            results = self._fuse(results, bm25_results, filters)
+        
+        return results
+    
+    def _fuse(
+        self,
+        vector_results: List[Hit],
+        bm25_results: List[tuple],
         filters: Optional[Dict[str, Any]]
-    ) -> List[SearchResult]:
-        """混合检索（向量 + BM25）"""
-        # 向量检索
-        vector_results = self._vector_search(query, top_k, filters)
-        
-        # BM25 检索
-        bm25_results = self.bm25_retriever.search(query, top_k)
+    ) -> List[Hit]:
+        """
+        RRF 融合向量检索和 BM25 结果
         
-        # RRF 融合
-        hybrid_results = self.hybrid_engine.reciprocal_rank_fusion(
+        BM25 索引不支持元数据过滤：有过滤条件时只有 BM25 命中的文档可能不满足条件，
+        因此只用 BM25 为（已按条件过滤的）向量命中加分。
+        """
+        return self.hybrid_engine.reciprocal_rank_fusion(
             vector_results,
             bm25_results,
-            vector_weight=0.6
+            vector_weight=0.6,
+            include_bm25_only=not filters
         )
-        
-        return hybrid_results
     
-    def _merge_results(self, results: List[SearchResult]) -> List[SearchResult]:
+    def _merge_results(self, results: List[Hit]) -> List[Hit]:
         """合并和去重检索结果"""
         # 使用文档ID去重
         doc_map = {}
         for result in results:
-            doc_id = result.document.id
+            doc_id = result.id
             if doc_id not in doc_map:
                 doc_map[doc_id] = result
             else:
@@ -205,6 +743,43 @@ class AdvancedRAGEngine:
         merged.sort(key=lambda x: x.score, reverse=True)
         return merged
     
+    def _hydrate(self, hits: List[Hit]) -> List[SearchResult]:
+        """从文档库取回命中的内容和元数据，转换为检索结果"""
+        return self._hydrate_batch([hits])[0]
+    
+    def _hydrate_batch(self, batch_hits: List[List[Hit]]) -> List[List[SearchResult]]:
+        """
+        批量补全多组命中（一次读取文档库），转换为检索结果
+        
+        文档库中没有的结果（升级前、或由其他进程/主机索引的集合）从向量数据库按 ID 读取，
+        并回填到本地文档库，之后的检索直接命中文档库；向量数据库中也读不到的结果才被丢弃。
+        """
+        doc_ids = list(dict.fromkeys(hit.id for hits in batch_hits for hit in hits))
+        documents = self.document_store.get_many(doc_ids)
+        
+        missing_ids = [doc_id for doc_id in doc_ids if doc_id not in documents]
+        if missing_ids:
+            fetched = self.vector_store.get_documents(missing_ids)
+            if fetched:
+                self.document_store.put_many(list(fetched.values()))
+                documents.update(fetched)
+        
+        hydrated_batch = []
+        dropped = 0
+        for hits in batch_hits:
+            hydrated = []
+            for hit in hits:
+                document = documents.get(hit.id)
+                if document is None:
+                    dropped += 1
+                    continue
+                hydrated.append(hit.to_search_result(document))
+            hydrated_batch.append(hydrated)
+        
+        if dropped:
+            print(f"✗ 文档库和向量数据库中都读不到 {dropped} 条检索结果的内容，已跳过")
+        return hydrated_batch
+    
     def _replace_with_parent(self, results: List[SearchResult]) -> List[SearchResult]:
         """将子块替换为父块"""
         replaced_results = []
@@ -278,7 +853,8 @@ class AdvancedRAGEngine:
             filters=request.filters,
             enable_hybrid=request.enable_hybrid,
             enable_multi_query=True,
-            enable_hyde=False
+            enable_hyde=False,
+            enable_parallel=True
         )
         
         print(f"✓ 检索到 {len(results)} 条结果")
@@ -301,3 +877,59 @@ class AdvancedRAGEngine:
             "answer": answer,
             "num_results": len(results)
         }
+    
+    async def arerank(
+        self,
+        query: str,
+        results: List[SearchResult],
+        top_k: int = 5
+    ) -> List[SearchResult]:
+        """使用 DeepSeek 异步重排序（参数与 rerank 相同）"""
+        if not results:
+            return []
+        
+        documents = [r.document.content for r in results]
+        rerank_scores = await self.async_deepseek_client.rerank_documents(query, documents, top_k)
+        
+        reranked_results = []
+        for idx, score in rerank_scores:
+            result = results[idx]
+            result.score = score
+            result.rank = len(reranked_results) + 1
+            reranked_results.append(result)
+        
+        return reranked_results
+    
+    async def aquery(
+        self,
+        request: QueryRequest,
+        return_answer: bool = True
+    ) -> Dict[str, Any]:
+        """
+        异步版本的完整查询流程（参数与 query 相同）
+        
+        LLM 调用与向量检索都不阻塞线程，多个请求可以在同一个事件循环中重叠执行。
+        """
+        results = await self.asearch(
+            query=request.query,
+            top_k=request.top_k,
+            filters=request.filters,
+            enable_hybrid=request.enable_hybrid,
+            enable_multi_query=True,
+            enable_hyde=False
+        )
+        
+        if request.enable_rerank and len(results) > 0:
+            results = await self.arerank(request.query, results, top_k=5)
+        
+        answer = ""
+        if return_answer and len(results) > 0:
+            contexts = [r.document.content for r in results[:5]]
+            answer = await self.async_deepseek_client.answer_with_context(request.query, contexts)
+        
+        return {
+            "query": request.query,
+            "results": results,
+            "answer": answer,
+            "num_results": len(results)
+        }
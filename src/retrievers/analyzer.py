@@ -0,0 +1,209 @@
+"""
+BM25 分词器（Analyzer）
+索引和查询共用同一条分词链：切分 -> 小写化 -> 停用词过滤。
+
+支持的切分模式：
+- char: 英文单词整体保留、其余按字切分（与早期 BM25Retriever._tokenize 完全一致）
+- bigram: 中日韩文字按相邻二字切分，英文/数字按单词切分，倒排表更短、区分度更高
+- jieba: 使用 jieba 词典分词（需要安装 jieba，未安装时回退为 bigram）
+"""
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+from src.core.config import settings
+
+
+# 标点（char 模式先替换为空格再按空白切分）
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_ASCII_WORD_RE = re.compile(r'[a-zA-Z]+')
+
+# 中日韩文字：假名、CJK 统一表意文字（含扩展 A 和兼容区）、韩文音节
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+# 第一组为连续的中日韩文字，第二组为其他单词字符（英文、数字等）
+_TOKEN_RE = re.compile(f'([{_CJK}]+)|([^\\W{_CJK}]+)')
+_WORD_RE = re.compile(r'\w')
+
+# 批量分词的进程池（首次并行分词时创建，之后复用）
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+class Analyzer:
+    """可配置的分词链"""
+    
+    MODES = ("char", "bigram", "jieba")
+    
+    # 文本数量低于该值时在当前进程中分词（进程池的启动和传输开销不划算）
+    _PARALLEL_MIN_TEXTS = 2000
+    
+    def __init__(
+        self,
+        mode: str = "char",
+        lowercase: bool = True,
+        stopwords: Optional[Iterable[str]] = None
+    ):
+        """
+        初始化分词器
+        
+        Args:
+            mode: 切分模式（char / bigram / jieba）
+            lowercase: 是否将英文转为小写
+            stopwords: 停用词集合（过滤在切分和小写化之后进行）
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"不支持的分词模式: {mode}（可选 {', '.join(self.MODES)}）")
+        
+        if mode == "jieba":
+            try:
+                import jieba  # noqa: F401
+            except ImportError:
+                print("✗ 未安装 jieba，BM25 分词回退为 bigram 模式")
+                mode = "bigram"
+        
+        self.mode = mode
+        self.lowercase = lowercase
+        self.stopwords = frozenset(stopwords or ())
+    
+    @classmethod
+    def from_settings(cls) -> "Analyzer":
+        """根据全局配置创建分词器"""
+        stopwords = load_stopwords(settings.bm25_stopwords_path) if settings.bm25_stopwords_path else None
+        return cls(mode=settings.bm25_analyzer, stopwords=stopwords)
+    
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "Analyzer":
+        """由 config() 的结果恢复分词器"""
+        return cls(
+            mode=config["mode"],
+            lowercase=config["lowercase"],
+            stopwords=config["stopwords"]
+        )
+    
+    def config(self) -> Dict[str, Any]:
+        """分词器配置（随 BM25 索引一起保存，保证查询与索引使用同一分词链）"""
+        return {
+            "mode": self.mode,
+            "lowercase": self.lowercase,
+            "stopwords": sorted(self.stopwords),
+        }
+    
+    def tokenize(self, text: str) -> List[str]:
+        """
+        对单个文本分词
+        
+        Args:
+            text: 待分词文本
+        
+        Returns:
+            词列表
+        """
+        if self.mode == "char":
+            tokens = self._split_chars(text)
+        elif self.mode == "bigram":
+            tokens = self._split_bigrams(text)
+        else:
+            tokens = self._split_jieba(text)
+        
+        if self.stopwords:
+            tokens = [token for token in tokens if token not in self.stopwords]
+        return tokens
+    
+    def tokenize_many(self, texts: List[str], workers: int = 1) -> List[List[str]]:
+        """
+        批量分词，文本较多时使用进程池并行（绕开 GIL，进程池在进程内复用）
+        
+        Args:
+            texts: 文本列表
+            workers: 进程数，<= 1 时在当前进程中分词，0 表示使用全部 CPU 核
+        
+        Returns:
+            与输入一一对应的词列表
+        """
+        if workers == 0:
+            workers = _available_cpus()
+        if workers <= 1 or len(texts) < self._PARALLEL_MIN_TEXTS:
+            return [self.tokenize(text) for text in texts]
+        
+        chunksize = max(1, len(texts) // (workers * 4))
+        return list(_get_pool(workers).map(self.tokenize, texts, chunksize=chunksize))
+    
+    def _split_chars(self, text: str) -> List[str]:
+        """英文单词整体保留，其余按字切分"""
+        tokens = []
+        for word in _PUNCT_RE.sub(' ', text).split():
+            if _ASCII_WORD_RE.fullmatch(word):
+                tokens.append(word.lower() if self.lowercase else word)
+            else:
+                tokens.extend(word)
+        return tokens
+    
+    def _split_bigrams(self, text: str) -> List[str]:
+        """中日韩文字切为相邻二字（单字保留），其他单词整体保留"""
+        tokens = []
+        for cjk, word in _TOKEN_RE.findall(text):
+            if cjk:
+                if len(cjk) == 1:
+                    tokens.append(cjk)
+                else:
+                    tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            else:
+                tokens.append(word.lower() if self.lowercase else word)
+        return tokens
+    
+    def _split_jieba(self, text: str) -> List[str]:
+        """jieba 搜索引擎模式分词（长词额外切出子词，提高召回）"""
+        import jieba
+        
+        tokens = []
+        for word in jieba.cut_for_search(text):
+            word = word.strip()
+            if word and _WORD_RE.search(word):
+                tokens.append(word.lower() if self.lowercase else word)
+        return tokens
+
+
+def load_stopwords(path: str) -> List[str]:
+    """
+    读取停用词文件（每行一个词，# 开头为注释）
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        停用词列表
+    """
+    with open(path, encoding="utf-8") as f:
+        return [
+            line.strip() for line in f
+            if line.strip() and not line.startswith("#")
+        ]
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    获取批量分词进程池（进程数变化时重建）
+    
+    使用 spawn 启动：调用方（如 Web 服务）通常已有多个线程，fork 会继承它们持有的锁而可能卡死
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def _available_cpus() -> int:
+    """当前进程可用的 CPU 核数（考虑容器/亲和性限制）"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
@@ -0,0 +1,483 @@
+"""
+BM25 倒排索引段
+整数词典 + 紧凑的 numpy 倒排表（文档号、词频），
+检索时只访问包含查询词的文档，得分与 Okapi BM25（rank_bm25.BM25Okapi）一致。
+top-k 检索支持基于块级上界的 MaxScore 动态剪枝（Block-Max MaxScore），结果仍是精确 top-k。
+
+段本身不保存 idf、avgdl 等随语料变化的全局统计，查询时由 SegmentedIndex 传入，
+因此段在写入后不再修改（删除只翻转 live 标记）
+"""
+from collections import Counter
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+
+
+# 查询词：(段内词号, 全局 idf)，按查询中出现的顺序排列（重复的词保留）
+QueryTerms = List[Tuple[int, float]]
+
+
+class BM25Params:
+    """查询时的 BM25 参数与全局统计"""
+    
+    def __init__(self, k1: float, b: float, avgdl: float):
+        self.k1 = k1
+        self.b = b
+        self.avgdl = avgdl
+    
+    def norm(self, doc_len: np.ndarray) -> np.ndarray:
+        """文档长度归一化项 k1 * (1 - b + b * dl / avgdl)"""
+        return self.k1 * (1 - self.b + self.b * doc_len / self.avgdl)
+
+
+class InvertedIndex:
+    """
+    不可变的 BM25 倒排索引段
+    
+    除倒排表外还保存正排表（每个文档包含的词号），删除文档时据此更新段内的存活文档频率 live_df。
+    """
+    
+    # 剪枝判断时的相对安全边界，抵消浮点舍入带来的上界误差
+    _BOUND_MARGIN = 1e-9
+    # 查询词倒排表总长度低于该值时直接穷举打分（剪枝的固定开销不划算）
+    _PRUNE_MIN_POSTINGS = 10000
+    # 持久化时保存的只读数组（见 bm25_storage）
+    ARRAY_FIELDS = (
+        "indptr", "post_docs", "post_tfs", "df", "doc_len", "seqs",
+        "fwd_indptr", "fwd_terms",
+        "block_indptr", "block_start", "block_end", "block_max_tf", "block_min_len",
+    )
+    # 持久化时保存、加载后需要可写的数组
+    MUTABLE_FIELDS = ("live", "live_df")
+    
+    def __init__(
+        self,
+        tokenized_corpus: List[List[str]],
+        doc_ids: Sequence[str],
+        seqs: Optional[np.ndarray] = None,
+        block_size: int = 128
+    ):
+        """
+        从分词后的语料构建段
+        
+        Args:
+            tokenized_corpus: 每个文档的词列表
+            doc_ids: 文档 ID（与 tokenized_corpus 一一对应）
+            seqs: 文档的全局写入序号（同分时序号小的在前），默认 0..n-1
+            block_size: 倒排表分块大小（用于块级上界剪枝）
+        """
+        # 词典按词首次出现的顺序编号
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        docs: List[int] = []
+        tfs: List[int] = []
+        doc_len = np.zeros(len(tokenized_corpus), dtype=np.int64)
+        
+        for doc_idx, tokens in enumerate(tokenized_corpus):
+            doc_len[doc_idx] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                docs.append(doc_idx)
+                tfs.append(tf)
+        
+        if seqs is None:
+            seqs = np.arange(len(tokenized_corpus), dtype=np.int64)
+        self._build(
+            vocab,
+            np.asarray(term_ids, dtype=np.int64),
+            np.asarray(docs, dtype=np.int32),
+            np.asarray(tfs, dtype=np.int32),
+            doc_len,
+            doc_ids,
+            np.asarray(seqs, dtype=np.int64),
+            block_size
+        )
+    
+    def _build(
+        self,
+        vocab: Mapping[str, int],
+        term_ids: np.ndarray,
+        docs: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        doc_ids: Sequence[str],
+        seqs: np.ndarray,
+        block_size: int
+    ):
+        """由 (词号, 文档号, 词频) 三元组构建倒排表、正排表和块级统计"""
+        self.vocab = vocab
+        self.doc_ids = doc_ids
+        self.seqs = seqs
+        self.doc_len = doc_len
+        self.block_size = block_size
+        self.num_docs = len(doc_len)
+        
+        # 按词号排序得到 CSR 形式的倒排表，同一词内文档号保持递增
+        order = np.lexsort((docs, term_ids))
+        self.post_docs = docs[order]
+        self.post_tfs = tfs[order]
+        self.df = np.bincount(term_ids, minlength=len(vocab)).astype(np.int64)
+        self.indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(self.df, out=self.indptr[1:])
+        
+        # 正排表：按文档号排序的词号
+        order = np.lexsort((term_ids, docs))
+        self.fwd_terms = term_ids[order].astype(np.int32)
+        self.fwd_indptr = np.zeros(self.num_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(docs, minlength=self.num_docs), out=self.fwd_indptr[1:])
+        
+        self._build_blocks()
+        self.live = np.ones(self.num_docs, dtype=bool)
+        self.live_df = self.df.copy()
+        self.num_live = self.num_docs
+    
+    def _build_blocks(self):
+        """
+        将每个词的倒排表按 block_size 切块，记录块内最大词频和最短文档长度
+        
+        BM25 单词贡献 tf*(k1+1)/(tf+norm) 随 tf 递增、随文档长度递减，
+        因此块内 (最大 tf, 最短长度) 处的值就是该块的上界；avgdl 在查询时才确定，上界也在查询时计算。
+        """
+        num_blocks = (self.df + self.block_size - 1) // self.block_size
+        self.block_indptr = np.zeros(len(self.df) + 1, dtype=np.int64)
+        np.cumsum(num_blocks, out=self.block_indptr[1:])
+        
+        block_term = np.repeat(np.arange(len(self.df)), num_blocks)
+        local = np.arange(len(block_term)) - self.block_indptr[block_term]
+        self.block_start = self.indptr[block_term] + local * self.block_size
+        self.block_end = np.minimum(self.block_start + self.block_size, self.indptr[block_term + 1])
+        
+        if len(self.block_start):
+            self.block_max_tf = np.maximum.reduceat(self.post_tfs, self.block_start)
+            self.block_min_len = np.minimum.reduceat(self.doc_len[self.post_docs], self.block_start)
+        else:
+            self.block_max_tf = np.zeros(0, dtype=np.int32)
+            self.block_min_len = np.zeros(0, dtype=np.int64)
+    
+    @classmethod
+    def from_arrays(
+        cls,
+        arrays: Dict[str, np.ndarray],
+        vocab: Mapping[str, int],
+        doc_ids: Sequence[str],
+        block_size: int
+    ) -> "InvertedIndex":
+        """
+        由已构建好的数组恢复段（用于从磁盘加载，只读数组可以是内存映射）
+        
+        Args:
+            arrays: ARRAY_FIELDS 和 MUTABLE_FIELDS 中的各数组
+            vocab: 词 -> 词号映射，迭代顺序须与词号一致
+            doc_ids: 文档 ID
+            block_size: 倒排表分块大小
+        
+        Returns:
+            索引段
+        """
+        segment = cls.__new__(cls)
+        segment.vocab = vocab
+        segment.doc_ids = doc_ids
+        segment.block_size = block_size
+        for name in cls.ARRAY_FIELDS:
+            setattr(segment, name, arrays[name])
+        # 删除标记和存活文档频率会被修改，复制到内存
+        segment.live = np.array(arrays["live"], dtype=bool)
+        segment.live_df = np.array(arrays["live_df"], dtype=np.int64)
+        segment.num_docs = len(segment.doc_len)
+        segment.num_live = int(segment.live.sum())
+        return segment
+    
+    @classmethod
+    def merge(
+        cls,
+        segments: List["InvertedIndex"],
+        block_size: int,
+        live_masks: Optional[List[np.ndarray]] = None
+    ) -> "InvertedIndex":
+        """
+        合并多个段，丢弃已删除的文档（按段的顺序拼接，保持写入序号递增）
+        
+        只做数组运算，不需要还原原文或重新分词。
+        
+        Args:
+            segments: 待合并的段（按写入序号排列）
+            block_size: 新段的分块大小
+            live_masks: 各段的存活标记快照，默认使用段当前的 live
+        
+        Returns:
+            新段
+        """
+        if live_masks is None:
+            live_masks = [segment.live for segment in segments]
+        
+        vocab: Dict[str, int] = {}
+        term_parts, doc_parts, tf_parts = [], [], []
+        doc_ids: List[str] = []
+        seq_parts, len_parts = [], []
+        
+        for segment, live in zip(segments, live_masks):
+            # 旧词号 -> 新词号
+            remap = np.asarray(
+                [vocab.setdefault(term, len(vocab)) for term in segment.vocab],
+                dtype=np.int64
+            )
+            # 旧文档号 -> 新文档号（已删除的为 -1）
+            live_docs = np.nonzero(live)[0]
+            doc_map = np.full(segment.num_docs, -1, dtype=np.int64)
+            doc_map[live_docs] = np.arange(len(live_docs)) + len(doc_ids)
+            
+            post_terms = np.repeat(np.arange(len(segment.df)), segment.df)
+            new_docs = doc_map[segment.post_docs]
+            keep = new_docs >= 0
+            term_parts.append(remap[post_terms[keep]])
+            doc_parts.append(new_docs[keep])
+            tf_parts.append(segment.post_tfs[keep])
+            
+            doc_ids.extend(segment.doc_ids[i] for i in live_docs.tolist())
+            seq_parts.append(segment.seqs[live_docs])
+            len_parts.append(segment.doc_len[live_docs])
+        
+        merged = cls.__new__(cls)
+        merged._build(
+            vocab,
+            _concat(term_parts, np.int64),
+            _concat(doc_parts, np.int64).astype(np.int32),
+            _concat(tf_parts, np.int32),
+            _concat(len_parts, np.int64),
+            doc_ids,
+            _concat(seq_parts, np.int64),
+            block_size
+        )
+        return merged
+    
+    def __len__(self) -> int:
+        return self.num_live
+    
+    def delete(self, docs: np.ndarray) -> Tuple[int, int]:
+        """
+        标记删除段内文档，并更新存活文档频率
+        
+        Args:
+            docs: 段内文档号
+        
+        Returns:
+            (实际删除的文档数, 删除文档的总长度)
+        """
+        docs = np.unique(np.asarray(docs, dtype=np.int64))
+        docs = docs[self.live[docs]]
+        if not len(docs):
+            return 0, 0
+        
+        self.live[docs] = False
+        positions = _block_positions(self.fwd_indptr[docs], self.fwd_indptr[docs + 1])
+        np.subtract.at(self.live_df, self.fwd_terms[positions], 1)
+        self.num_live -= len(docs)
+        return len(docs), int(self.doc_len[docs].sum())
+    
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """获取某个词的倒排表 (文档号, 词频)，包含已删除的文档"""
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        return self.post_docs[start:end], self.post_tfs[start:end]
+    
+    def search(
+        self,
+        query: QueryTerms,
+        k: int,
+        params: BM25Params,
+        theta: Optional[float] = None,
+        prune: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        在段内检索，返回可能进入全局 top-k 的存活文档及其精确得分
+        
+        Args:
+            query: 查询词（段内词号, idf）
+            k: 返回数量
+            params: BM25 参数与全局统计
+            theta: 其他段已得到的第 k 名分数，剪枝时得分不可能达到它的文档不会返回
+            prune: 是否启用 MaxScore 动态剪枝
+        
+        Returns:
+            (段内文档号, 得分, 实际打分的倒排项数)；不剪枝时返回包含任一查询词的全部存活文档
+        """
+        # 段内没有倒排项的词（合并后残留在词表中）对得分没有贡献
+        query = [(term_id, idf) for term_id, idf in query if self.df[term_id] > 0]
+        postings_total = int(sum(self.df[term_id] for term_id, _ in query))
+        if prune and k > 0 and postings_total >= self._PRUNE_MIN_POSTINGS:
+            results = self._search_maxscore(query, k, params, theta, postings_total)
+            if results is not None:
+                return results
+        
+        docs, scores = self._score_terms(query, params)
+        keep = self.live[docs]
+        return docs[keep], scores[keep], postings_total
+    
+    def _score_terms(self, query: QueryTerms, params: BM25Params) -> Tuple[np.ndarray, np.ndarray]:
+        """对查询词倒排表中的所有文档打分"""
+        parts = []
+        for term_id, idf in query:
+            docs, tfs = self.postings(term_id)
+            parts.append((docs, idf * (tfs * (params.k1 + 1) / (tfs + params.norm(self.doc_len[docs])))))
+        if not parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        
+        # 按查询词顺序累加，浮点结果与逐词累加的稠密实现完全一致
+        docs = np.concatenate([d for d, _ in parts])
+        contribs = np.concatenate([c for _, c in parts])
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=contribs, minlength=len(unique_docs))
+        return unique_docs, scores
+    
+    def _score_docs(self, docs: np.ndarray, query: QueryTerms, params: BM25Params) -> np.ndarray:
+        """
+        对给定文档精确打分（在各查询词的倒排表中二分查找词频）
+        
+        累加顺序与 _score_terms 相同，得分逐位一致。
+        
+        Args:
+            docs: 递增的段内文档号数组
+            query: 查询词（含重复）
+            params: BM25 参数与全局统计
+        """
+        scores = np.zeros(len(docs), dtype=np.float64)
+        norm = params.norm(self.doc_len[docs])
+        for term_id, idf in query:
+            post_docs, post_tfs = self.postings(term_id)
+            pos = np.searchsorted(post_docs, docs)
+            pos[pos == len(post_docs)] = 0
+            tfs = np.where(post_docs[pos] == docs, post_tfs[pos], 0)
+            scores += idf * (tfs * (params.k1 + 1) / (tfs + norm))
+        return scores
+    
+    def _block_bounds(self, term_id: int, params: BM25Params) -> np.ndarray:
+        """某个词各个块的得分上界（未乘 idf）"""
+        first, last = self.block_indptr[term_id], self.block_indptr[term_id + 1]
+        max_tf = self.block_max_tf[first:last].astype(np.float64)
+        return max_tf * (params.k1 + 1) / (max_tf + params.norm(self.block_min_len[first:last]))
+    
+    def _search_maxscore(
+        self,
+        query: QueryTerms,
+        k: int,
+        params: BM25Params,
+        theta: Optional[float],
+        postings_total: int
+    ) -> Optional[Tuple[np.ndarray, np.ndarray, int]]:
+        """
+        Block-Max MaxScore 剪枝
+        
+        1. 没有外部阈值时，先对上界最大的词（通常是最稀有的词）的倒排表精确打分，得到第 k 名分数 θ；
+        2. 按上界升序累加，累计上界仍小于 θ 的词为非关键词：只出现在这些词中的文档不可能进入 top-k；
+        3. 关键词的倒排表按块扫描，块上界加上其他词上界仍小于 θ 的块整块跳过；
+        4. 剩余候选文档在所有查询词上精确打分。
+        
+        候选文档的打分成本约为 候选数 × 查询词数，超过穷举的倒排表总长度时放弃剪枝。
+        
+        Returns:
+            同 search()；无法安全剪枝（存在负 idf、候选不足等）或剪枝不划算时返回 None
+        """
+        idf_of = dict(query)
+        weights = Counter(term_id for term_id, _ in query)
+        if not weights or any(idf < 0 for idf in idf_of.values()):
+            return None
+        
+        # 每个查询词（含重复次数）的块上界和整体上界
+        block_bounds = {term_id: self._block_bounds(term_id, params) for term_id in weights}
+        term_bound = {
+            term_id: count * idf_of[term_id] * float(block_bounds[term_id].max())
+            for term_id, count in weights.items()
+        }
+        ordered = sorted(weights, key=lambda term_id: term_bound[term_id])
+        
+        # 1. 种子：上界最大的词
+        seed = None
+        scored_docs = np.zeros(0, dtype=np.int64)
+        scored = np.zeros(0, dtype=np.float64)
+        scanned = 0
+        if theta is None:
+            seed = ordered[-1]
+            seed_docs, _ = self.postings(seed)
+            scanned += len(seed_docs)
+            scored_docs = seed_docs[self.live[seed_docs]]
+            if len(scored_docs) < k or len(scored_docs) * len(weights) > postings_total:
+                return None
+            scored = self._score_docs(scored_docs, query, params)
+            theta = np.partition(scored, len(scored) - k)[len(scored) - k]
+        if theta <= 0:
+            return None
+        threshold = theta * (1 - self._BOUND_MARGIN)
+        
+        # 2. 划分非关键词
+        prefix = 0.0
+        essential = []
+        for i, term_id in enumerate(ordered):
+            if prefix + term_bound[term_id] < threshold:
+                prefix += term_bound[term_id]
+            else:
+                essential = ordered[i:]
+                break
+        
+        # 3. 关键词按块收集候选
+        total_bound = sum(term_bound.values())
+        candidate_parts = []
+        for term_id in essential:
+            if term_id == seed:
+                continue
+            bounds = (
+                weights[term_id] * idf_of[term_id] * block_bounds[term_id]
+                + (total_bound - term_bound[term_id])
+            )
+            keep = np.nonzero(bounds >= threshold)[0] + self.block_indptr[term_id]
+            if not len(keep):
+                continue
+            positions = _block_positions(self.block_start[keep], self.block_end[keep])
+            candidate_parts.append(self.post_docs[positions])
+            scanned += len(positions)
+        
+        # 4. 候选精确打分
+        if candidate_parts:
+            candidates = np.setdiff1d(np.concatenate(candidate_parts), scored_docs)
+            candidates = candidates[self.live[candidates]]
+            if (len(scored_docs) + len(candidates)) * len(weights) > postings_total:
+                return None
+            scored_docs = np.concatenate([scored_docs, candidates])
+            scored = np.concatenate([scored, self._score_docs(candidates, query, params)])
+        
+        return scored_docs, scored, scanned
+
+
+def select_top_k(keys: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    按得分降序、键（写入序号）升序选出前 k 个下标
+    
+    与对稠密得分做稳定降序排序的结果一致：同分时先写入的文档在前。
+    
+    Args:
+        keys: 文档的写入序号
+        scores: 对应得分
+        k: 返回数量
+    
+    Returns:
+        选中元素在输入中的下标
+    """
+    if k <= 0 or not len(scores):
+        return np.zeros(0, dtype=np.int64)
+    
+    # 用 partition 找到第 k 名的分数，与其同分的全部保留，保证同分时按序号取舍
+    candidates = np.arange(len(scores))
+    if len(scores) > k:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.nonzero(scores >= kth)[0]
+    order = np.lexsort((keys[candidates], -scores[candidates]))[:k]
+    return candidates[order]
+
+
+def _block_positions(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """将若干 [start, end) 区间展开为下标数组"""
+    lengths = ends - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+def _concat(parts: List[np.ndarray], dtype) -> np.ndarray:
+    """拼接数组列表（允许为空）"""
+    return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
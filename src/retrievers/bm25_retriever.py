@@ -1,38 +1,157 @@
 """
 BM25 关键词检索器
 """
-from rank_bm25 import BM25Okapi
-from typing import List, Tuple
-import re
+from typing import List, Tuple, Optional, Union
+from src.core.config import settings
+from src.retrievers.analyzer import Analyzer
+from src.retrievers.bm25_segments import SegmentedIndex
+from src.retrievers.bm25_shards import ShardedIndex
+from src.retrievers.bm25_storage import load_index, read_shard_manifest, save_index
 
 
 class BM25Retriever:
     """BM25 关键词检索器"""
     
-    def __init__(self):
-        self.bm25 = None
-        self.documents = []
-        self.doc_ids = []
+    def __init__(
+        self,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        enable_pruning: bool = True,
+        analyzer: Optional[Analyzer] = None,
+        tokenize_workers: Optional[int] = None,
+        num_shards: Optional[int] = None,
+        flush_docs: int = 10000,
+        merge_factor: int = 10,
+        background_merge: bool = True
+    ):
+        """
+        初始化检索器
+        
+        Args:
+            k1: BM25 参数 k1
+            b: BM25 参数 b
+            epsilon: 负 idf 的下限系数
+            enable_pruning: 是否启用 MaxScore 动态剪枝（结果仍为精确 top-k）
+            analyzer: 分词器，默认按配置创建（settings.bm25_analyzer）
+            tokenize_workers: 批量分词的进程数，默认使用配置
+            num_shards: 分片数，大于 1 时使用多进程分片索引，默认使用配置（settings.bm25_num_shards）
+            flush_docs: 写入缓冲区达到该文档数时刷成新段
+            merge_factor: 同一层级的相邻段达到该数量时合并
+            background_merge: 是否在后台线程中合并段
+        """
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.enable_pruning = enable_pruning
+        self.analyzer = analyzer or Analyzer.from_settings()
+        self.tokenize_workers = (
+            settings.bm25_tokenize_workers if tokenize_workers is None else tokenize_workers
+        )
+        self._index_options = {
+            "flush_docs": flush_docs,
+            "merge_factor": merge_factor,
+            "background_merge": background_merge,
+        }
+        self.num_shards = settings.bm25_num_shards if num_shards is None else num_shards
+        self.index: Union[SegmentedIndex, ShardedIndex]
+        if self.num_shards > 1:
+            self.index = ShardedIndex(self.num_shards, k1=k1, b=b, epsilon=epsilon, **self._index_options)
+        else:
+            self.index = SegmentedIndex(k1=k1, b=b, epsilon=epsilon, **self._index_options)
     
     def index_documents(self, documents: List[dict]):
         """
-        索引文档
+        索引文档（追加，已存在的 ID 会被更新），完成后立即可检索
         
         Args:
             documents: 文档列表，每个文档包含 id 和 content
         """
-        self.documents = documents
-        self.doc_ids = [doc['id'] for doc in documents]
-        
-        # 简单的中文分词（按字符分）
-        tokenized_corpus = [self._tokenize(doc['content']) for doc in documents]
-        self.bm25 = BM25Okapi(tokenized_corpus)
+        self.add_documents(documents)
+        self.index.refresh()
         
         print(f"✓ BM25 索引完成，共 {len(documents)} 条文档")
     
+    def add_documents(self, documents: List[dict]):
+        """
+        追加或更新文档（更新 = 删除旧版本 + 追加），写入缓冲区后在下一次检索前可见
+        
+        分词在调用线程中完成（文档较多时使用进程池），适合在流式索引中逐批调用。
+        
+        Args:
+            documents: 文档列表，每个文档包含 id 和 content
+        """
+        tokenized = self.analyzer.tokenize_many(
+            [doc['content'] for doc in documents],
+            workers=self.tokenize_workers
+        )
+        self.index.add([doc['id'] for doc in documents], tokenized)
+    
+    def delete_documents(self, doc_ids: List[str]):
+        """
+        删除文档（段内打删除标记，合并时清除）
+        
+        Args:
+            doc_ids: 文档 ID 列表
+        """
+        self.index.delete(doc_ids)
+    
+    def clear(self):
+        """清空索引"""
+        self.index.clear()
+    
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.index
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    def save(self, path: str):
+        """
+        将索引保存为单个二进制文件（分片索引为 JSON 清单 + 每个分片一个文件）
+        
+        Args:
+            path: 文件路径
+        """
+        meta = {"analyzer": self.analyzer.config()}
+        if isinstance(self.index, ShardedIndex):
+            self.index.save(path, meta=meta)
+        else:
+            save_index(path, self.index, meta=meta)
+        print(f"✓ BM25 索引已保存: {path}（{len(self.index)} 条文档）")
+    
+    def load(self, path: str):
+        """
+        以内存映射方式加载索引（替换当前索引）
+        
+        倒排表和正排表直接映射文件，不读入内存，
+        多个进程加载同一文件时共享页缓存；加载后即可检索，也可以继续增删文档。
+        查询使用索引文件中记录的分词器配置，与建索引时保持一致；
+        是否分片及分片数也以文件为准。
+        
+        Args:
+            path: 由 save() 生成的文件路径
+        """
+        if read_shard_manifest(path) is not None:
+            index, meta = ShardedIndex.load(path, **self._index_options)
+        else:
+            index, meta = load_index(path, **self._index_options)
+        old_index, self.index = self.index, index
+        old_index.close()
+        
+        self.k1, self.b, self.epsilon = index.k1, index.b, index.epsilon
+        self.num_shards = index.num_shards if isinstance(index, ShardedIndex) else 1
+        if "analyzer" in meta:
+            self.analyzer = Analyzer.from_config(meta["analyzer"])
+        print(f"✓ BM25 索引已加载: {path}（{len(index)} 条文档）")
+    
+    def close(self):
+        """停止后台合并线程（分片索引同时停止工作进程）"""
+        self.index.close()
+    
     def _tokenize(self, text: str) -> List[str]:
         """
-        简单分词（支持中英文）
+        分词（索引和查询共用 self.analyzer）
         
         Args:
             text: 待分词文本
@@ -40,21 +159,7 @@ class BM25Retriever:
         Returns:
             词列表
         """
-        # 移除标点符号
-        text = re.sub(r'[^\w\s]', ' ', text)
-        
-        # 分离中英文
-        tokens = []
-        words = text.split()
-        for word in words:
-            # 如果是英文单词，直接添加
-            if re.match(r'^[a-zA-Z]+$', word):
-                tokens.append(word.lower())
-            else:
-                # 中文按字符分
-                tokens.extend(list(word))
-        
-        return tokens
+        return self.analyzer.tokenize(text)
     
     def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
         """
@@ -67,22 +172,7 @@ class BM25Retriever:
         Returns:
             (文档ID, BM25分数) 列表
         """
-        if not self.bm25:
-            return []
-        
         tokenized_query = self._tokenize(query)
-        scores = self.bm25.get_scores(tokenized_query)
-        
-        # 获取 top-k 结果
-        top_indices = sorted(
-            range(len(scores)),
-            key=lambda i: scores[i],
-            reverse=True
-        )[:top_k]
-        
-        results = [
-            (self.doc_ids[idx], float(scores[idx]))
-            for idx in top_indices
-        ]
         
-        return results
+        # 各段只对包含查询词的文档打分，块级上界剪枝后合并取 top-k
+        return self.index.top_k(tokenized_query, top_k, prune=self.enable_pruning)
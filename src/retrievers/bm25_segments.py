@@ -0,0 +1,632 @@
+"""
+分段 BM25 索引（LSM 风格）
+写入先进入内存缓冲区，检索前或缓冲区写满时刷成一个不可变段；
+删除只在段内打删除标记，更新 = 删除 + 追加；
+后台线程按对数分层策略把相邻的小段合并成大段，同时清除已删除的文档。
+idf 和 avgdl 在查询时由各段的存活统计汇总得到，检索结果与对全部存活文档重新建索引一致
+"""
+import math
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from src.retrievers.bm25_index import BM25Params, InvertedIndex, select_top_k
+
+
+class SegmentedIndex:
+    """
+    支持增删改的分段 BM25 索引（线程安全）
+    
+    检索读取的是调用时的段快照，与并发写入互不阻塞（近实时语义）。
+    """
+    
+    def __init__(
+        self,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        block_size: int = 128,
+        flush_docs: int = 10000,
+        merge_factor: int = 10,
+        expunge_ratio: float = 0.5,
+        background_merge: bool = True
+    ):
+        """
+        初始化索引
+        
+        Args:
+            k1: BM25 参数 k1
+            b: BM25 参数 b
+            epsilon: 负 idf 的下限系数（与 rank_bm25 一致）
+            block_size: 倒排表分块大小
+            flush_docs: 缓冲区文档数达到该值时刷成新段
+            merge_factor: 同一层级的相邻段达到该数量时合并
+            expunge_ratio: 段内已删除文档比例达到该值时重写该段
+            background_merge: 是否在后台线程中合并（否则在写入线程中同步合并）
+        """
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.block_size = block_size
+        self.flush_docs = flush_docs
+        self.merge_factor = merge_factor
+        self.expunge_ratio = expunge_ratio
+        self.background_merge = background_merge
+        
+        self._segments: List[InvertedIndex] = []  # 按写入序号排列
+        self._buffer: Dict[str, Tuple[int, List[str]]] = {}  # 未刷盘的文档 ID -> (写入序号, 词列表)
+        # 文档 ID -> (段, 段内文档号)；从磁盘加载后为 None，首次写入时才构建
+        self._locations: Optional[Dict[str, Tuple[InvertedIndex, int]]] = {}
+        self._next_seq = 0
+        self._num_docs = 0  # 各段存活文档数之和
+        self._total_len = 0  # 各段存活文档长度之和
+        self._generation = 0  # 每次写入递增，用于缓存失效
+        self._epoch = 0  # clear() 时递增，丢弃清空前开始的合并
+        self._average_idf: Optional[Tuple[int, float]] = None
+        
+        self._lock = threading.RLock()
+        self._merge_cond = threading.Condition(self._lock)
+        self._merging: List[InvertedIndex] = []
+        self._merge_thread: Optional[threading.Thread] = None
+        self._closed = False
+        
+        # 剪枝统计：累计的查询数、查询词倒排表总长度、实际打分的倒排项数
+        self.stats = {"queries": 0, "postings_total": 0, "postings_scored": 0}
+    
+    @classmethod
+    def from_segments(
+        cls,
+        segments: List[InvertedIndex],
+        next_seq: int,
+        **kwargs
+    ) -> "SegmentedIndex":
+        """
+        由已有的段恢复索引（用于从磁盘加载）
+        
+        Args:
+            segments: 按写入序号排列的段
+            next_seq: 下一个文档的写入序号
+            **kwargs: 传给构造函数的参数
+        """
+        index = cls(**kwargs)
+        index._segments = list(segments)
+        index._next_seq = next_seq
+        index._num_docs = sum(segment.num_live for segment in segments)
+        index._total_len = sum(int(segment.doc_len[segment.live].sum()) for segment in segments)
+        index._locations = None
+        return index
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._num_docs + len(self._buffer)
+    
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            return doc_id in self._buffer or doc_id in self._ensure_locations()
+    
+    @property
+    def num_segments(self) -> int:
+        """当前段数（不含缓冲区）"""
+        with self._lock:
+            return len(self._segments)
+    
+    def add(
+        self,
+        doc_ids: Sequence[str],
+        tokenized: Sequence[List[str]],
+        seqs: Optional[Sequence[int]] = None
+    ):
+        """
+        追加或更新文档（已存在的 ID 先删除再追加）
+        
+        Args:
+            doc_ids: 文档 ID 列表
+            tokenized: 与 doc_ids 对应的词列表
+            seqs: 递增的写入序号（分片时由协调者统一分配），默认接在已有文档之后
+        """
+        with self._lock:
+            if seqs is None:
+                seqs = range(self._next_seq, self._next_seq + len(doc_ids))
+            self._delete_locked(doc_ids)
+            for doc_id, tokens, seq in zip(doc_ids, tokenized, seqs):
+                self._buffer.pop(doc_id, None)
+                self._buffer[doc_id] = (seq, tokens)
+                self._next_seq = max(self._next_seq, seq + 1)
+            if len(self._buffer) >= self.flush_docs:
+                self._flush_locked()
+            else:
+                self._schedule_merges()
+    
+    def delete(self, doc_ids: Sequence[str]) -> int:
+        """
+        删除文档
+        
+        Args:
+            doc_ids: 文档 ID 列表
+        
+        Returns:
+            实际删除的文档数
+        """
+        with self._lock:
+            deleted = self._delete_locked(doc_ids)
+            self._schedule_merges()
+            return deleted
+    
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._segments = []
+            self._buffer = {}
+            self._locations = {}
+            self._next_seq = 0
+            self._num_docs = 0
+            self._total_len = 0
+            self._generation += 1
+            self._epoch += 1
+    
+    def refresh(self):
+        """将缓冲区刷成新段，使之前的写入对检索可见"""
+        with self._lock:
+            if self._buffer:
+                self._flush_locked()
+    
+    def snapshot(self) -> Tuple[List[Tuple[InvertedIndex, np.ndarray, np.ndarray]], int]:
+        """
+        获取当前各段及其删除状态的一致快照（先刷新缓冲区，用于持久化）
+        
+        Returns:
+            ([(段, 存活标记副本, 存活文档频率副本), ...], 下一个写入序号)
+        """
+        with self._lock:
+            if self._buffer:
+                self._flush_locked()
+            segments = [
+                (segment, segment.live.copy(), segment.live_df.copy())
+                for segment in self._segments
+            ]
+            return segments, self._next_seq
+    
+    def params(self) -> Dict[str, Any]:
+        """索引参数（随索引文件保存）"""
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon,
+            "block_size": self.block_size,
+        }
+    
+    def wait_for_merges(self):
+        """等待所有待执行的合并完成"""
+        with self._merge_cond:
+            while not self._closed:
+                self._schedule_merges()
+                if not self._merging and self._find_merge() is None:
+                    return
+                self._merge_cond.wait()
+    
+    def close(self):
+        """停止后台合并线程"""
+        with self._merge_cond:
+            self._closed = True
+            self._merge_cond.notify_all()
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+    
+    def top_k(self, tokens: List[str], k: int, prune: bool = True) -> List[Tuple[str, float]]:
+        """
+        获取得分最高的 k 个文档
+        
+        排序与对全部存活文档的稠密得分做稳定降序排序一致：同分时先写入的文档在前，
+        命中文档不足 k 个时按写入顺序补充得分为 0 的文档，再补充负分文档。
+        
+        Args:
+            tokens: 查询词列表
+            k: 返回数量
+            prune: 是否启用 MaxScore 动态剪枝（结果不变，只减少打分的倒排项）
+        
+        Returns:
+            [(文档 ID, 得分), ...]
+        """
+        with self._lock:
+            if self._buffer:
+                self._flush_locked()
+            segments = list(self._segments)
+            num_docs = self._num_docs
+            total_len = self._total_len
+            idf_of = query_idf(
+                self._term_freqs(tokens, segments),
+                num_docs,
+                self.epsilon,
+                lambda: self._compute_average_idf(segments, num_docs)
+            )
+        
+        if num_docs <= 0:
+            return []
+        hits = self._rank(segments, min(k, num_docs), tokens, idf_of, total_len / num_docs, prune)
+        return [(doc_id, score) for doc_id, score, _ in hits]
+    
+    def term_stats(self, tokens: List[str]) -> Tuple[int, int, Dict[str, int]]:
+        """
+        本索引的统计量（先刷新缓冲区），分片时由协调者汇总为全局统计
+        
+        Args:
+            tokens: 查询词列表
+        
+        Returns:
+            (存活文档数, 存活文档总长度, {查询词: 存活文档频率})
+        """
+        with self._lock:
+            if self._buffer:
+                self._flush_locked()
+            return self._num_docs, self._total_len, self._term_freqs(tokens, self._segments)
+    
+    def vocabulary_df(self) -> Dict[str, int]:
+        """全部存活词的文档频率（分片时用于计算全局平均 idf）"""
+        with self._lock:
+            if self._buffer:
+                self._flush_locked()
+            return self._merged_df(self._segments)
+    
+    def search(
+        self,
+        tokens: List[str],
+        k: int,
+        idf_of: Dict[str, float],
+        avgdl: float,
+        prune: bool = True
+    ) -> List[Tuple[str, float, int]]:
+        """
+        使用外部给定的 idf 和平均文档长度检索（分片时由协调者提供全局统计）
+        
+        排序规则与 top_k() 相同。
+        
+        Args:
+            tokens: 查询词列表
+            k: 返回数量
+            idf_of: 查询词的全局 idf，不在其中的词不参与打分
+            avgdl: 全局平均文档长度
+            prune: 是否启用 MaxScore 动态剪枝
+        
+        Returns:
+            [(文档 ID, 得分, 写入序号), ...]
+        """
+        with self._lock:
+            if self._buffer:
+                self._flush_locked()
+            segments = list(self._segments)
+            num_docs = self._num_docs
+        return self._rank(segments, min(k, num_docs), tokens, idf_of, avgdl, prune)
+    
+    def _rank(
+        self,
+        segments: List[InvertedIndex],
+        k: int,
+        tokens: List[str],
+        idf_of: Dict[str, float],
+        avgdl: float,
+        prune: bool
+    ) -> List[Tuple[str, float, int]]:
+        """在段快照上检索并排序（k 不超过存活文档数），返回 [(文档 ID, 得分, 写入序号), ...]"""
+        if k <= 0:
+            return []
+        params = BM25Params(self.k1, self.b, avgdl)
+        self.stats["queries"] += 1
+        
+        # 先检索大段，尽早得到较高的第 k 名分数，供后续段剪枝
+        keys, scores, locations = [], [], []
+        theta = None
+        for seg_idx in sorted(range(len(segments)), key=lambda i: -segments[i].num_live):
+            segment = segments[seg_idx]
+            term_ids = {term: segment.vocab.get(term) for term in idf_of}
+            query = [
+                (term_ids[token], idf_of[token])
+                for token in tokens
+                if token in idf_of and term_ids[token] is not None
+            ]
+            if not query:
+                continue
+            
+            self.stats["postings_total"] += int(sum(segment.df[term_id] for term_id, _ in query))
+            docs, doc_scores, scanned = segment.search(query, k, params, theta=theta, prune=prune)
+            self.stats["postings_scored"] += scanned
+            keys.append(segment.seqs[docs])
+            scores.append(doc_scores)
+            locations.append(np.stack([np.full(len(docs), seg_idx), docs]))
+            
+            if prune:
+                positive = np.concatenate(scores)
+                positive = positive[positive > 0]
+                if len(positive) >= k:
+                    theta = np.partition(positive, len(positive) - k)[len(positive) - k]
+        
+        if scores:
+            keys, scores = np.concatenate(keys), np.concatenate(scores)
+            locations = np.concatenate(locations, axis=1)
+        else:
+            keys, scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+            locations = np.zeros((2, 0), dtype=np.int64)
+        
+        def hits(mask: np.ndarray, limit: int) -> List[Tuple[str, float, int]]:
+            idx = np.nonzero(mask)[0]
+            selected = idx[select_top_k(keys[idx], scores[idx], limit)]
+            return [
+                (segments[seg_idx].doc_ids[local], float(score), seq)
+                for seg_idx, local, score, seq in zip(
+                    locations[0, selected].tolist(),
+                    locations[1, selected].tolist(),
+                    scores[selected],
+                    keys[selected].tolist()
+                )
+            ]
+        
+        results = hits(scores > 0, k)
+        if len(results) < k:
+            results.extend(self._zero_fill(segments, set(keys[scores != 0].tolist()), k - len(results)))
+        if len(results) < k:
+            results.extend(hits(scores < 0, k - len(results)))
+        return results
+    
+    def _zero_fill(
+        self,
+        segments: List[InvertedIndex],
+        nonzero: set,
+        limit: int
+    ) -> List[Tuple[str, float, int]]:
+        """按写入顺序取得分为 0 的存活文档"""
+        results = []
+        for segment in segments:
+            for local in np.nonzero(segment.live)[0].tolist():
+                if len(results) >= limit:
+                    return results
+                seq = int(segment.seqs[local])
+                if seq not in nonzero:
+                    results.append((segment.doc_ids[local], 0.0, seq))
+        return results
+    
+    @staticmethod
+    def _term_freqs(tokens: List[str], segments: List[InvertedIndex]) -> Dict[str, int]:
+        """查询词在各段中的存活文档频率之和（调用方需持有锁）"""
+        freqs = {}
+        for term in dict.fromkeys(tokens):
+            freq = 0
+            for segment in segments:
+                term_id = segment.vocab.get(term)
+                if term_id is not None:
+                    freq += int(segment.live_df[term_id])
+            freqs[term] = freq
+        return freqs
+    
+    @staticmethod
+    def _merged_df(segments: List[InvertedIndex]) -> Dict[str, int]:
+        """各段存活文档频率按词汇总"""
+        merged: Dict[str, int] = {}
+        for segment in segments:
+            for term, freq in zip(segment.vocab, segment.live_df.tolist()):
+                if freq:
+                    merged[term] = merged.get(term, 0) + freq
+        return merged
+    
+    def _compute_average_idf(self, segments: List[InvertedIndex], num_docs: int) -> float:
+        """
+        全部存活词的平均 idf（负 idf 的下限基准），按写入代次缓存
+        
+        只有查询中出现负 idf 的词时才需要，需遍历整个词表。
+        """
+        if self._average_idf is not None and self._average_idf[0] == self._generation:
+            return self._average_idf[1]
+        
+        if len(segments) == 1:
+            freqs = segments[0].live_df[segments[0].live_df > 0]
+        else:
+            merged = self._merged_df(segments)
+            freqs = np.fromiter(merged.values(), dtype=np.int64, count=len(merged))
+        
+        average = average_idf(freqs, num_docs)
+        self._average_idf = (self._generation, average)
+        return average
+    
+    def _ensure_locations(self) -> Dict[str, Tuple[InvertedIndex, int]]:
+        """构建文档 ID 到段内位置的映射（调用方需持有锁）"""
+        if self._locations is None:
+            locations = {}
+            for segment in self._segments:
+                for local in np.nonzero(segment.live)[0].tolist():
+                    locations[segment.doc_ids[local]] = (segment, local)
+            self._locations = locations
+        return self._locations
+    
+    def _delete_locked(self, doc_ids: Sequence[str]) -> int:
+        """从缓冲区和各段中删除文档（调用方需持有锁）"""
+        locations = self._ensure_locations()
+        by_segment: Dict[int, Tuple[InvertedIndex, List[int]]] = {}
+        deleted = 0
+        for doc_id in doc_ids:
+            if self._buffer.pop(doc_id, None) is not None:
+                deleted += 1
+            location = locations.pop(doc_id, None)
+            if location is not None:
+                segment, local = location
+                by_segment.setdefault(id(segment), (segment, []))[1].append(local)
+        
+        for segment, locals_ in by_segment.values():
+            count, length = segment.delete(np.asarray(locals_, dtype=np.int64))
+            self._num_docs -= count
+            self._total_len -= length
+            deleted += count
+        if by_segment:
+            self._generation += 1
+        return deleted
+    
+    def _flush_locked(self):
+        """将缓冲区构建为新段（调用方需持有锁）"""
+        doc_ids = list(self._buffer)
+        seqs = np.fromiter((seq for seq, _ in self._buffer.values()), dtype=np.int64, count=len(doc_ids))
+        segment = InvertedIndex(
+            [tokens for _, tokens in self._buffer.values()],
+            doc_ids,
+            seqs=seqs,
+            block_size=self.block_size
+        )
+        self._buffer = {}
+        self._segments.append(segment)
+        if self._locations is not None:
+            for local, doc_id in enumerate(doc_ids):
+                self._locations[doc_id] = (segment, local)
+        self._num_docs += segment.num_live
+        self._total_len += int(segment.doc_len.sum())
+        self._generation += 1
+        self._schedule_merges()
+    
+    @staticmethod
+    def _level(num_docs: int, merge_factor: int) -> int:
+        """段所在层级：floor(log_merge_factor(num_docs))"""
+        level = 0
+        while num_docs >= merge_factor:
+            num_docs //= merge_factor
+            level += 1
+        return level
+    
+    def _find_merge(self) -> Optional[List[InvertedIndex]]:
+        """
+        选出下一组待合并的段（调用方需持有锁）
+        
+        已删除比例过高的段单独重写；否则在同一层级的相邻段中凑满 merge_factor 个合并。
+        只合并相邻的段，保证段之间的写入序号区间不交叉。
+        """
+        for segment in self._segments:
+            if segment.num_docs and (segment.num_docs - segment.num_live) >= self.expunge_ratio * segment.num_docs:
+                return [segment]
+        
+        run: List[InvertedIndex] = []
+        run_level = None
+        for segment in self._segments:
+            level = self._level(segment.num_live, self.merge_factor)
+            if level != run_level:
+                run, run_level = [], level
+            run.append(segment)
+            if len(run) >= self.merge_factor:
+                return run
+        return None
+    
+    def _schedule_merges(self):
+        """有待合并的段时唤醒后台线程，或在当前线程同步合并（调用方需持有锁）"""
+        if self._merging or self._closed:
+            return
+        if not self.background_merge:
+            while (plan := self._find_merge()) is not None:
+                lives = [segment.live.copy() for segment in plan]
+                merged = InvertedIndex.merge(plan, self.block_size, lives)
+                self._commit_merge(plan, lives, self._epoch, merged)
+            return
+        if self._find_merge() is None:
+            return
+        if self._merge_thread is None:
+            self._merge_thread = threading.Thread(target=self._merge_loop, name="bm25-merge", daemon=True)
+            self._merge_thread.start()
+        self._merge_cond.notify_all()
+    
+    def _merge_loop(self):
+        """后台合并线程主循环"""
+        while True:
+            with self._merge_cond:
+                while not self._closed and (plan := self._find_merge()) is None:
+                    self._merge_cond.notify_all()
+                    self._merge_cond.wait()
+                if self._closed:
+                    return
+                self._merging = plan
+                lives = [segment.live.copy() for segment in plan]
+                epoch = self._epoch
+            
+            try:
+                # 合并按开始时的删除标记快照进行，不持有锁
+                merged = InvertedIndex.merge(plan, self.block_size, lives)
+            except Exception as e:
+                print(f"✗ BM25 段合并失败: {e}")
+                with self._merge_cond:
+                    self._merging = []
+                    self._closed = True
+                    self._merge_cond.notify_all()
+                return
+            
+            with self._merge_cond:
+                self._commit_merge(plan, lives, epoch, merged)
+                self._merging = []
+                self._merge_cond.notify_all()
+    
+    def _commit_merge(
+        self,
+        plan: List[InvertedIndex],
+        lives: List[np.ndarray],
+        epoch: int,
+        merged: InvertedIndex
+    ):
+        """
+        用合并结果替换原来的段（调用方需持有锁）
+        
+        合并期间被删除的文档在新段中补打删除标记；全局统计不变。
+        """
+        if epoch != self._epoch:
+            return
+        start = next(i for i, segment in enumerate(self._segments) if segment is plan[0])
+        
+        # 合并期间新增的删除：快照中存活、当前已删除
+        offset = 0
+        late_deletes = []
+        for segment, live in zip(plan, lives):
+            new_local = np.cumsum(live) - 1 + offset
+            late_deletes.append(new_local[live & ~segment.live])
+            offset += int(live.sum())
+        late_deletes = np.concatenate(late_deletes)
+        if len(late_deletes):
+            merged.delete(late_deletes)
+        
+        replacement = [merged] if merged.num_live else []
+        self._segments[start:start + len(plan)] = replacement
+        if self._locations is not None and merged.num_live:
+            for local in np.nonzero(merged.live)[0].tolist():
+                self._locations[merged.doc_ids[local]] = (merged, local)
+        self._generation += 1
+
+
+def query_idf(
+    freqs: Dict[str, int],
+    num_docs: int,
+    epsilon: float,
+    average: Callable[[], float]
+) -> Dict[str, float]:
+    """
+    由全局文档频率计算查询词的 idf（与 rank_bm25 的 BM25Okapi 一致）
+    
+    Args:
+        freqs: {查询词: 存活文档频率}，频率为 0 的词不参与打分
+        num_docs: 存活文档数
+        epsilon: 负 idf 的下限系数
+        average: 返回全部存活词平均 idf 的函数，只在出现负 idf 时调用
+    
+    Returns:
+        {查询词: idf}
+    """
+    idf_of = {
+        term: math.log(num_docs - freq + 0.5) - math.log(freq + 0.5)
+        for term, freq in freqs.items()
+        if freq > 0
+    }
+    if any(idf < 0 for idf in idf_of.values()):
+        floor = epsilon * average()
+        idf_of = {term: (floor if idf < 0 else idf) for term, idf in idf_of.items()}
+    return idf_of
+
+
+def average_idf(freqs: np.ndarray, num_docs: int) -> float:
+    """
+    全部存活词的平均 idf
+    
+    Args:
+        freqs: 各词的存活文档频率（均大于 0）
+        num_docs: 存活文档数
+    """
+    if not len(freqs):
+        return 0.0
+    idf = np.log(num_docs - freqs + 0.5) - np.log(freqs + 0.5)
+    # fsum 与求和顺序无关，段或分片的划分方式不影响结果
+    return math.fsum(idf.tolist()) / len(idf)
@@ -0,0 +1,393 @@
+"""
+分片 BM25 索引（多进程 scatter-gather）
+文档按 ID 的哈希分配到 N 个分片，每个分片由一个工作进程持有（SegmentedIndex），打分不受 GIL 限制；
+协调者分两轮广播查询：先汇总各分片的文档数、总长度和查询词文档频率，得到全局 idf 和 avgdl，
+再由各分片用全局统计并行检索并返回各自的 top-k，最后归并。
+写入序号由协调者统一分配，检索结果与单进程索引完全一致
+"""
+import multiprocessing
+import os
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from src.retrievers.bm25_segments import SegmentedIndex, average_idf, query_idf
+from src.retrievers.bm25_storage import load_index, read_shard_manifest, save_index, write_shard_manifest
+
+
+class ShardedIndex:
+    """
+    多进程分片 BM25 索引（线程安全，接口与 SegmentedIndex 相同）
+    
+    单个查询由全部分片并行处理；每个分片的连接有独立的锁，请求按分片号顺序加锁，
+    收到某个分片的回复后立即释放该分片，因此并发的查询在各分片上流水线执行，不会整体串行。
+    写入（add / delete / clear / save）之间由协调者锁串行，保证全局写入序号有序；
+    查询不持有协调者锁，与写入并发时两轮广播之间可能看到新写入的文档。
+    """
+    
+    def __init__(
+        self,
+        num_shards: int,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        block_size: int = 128,
+        shard_paths: Optional[List[str]] = None,
+        next_seq: int = 0,
+        **index_options
+    ):
+        """
+        启动分片工作进程
+        
+        Args:
+            num_shards: 分片数（工作进程数）
+            k1: BM25 参数 k1
+            b: BM25 参数 b
+            epsilon: 负 idf 的下限系数
+            block_size: 倒排表分块大小
+            shard_paths: 各分片的索引文件（由 load() 传入），为 None 时创建空索引
+            next_seq: 下一个文档的全局写入序号
+            **index_options: 传给各分片 SegmentedIndex 的运行参数（flush_docs、merge_factor 等）
+        """
+        if num_shards < 1:
+            raise ValueError(f"分片数必须为正数: {num_shards}")
+        if shard_paths is not None and len(shard_paths) != num_shards:
+            raise ValueError(f"分片文件数 {len(shard_paths)} 与分片数 {num_shards} 不一致")
+        self.num_shards = num_shards
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.block_size = block_size
+        
+        # 协调者锁：串行化写入，保护写入序号和代次
+        self._lock = threading.RLock()
+        self._next_seq = next_seq
+        self._generation = 0  # 每次写入递增，用于缓存失效
+        self._average_idf: Optional[Tuple[int, float]] = None
+        self._closed = False
+        self._broken = False  # 有工作进程异常退出（管道断开）后索引不再可用
+        
+        # 父进程中有后台合并线程和线程池，使用 spawn 避免 fork 继承锁状态
+        context = multiprocessing.get_context("spawn")
+        params = {"k1": k1, "b": b, "epsilon": epsilon, "block_size": block_size}
+        self._conns = []
+        self._processes = []
+        # 每个分片连接一把锁，同一连接上同一时刻只有一个请求
+        self._shard_locks = [threading.Lock() for _ in range(num_shards)]
+        for shard in range(num_shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_shard_worker,
+                args=(child_conn, None if shard_paths is None else shard_paths[shard], params, index_options),
+                name=f"bm25-shard-{shard}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._processes.append(process)
+    
+    @classmethod
+    def load(cls, path: str, **index_options) -> Tuple["ShardedIndex", Dict[str, Any]]:
+        """
+        由 save() 生成的清单文件加载（各分片在工作进程中以内存映射方式加载）
+        
+        Args:
+            path: 清单文件路径
+            **index_options: 各分片的运行参数
+        
+        Returns:
+            (分片索引, 附加信息)
+        """
+        manifest = read_shard_manifest(path)
+        if manifest is None:
+            raise ValueError(f"不是 BM25 分片索引清单: {path}")
+        directory = os.path.dirname(os.path.abspath(path))
+        index = cls(
+            len(manifest["shards"]),
+            shard_paths=[os.path.join(directory, name) for name in manifest["shards"]],
+            next_seq=manifest["next_seq"],
+            **manifest["params"],
+            **index_options
+        )
+        return index, manifest.get("meta", {})
+    
+    def save(self, path: str, meta: Optional[Dict[str, Any]] = None):
+        """
+        保存索引：每个分片写一个单文件索引（path.shard<i>），path 为 JSON 清单
+        
+        Args:
+            path: 清单文件路径
+            meta: 随索引保存的附加信息
+        """
+        with self._lock:
+            shard_paths = [f"{path}.shard{shard}" for shard in range(self.num_shards)]
+            self._call({shard: ("save", (shard_paths[shard],)) for shard in range(self.num_shards)})
+            write_shard_manifest(path, {
+                "shards": [os.path.basename(shard_path) for shard_path in shard_paths],
+                "params": self.params(),
+                "next_seq": self._next_seq,
+                "meta": meta or {},
+            })
+    
+    def __len__(self) -> int:
+        return sum(self._broadcast("__len__"))
+    
+    def __contains__(self, doc_id: str) -> bool:
+        shard = self._shard_of(doc_id)
+        return self._call({shard: ("__contains__", (doc_id,))})[shard]
+    
+    @property
+    def num_segments(self) -> int:
+        """各分片的段数之和"""
+        return sum(self._broadcast("num_segments"))
+    
+    def add(self, doc_ids: Sequence[str], tokenized: Sequence[List[str]]):
+        """
+        追加或更新文档（同一 ID 总是落在同一分片，更新在分片内完成）
+        
+        Args:
+            doc_ids: 文档 ID 列表
+            tokenized: 与 doc_ids 对应的词列表
+        """
+        with self._lock:
+            batches: Dict[int, Tuple[List[str], List[List[str]], List[int]]] = {}
+            for doc_id, tokens in zip(doc_ids, tokenized):
+                batch = batches.setdefault(self._shard_of(doc_id), ([], [], []))
+                batch[0].append(doc_id)
+                batch[1].append(tokens)
+                batch[2].append(self._next_seq)
+                self._next_seq += 1
+            self._call({shard: ("add", batch) for shard, batch in batches.items()})
+            self._generation += 1
+    
+    def delete(self, doc_ids: Sequence[str]) -> int:
+        """
+        删除文档
+        
+        Args:
+            doc_ids: 文档 ID 列表
+        
+        Returns:
+            实际删除的文档数
+        """
+        with self._lock:
+            batches: Dict[int, List[str]] = {}
+            for doc_id in doc_ids:
+                batches.setdefault(self._shard_of(doc_id), []).append(doc_id)
+            deleted = sum(self._call({shard: ("delete", (ids,)) for shard, ids in batches.items()}).values())
+            self._generation += 1
+            return deleted
+    
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._broadcast("clear")
+            self._next_seq = 0
+            self._generation += 1
+    
+    def refresh(self):
+        """将各分片的缓冲区刷成新段"""
+        self._broadcast("refresh")
+    
+    def params(self) -> Dict[str, Any]:
+        """索引参数（随索引文件保存）"""
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon,
+            "block_size": self.block_size,
+        }
+    
+    def wait_for_merges(self):
+        """等待各分片待执行的合并完成"""
+        self._broadcast("wait_for_merges")
+    
+    def close(self):
+        """停止全部工作进程"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for shard_lock, conn in zip(self._shard_locks, self._conns):
+                # 等待该分片上正在执行的请求完成
+                with shard_lock:
+                    try:
+                        conn.send(("close", ()))
+                        conn.recv()
+                    except (EOFError, OSError):
+                        pass
+                    conn.close()
+        for process in self._processes:
+            process.join()
+    
+    def top_k(self, tokens: List[str], k: int, prune: bool = True) -> List[Tuple[str, float]]:
+        """
+        获取得分最高的 k 个文档（排序规则与 SegmentedIndex.top_k 相同）
+        
+        Args:
+            tokens: 查询词列表
+            k: 返回数量
+            prune: 是否在各分片内启用 MaxScore 动态剪枝
+        
+        Returns:
+            [(文档 ID, 得分), ...]
+        """
+        # 第一轮：汇总全局统计
+        stats = self._broadcast("term_stats", tokens)
+        num_docs = sum(num for num, _, _ in stats)
+        total_len = sum(length for _, length, _ in stats)
+        if k <= 0 or num_docs <= 0:
+            return []
+        freqs = {term: sum(shard_freqs[term] for _, _, shard_freqs in stats) for term in stats[0][2]}
+        idf_of = query_idf(freqs, num_docs, self.epsilon, lambda: self._compute_average_idf(num_docs))
+        
+        # 第二轮：各分片用全局统计并行检索
+        shard_hits = self._broadcast("search", tokens, min(k, num_docs), idf_of, total_len / num_docs, prune)
+        
+        # 归并：正分按 (得分降序, 序号升序)，其次按序号补 0 分文档，最后是负分文档
+        hits = [hit for hits in shard_hits for hit in hits]
+        hits.sort(key=lambda hit: (0 if hit[1] > 0 else 1 if hit[1] == 0 else 2, -hit[1], hit[2]))
+        return [(doc_id, score) for doc_id, score, _ in hits[:k]]
+    
+    def _compute_average_idf(self, num_docs: int) -> float:
+        """全局平均 idf（负 idf 的下限基准），按写入代次缓存"""
+        generation = self._generation
+        cached = self._average_idf
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        
+        shard_dfs = self._broadcast("vocabulary_df")
+        merged: Dict[str, int] = {}
+        for shard_df in shard_dfs:
+            for term, freq in shard_df.items():
+                merged[term] = merged.get(term, 0) + freq
+        average = average_idf(np.fromiter(merged.values(), dtype=np.int64, count=len(merged)), num_docs)
+        # 按开始计算时的代次缓存，计算期间有写入时下次查询会重新计算
+        self._average_idf = (generation, average)
+        return average
+    
+    def _shard_of(self, doc_id: str) -> int:
+        """文档所在分片（与进程无关的稳定哈希）"""
+        return zlib.crc32(doc_id.encode("utf-8")) % self.num_shards
+    
+    def _broadcast(self, method: str, *args) -> List[Any]:
+        """在全部分片上调用同一方法，按分片顺序返回结果"""
+        results = self._call({shard: (method, args) for shard in range(self.num_shards)})
+        return [results[shard] for shard in range(self.num_shards)]
+    
+    def _call(self, calls: Dict[int, Tuple[str, tuple]]) -> Dict[int, Any]:
+        """
+        向若干分片发送请求，全部发出后再依次接收，各分片并行执行
+        
+        按分片号顺序逐个加锁并发送（固定的加锁顺序避免死锁），收到某个分片的回复后立即释放它，
+        其他线程的请求随即可以在该分片上开始执行。
+        中途出错时仍取回全部已发出请求的回复再抛出异常，保证管道上的请求与回复一一对应；
+        管道断开（工作进程退出）后索引标记为不可用。
+        
+        Args:
+            calls: {分片号: (方法名, 参数)}
+        
+        Returns:
+            {分片号: 返回值}；任一分片出错时抛出其异常
+        """
+        sent = []
+        replies = {}
+        error: Optional[BaseException] = None
+        try:
+            for shard in sorted(calls):
+                self._shard_locks[shard].acquire()
+                try:
+                    if self._closed:
+                        raise RuntimeError("BM25 分片索引已关闭")
+                    if self._broken:
+                        raise RuntimeError("BM25 分片工作进程已异常退出，索引不可用")
+                    self._conns[shard].send(calls[shard])
+                except OSError as e:
+                    self._shard_locks[shard].release()
+                    self._broken = True
+                    raise RuntimeError(f"BM25 分片 {shard} 的工作进程已退出: {e!r}") from e
+                except BaseException:
+                    self._shard_locks[shard].release()
+                    raise
+                sent.append(shard)
+        except BaseException as e:
+            error = e
+        
+        interrupted = False
+        for shard in sent:
+            try:
+                if not interrupted:
+                    replies[shard] = self._conns[shard].recv()
+            except (EOFError, OSError) as e:
+                self._broken = True
+                error = error or RuntimeError(f"BM25 分片 {shard} 的工作进程已退出: {e!r}")
+            except Exception as e:
+                # 回复已完整读出（如反序列化失败），管道仍然同步
+                error = error or e
+            except BaseException as e:
+                # 如 KeyboardInterrupt：其余回复无法取回，管道失步
+                self._broken = True
+                interrupted = True
+                error = e
+            finally:
+                self._shard_locks[shard].release()
+        if error is not None:
+            raise error
+        
+        results = {}
+        for shard, (ok, result) in replies.items():
+            if not ok:
+                raise result
+            results[shard] = result
+        return results
+
+
+def _shard_worker(
+    conn,
+    path: Optional[str],
+    params: Dict[str, Any],
+    index_options: Dict[str, Any]
+):
+    """
+    分片工作进程主循环：接收 (方法名, 参数)，回复 (是否成功, 返回值或异常)
+    
+    Args:
+        conn: 与协调者通信的管道
+        path: 分片索引文件，为 None 时创建空索引
+        params: BM25 参数（创建空索引时使用，加载时以文件为准）
+        index_options: SegmentedIndex 的运行参数
+    """
+    if path is None:
+        index = SegmentedIndex(**params, **index_options)
+    else:
+        index, _ = load_index(path, **index_options)
+    
+    while True:
+        try:
+            method, args = conn.recv()
+        except EOFError:
+            break
+        if method == "close":
+            index.close()
+            conn.send((True, None))
+            break
+        try:
+            if method == "save":
+                result = save_index(args[0], index)
+            else:
+                attr = getattr(index, method)
+                result = attr(*args) if callable(attr) else attr
+            conn.send((True, result))
+        except Exception as e:
+            _send_error(conn, e)
+    index.close()
+    conn.close()
+
+
+def _send_error(conn, error: Exception):
+    """回复异常；异常无法序列化时改为回复包含其类型和描述的 RuntimeError（send 先序列化再写入，失败不会写出半条消息）"""
+    try:
+        conn.send((False, error))
+    except Exception:
+        conn.send((False, RuntimeError(f"{type(error).__name__}: {error}")))
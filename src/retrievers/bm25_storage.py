@@ -0,0 +1,302 @@
+"""
+BM25 索引的磁盘格式
+单文件、带版本号的二进制格式：文件头（魔数 + 版本 + JSON 描述）之后是按 64 字节对齐的数组段，
+分段索引的每个段各自占用一组数组段；分片索引每个分片一个这样的文件，另有一个 JSON 清单。
+加载时整个文件只做一次内存映射，倒排表、正排表等只读数组直接指向映射页，
+多个进程加载同一文件时共享操作系统页缓存，加载耗时与索引大小基本无关
+"""
+import json
+import os
+import struct
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+import numpy as np
+from src.retrievers.bm25_index import InvertedIndex
+from src.retrievers.bm25_segments import SegmentedIndex
+
+
+FORMAT_MAGIC = b"RAGBM25\0"
+# 版本 2：分段索引（段内不再保存 idf/norm，新增正排表和删除标记）
+FORMAT_VERSION = 2
+
+# 分片索引的清单文件：JSON，记录各分片的索引文件（每个分片文件都是上述单文件格式）
+SHARD_MANIFEST_FORMAT = "bm25-shards"
+SHARD_MANIFEST_VERSION = 1
+
+# 魔数(8) + 版本(uint32) + JSON 长度(uint32)
+_PREAMBLE = struct.Struct("<8sII")
+# 数组段对齐字节数
+_ALIGN = 64
+
+
+class StringTable(Sequence[str]):
+    """
+    紧凑的只读字符串表：UTF-8 字节串拼接 + 偏移数组
+    
+    按下标访问时才解码，加载后无需逐个构造 Python 字符串。
+    """
+    
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        """
+        Args:
+            blob: 所有字符串 UTF-8 编码拼接后的字节数组
+            offsets: 长度为 n+1 的偏移数组
+        """
+        self.blob = blob
+        self.offsets = offsets
+    
+    @staticmethod
+    def encode(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        将字符串列表编码为 (字节数组, 偏移数组)
+        
+        Args:
+            strings: 字符串列表
+        
+        Returns:
+            (blob, offsets)
+        """
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return blob, offsets
+    
+    def raw(self, i: int) -> bytes:
+        """获取第 i 个字符串的 UTF-8 字节"""
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.raw(i).decode("utf-8")
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.raw(i).decode("utf-8")
+
+
+class MappedVocabulary:
+    """
+    映射文件中的只读词典（词 -> 词号）
+    
+    词按 UTF-8 字节序排序后保存一个排列数组，查找时二分，
+    不需要在加载时构造 dict。迭代顺序与词号顺序一致（与 dict 词典相同）。
+    """
+    
+    def __init__(self, terms: StringTable, sorted_ids: np.ndarray):
+        """
+        Args:
+            terms: 按词号排列的词表
+            sorted_ids: 按字节序排列的词号
+        """
+        self.terms = terms
+        self.sorted_ids = sorted_ids
+    
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:
+        """查找词号，不存在时返回 default"""
+        key = term.encode("utf-8")
+        lo, hi = 0, len(self.sorted_ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.terms.raw(self.sorted_ids[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.sorted_ids):
+            term_id = int(self.sorted_ids[lo])
+            if self.terms.raw(term_id) == key:
+                return term_id
+        return default
+    
+    def __getitem__(self, term: str) -> int:
+        term_id = self.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return term_id
+    
+    def __contains__(self, term: str) -> bool:
+        return self.get(term) is not None
+    
+    def __len__(self) -> int:
+        return len(self.terms)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.terms)
+
+
+def save_index(
+    path: str,
+    index: SegmentedIndex,
+    meta: Optional[Dict[str, Any]] = None
+):
+    """
+    将分段索引写入单个文件（先写临时文件再原子替换）
+    
+    Args:
+        path: 文件路径
+        index: 分段索引
+        meta: 随索引保存的附加信息（如分词器配置，需可 JSON 序列化）
+    """
+    segments, next_seq = index.snapshot()
+    arrays: Dict[str, np.ndarray] = {}
+    for seg_idx, (segment, live, live_df) in enumerate(segments):
+        for name, arr in _segment_arrays(segment, live, live_df).items():
+            arrays[f"{seg_idx}.{name}"] = arr
+    
+    # 段偏移相对于数据区起点，数据区从文件头之后的第一个对齐位置开始
+    sections = {}
+    offset = 0
+    for name, arr in arrays.items():
+        sections[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset = _align(offset + arr.nbytes)
+    header_bytes = json.dumps({
+        "params": index.params(),
+        "next_seq": next_seq,
+        "num_segments": len(segments),
+        "meta": meta or {},
+        "sections": sections,
+    }).encode("utf-8")
+    data_start = _align(_PREAMBLE.size + len(header_bytes))
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(FORMAT_MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, arr in arrays.items():
+            f.write(b"\0" * (data_start + sections[name]["offset"] - f.tell()))
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_index(path: str, **kwargs) -> Tuple[SegmentedIndex, Dict[str, Any]]:
+    """
+    以内存映射方式加载索引文件
+    
+    Args:
+        path: 文件路径
+        **kwargs: 传给 SegmentedIndex 的运行参数（flush_docs、merge_factor 等）
+    
+    Returns:
+        (分段索引, 附加信息)
+    """
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise ValueError(f"不是 BM25 索引文件: {path}")
+        magic, version, header_len = _PREAMBLE.unpack(preamble)
+        if magic != FORMAT_MAGIC:
+            raise ValueError(f"不是 BM25 索引文件: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"不支持的 BM25 索引版本 {version}（当前为 {FORMAT_VERSION}），请重新建索引并保存")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = _align(_PREAMBLE.size + header_len)
+    
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays: Dict[str, Dict[str, np.ndarray]] = {}
+    for name, section in header["sections"].items():
+        dtype = np.dtype(section["dtype"])
+        count = int(np.prod(section["shape"], dtype=np.int64))
+        start = data_start + section["offset"]
+        seg_idx, field = name.split(".", 1)
+        arrays.setdefault(seg_idx, {})[field] = (
+            buffer[start:start + count * dtype.itemsize].view(dtype).reshape(section["shape"])
+        )
+    
+    params = header["params"]
+    segments = []
+    for seg_idx in range(header["num_segments"]):
+        seg_arrays = arrays[str(seg_idx)]
+        vocab = MappedVocabulary(
+            StringTable(seg_arrays.pop("term_blob"), seg_arrays.pop("term_offsets")),
+            seg_arrays.pop("term_sorted_ids")
+        )
+        doc_ids = StringTable(seg_arrays.pop("doc_id_blob"), seg_arrays.pop("doc_id_offsets"))
+        segments.append(InvertedIndex.from_arrays(seg_arrays, vocab, doc_ids, params["block_size"]))
+    
+    index = SegmentedIndex.from_segments(segments, header["next_seq"], **params, **kwargs)
+    return index, header.get("meta", {})
+
+
+def write_shard_manifest(path: str, manifest: Dict[str, Any]):
+    """
+    写入分片索引的清单文件（先写临时文件再原子替换）
+    
+    Args:
+        path: 清单文件路径
+        manifest: 清单内容（分片文件名、索引参数等）
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"format": SHARD_MANIFEST_FORMAT, "version": SHARD_MANIFEST_VERSION, **manifest}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_shard_manifest(path: str) -> Optional[Dict[str, Any]]:
+    """
+    读取分片索引的清单文件
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        清单内容；不是分片清单（如单文件索引）时返回 None
+    """
+    with open(path, "rb") as f:
+        if f.read(len(FORMAT_MAGIC)) == FORMAT_MAGIC:
+            return None
+        f.seek(0)
+        try:
+            manifest = json.loads(f.read().decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return None
+    if not isinstance(manifest, dict) or manifest.get("format") != SHARD_MANIFEST_FORMAT:
+        return None
+    if manifest.get("version") != SHARD_MANIFEST_VERSION:
+        raise ValueError(
+            f"不支持的 BM25 分片清单版本 {manifest.get('version')}（当前为 {SHARD_MANIFEST_VERSION}），请重新建索引并保存"
+        )
+    return manifest
+
+
+def _segment_arrays(
+    segment: InvertedIndex,
+    live: np.ndarray,
+    live_df: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """一个段需要保存的全部数组（含词表和文档 ID 表）"""
+    terms = list(segment.vocab)
+    term_blob, term_offsets = StringTable.encode(terms)
+    doc_blob, doc_offsets = StringTable.encode(list(segment.doc_ids))
+    encoded_terms = [term.encode("utf-8") for term in terms]
+    sorted_ids = np.asarray(
+        sorted(range(len(terms)), key=encoded_terms.__getitem__),
+        dtype=np.int64
+    )
+    
+    arrays = {name: getattr(segment, name) for name in InvertedIndex.ARRAY_FIELDS}
+    arrays.update({
+        "live": live,
+        "live_df": live_df,
+        "term_blob": term_blob,
+        "term_offsets": term_offsets,
+        "term_sorted_ids": sorted_ids,
+        "doc_id_blob": doc_blob,
+        "doc_id_offsets": doc_offsets,
+    })
+    return arrays
+
+
+def _align(offset: int) -> int:
+    """向上对齐到 _ALIGN 字节"""
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
@@ -2,7 +2,7 @@
 混合检索（向量检索 + BM25）
 """
 from typing import List, Dict, Any
-from src.core.models import SearchResult
+from src.core.models import Hit, SearchResult
 
 
 class HybridSearchEngine:
@@ -10,61 +10,58 @@ class HybridSearchEngine:
     
     @staticmethod
     def reciprocal_rank_fusion(
-        vector_results: List[SearchResult],
+        vector_results: List[Hit],
         bm25_results: List[tuple],
         k: int = 60,
-        vector_weight: float = 0.5
-    ) -> List[SearchResult]:
+        vector_weight: float = 0.5,
+        include_bm25_only: bool = True
+    ) -> List[Hit]:
         """
         RRF (Reciprocal Rank Fusion) 算法融合检索结果
         
+        融合结果只含 ID、RRF 分数和排名（包括只有 BM25 命中的文档），
+        需由调用方截断后从文档库中补全内容。BM25 分数不大于 0 的结果（不含任何查询词，
+        只是补足 top_k）不参与融合。
+        
         Args:
-            vector_results: 向量检索结果
+            vector_results: 向量检索命中
             bm25_results: BM25检索结果 [(doc_id, score), ...]
             k: RRF 参数
             vector_weight: 向量检索权重（0-1之间）
+            include_bm25_only: 是否保留只有 BM25 命中的文档；为 False 时 BM25 只为向量命中加分
+                （元数据过滤只作用于向量检索，有过滤条件时应设为 False）
         
         Returns:
-            融合后的检索结果
+            融合后的命中列表
         """
-        # 构建文档 ID 到 SearchResult 的映射
-        doc_map = {result.document.id: result for result in vector_results}
-        
         # 计算 RRF 分数
         rrf_scores = {}
         
         # 向量检索贡献
-        for rank, result in enumerate(vector_results):
-            doc_id = result.document.id
-            rrf_scores[doc_id] = vector_weight / (k + rank + 1)
+        for rank, hit in enumerate(vector_results):
+            rrf_scores[hit.id] = vector_weight / (k + rank + 1)
         
         # BM25 贡献
         bm25_weight = 1.0 - vector_weight
-        for rank, (doc_id, bm25_score) in enumerate(bm25_results):
+        bm25_results = [(doc_id, score) for doc_id, score in bm25_results if score > 0]
+        for rank, (doc_id, _) in enumerate(bm25_results):
             if doc_id in rrf_scores:
                 rrf_scores[doc_id] += bm25_weight / (k + rank + 1)
-            else:
-                # 如果 BM25 找到了向量检索没找到的文档
-                # 注意：这种情况下我们没有完整的文档信息，所以跳过
-                pass
+            elif include_bm25_only:
+                rrf_scores[doc_id] = bm25_weight / (k + rank + 1)
         
         # 按 RRF 分数排序
         sorted_doc_ids = sorted(
             rrf_scores.keys(),
-            key=lambda x: rrf_scores[x],
+            key=rrf_scores.__getitem__,
             reverse=True
         )
         
         # 构建最终结果
-        final_results = []
-        for rank, doc_id in enumerate(sorted_doc_ids):
-            result = doc_map[doc_id]
-            # 更新分数和排名
-            result.score = rrf_scores[doc_id]
-            result.rank = rank + 1
-            final_results.append(result)
-        
-        return final_results
+        return [
+            Hit(doc_id, rrf_scores[doc_id], rank + 1)
+            for rank, doc_id in enumerate(sorted_doc_ids)
+        ]
     
     @staticmethod
     def normalize_scores(results: List[SearchResult]) -> List[SearchResult]:
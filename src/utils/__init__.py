@@ -1,4 +1,10 @@
 """
 工具模块
 """
-__all__ = []
+from .pipeline import StreamingPipeline, StageStats, iter_batches
+
+__all__ = [
+    "StreamingPipeline",
+    "StageStats",
+    "iter_batches",
+]
@@ -0,0 +1,161 @@
+"""
+本地文档库
+索引时写入块的内容与元数据，检索时各检索器只返回 ID 和分数，
+融合、截断之后再按 ID 批量取回内容（只取最终需要的文档）
+"""
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional
+from src.core.models import Document
+
+
+class DocumentStore:
+    """
+    持久化的文档内容库（SQLite，内容经 zlib 压缩）
+    
+    路径为 ":memory:" 时只保存在内存中，进程退出后丢失。
+    文件在第一次写入时才创建：只做检索的引擎不会在工作目录中留下空的数据库文件。
+    """
+    
+    # SQLite 单条语句的参数数量上限较低，批量操作时分段执行
+    _MAX_VARIABLES = 900
+    # zlib 压缩级别（默认级别，兼顾写入速度与体积）
+    _COMPRESS_LEVEL = 6
+    
+    def __init__(self, path: str):
+        """
+        初始化文档库（文件已存在时在第一次读取时打开，否则在第一次写入时创建）
+        
+        Args:
+            path: SQLite 文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+    
+    def _connection(self, create: bool) -> Optional[sqlite3.Connection]:
+        """
+        获取连接（调用方需持有锁）
+        
+        Args:
+            create: 文件不存在时是否创建
+        
+        Returns:
+            连接；文件不存在且 create 为 False 时返回 None
+        """
+        if self._conn is None:
+            if self.path != ":memory:" and not os.path.exists(self.path):
+                if not create:
+                    return None
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    content BLOB NOT NULL,
+                    metadata TEXT NOT NULL
+                );
+            """)
+            self._conn.commit()
+        return self._conn
+    
+    def put_many(self, documents: List[Document]):
+        """
+        批量写入文档（已存在的 ID 会被覆盖，不保存 embedding）
+        
+        Args:
+            documents: 文档列表
+        """
+        rows = [
+            (
+                doc.id,
+                zlib.compress(doc.content.encode("utf-8"), self._COMPRESS_LEVEL),
+                json.dumps(doc.metadata, ensure_ascii=False, default=str)
+            )
+            for doc in documents
+        ]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connection(create=True)
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (doc_id, content, metadata) VALUES (?, ?, ?)",
+                rows
+            )
+            conn.commit()
+    
+    def get_many(self, doc_ids: List[str]) -> Dict[str, Document]:
+        """
+        批量读取文档
+        
+        Args:
+            doc_ids: 文档 ID 列表
+        
+        Returns:
+            文档 ID 到文档的映射（不存在的 ID 不出现在结果中）
+        """
+        documents = {}
+        with self._lock:
+            conn = self._connection(create=False)
+            if conn is None:
+                return documents
+            for part in self._chunks(list(dict.fromkeys(doc_ids))):
+                placeholders = ",".join("?" * len(part))
+                rows = conn.execute(
+                    f"SELECT doc_id, content, metadata FROM documents WHERE doc_id IN ({placeholders})",
+                    part
+                ).fetchall()
+                for doc_id, content, metadata in rows:
+                    # 写入时已校验过，读取时不再重复校验
+                    documents[doc_id] = Document.model_construct(
+                        id=doc_id,
+                        content=zlib.decompress(content).decode("utf-8"),
+                        metadata=json.loads(metadata)
+                    )
+        return documents
+    
+    def delete_many(self, doc_ids: Iterable[str]):
+        """
+        删除文档
+        
+        Args:
+            doc_ids: 文档 ID 列表
+        """
+        with self._lock:
+            conn = self._connection(create=False)
+            if conn is None:
+                return
+            conn.executemany(
+                "DELETE FROM documents WHERE doc_id = ?",
+                [(doc_id,) for doc_id in doc_ids]
+            )
+            conn.commit()
+    
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            conn = self._connection(create=False)
+            return conn is not None and conn.execute(
+                "SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone() is not None
+    
+    def __len__(self) -> int:
+        with self._lock:
+            conn = self._connection(create=False)
+            return 0 if conn is None else conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    
+    def close(self):
+        """关闭文档库"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def _chunks(self, items: List[str]) -> Iterable[List[str]]:
+        """按 SQLite 参数数量上限分段"""
+        for start in range(0, len(items), self._MAX_VARIABLES):
+            yield items[start:start + self._MAX_VARIABLES]
@@ -0,0 +1,185 @@
+"""
+持久化 embedding 缓存
+以 (模型名, 文本) 的哈希为键，向量追加写入一个定长行的二进制矩阵文件，读取时内存映射；
+键按同样的行顺序追加写入索引文件，启动时载入内存。
+重新索引、迁移到新的向量数据库或集合时，已见过的文本只需读盘，无需再次推理
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    内容寻址的磁盘 embedding 缓存（线程安全，只追加）
+    
+    每个模型使用缓存目录下的独立子目录，同一时刻只应有一个进程写入。写入时先写向量再写键，
+    进程中途退出时多出的不完整行在下次打开时截掉，已写入的键总有对应的向量。
+    """
+    
+    # 键：blake2b 摘要字节数
+    KEY_BYTES = 16
+    
+    def __init__(self, directory: str, model_name: str, dimension: int, dtype: str = "float16"):
+        """
+        打开（或创建）缓存
+        
+        Args:
+            directory: 缓存根目录
+            model_name: 模型名（不同模型的向量互不混用）
+            dimension: 向量维度
+            dtype: 存储精度，float16（体积减半）或 float32
+        """
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"不支持的缓存精度: {dtype}（可选 float16 / float32）")
+        self.model_name = model_name
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.directory = os.path.join(directory, hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:16])
+        os.makedirs(self.directory, exist_ok=True)
+        self._check_meta()
+        
+        self._keys_path = os.path.join(self.directory, f"keys-{dtype}.bin")
+        self._vectors_path = os.path.join(self.directory, f"vectors-{dtype}.bin")
+        self._row_bytes = dimension * self.dtype.itemsize
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = {}  # 键 -> 行号
+        self._rows = 0  # 文件中的行数（先后多个进程写入同一文本时键可能重复，以最后一行为准）
+        self._load_index()
+        
+        self._keys_file = open(self._keys_path, "ab")
+        self._vectors_file = open(self._vectors_path, "ab")
+        self._vectors: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+    
+    def key(self, text: str) -> bytes:
+        """文本的缓存键：blake2b(模型名 + 文本)"""
+        hasher = hashlib.blake2b(self.model_name.encode("utf-8"), digest_size=self.KEY_BYTES)
+        hasher.update(b"\0")
+        hasher.update(text.encode("utf-8"))
+        return hasher.digest()
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        批量读取向量
+        
+        Args:
+            texts: 文本列表
+        
+        Returns:
+            与 texts 一一对应的 float32 向量，未缓存的为 None
+        """
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            rows = [self._index.get(key) for key in keys]
+            found = [row for row in rows if row is not None]
+            self.hits += len(found)
+            self.misses += len(rows) - len(found)
+            if not found:
+                return [None] * len(texts)
+            
+            vectors = self._mapped_vectors()[np.asarray(found, dtype=np.int64)].astype(np.float32)
+        results: List[Optional[np.ndarray]] = []
+        position = 0
+        for row in rows:
+            if row is None:
+                results.append(None)
+            else:
+                results.append(vectors[position])
+                position += 1
+        return results
+    
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        """
+        批量写入向量（已缓存的文本跳过）
+        
+        Args:
+            texts: 文本列表
+            embeddings: 对应的向量矩阵 (len(texts), dimension)
+        """
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            new_rows = {}
+            for i, key in enumerate(keys):
+                if key not in self._index and key not in new_rows:
+                    new_rows[key] = i
+            if not new_rows:
+                return
+            
+            matrix = np.asarray(embeddings)[list(new_rows.values())].astype(self.dtype)
+            self._vectors_file.write(np.ascontiguousarray(matrix).tobytes())
+            self._vectors_file.flush()
+            self._keys_file.write(b"".join(new_rows))
+            self._keys_file.flush()
+            for key in new_rows:
+                self._index[key] = self._rows
+                self._rows += 1
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._index)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        命中统计
+        
+        Returns:
+            条目数、命中数、未命中数和命中率
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._index),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+    
+    def close(self):
+        """关闭缓存文件"""
+        with self._lock:
+            self._keys_file.close()
+            self._vectors_file.close()
+            self._vectors = None
+    
+    def _check_meta(self):
+        """检查（或写入）缓存目录的模型信息，维度不一致时拒绝使用"""
+        meta_path = os.path.join(self.directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("dimension") != self.dimension:
+                raise ValueError(
+                    f"embedding 缓存维度 {meta.get('dimension')} 与模型维度 {self.dimension} 不一致: "
+                    f"{self.directory}（请删除该目录）"
+                )
+            return
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dimension": self.dimension}, f, ensure_ascii=False)
+    
+    def _load_index(self):
+        """载入键文件，截掉中途退出留下的不完整行"""
+        key_size = os.path.getsize(self._keys_path) if os.path.exists(self._keys_path) else 0
+        vector_size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        rows = min(key_size // self.KEY_BYTES, vector_size // self._row_bytes)
+        for path, size in ((self._keys_path, rows * self.KEY_BYTES), (self._vectors_path, rows * self._row_bytes)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+        if not rows:
+            return
+        
+        keys = np.fromfile(self._keys_path, dtype=np.uint8, count=rows * self.KEY_BYTES).reshape(rows, self.KEY_BYTES)
+        self._index = {keys[row].tobytes(): row for row in range(rows)}
+        self._rows = rows
+    
+    def _mapped_vectors(self) -> np.memmap:
+        """向量矩阵的内存映射，文件增长后重新映射（调用方需持有锁）"""
+        if self._vectors is None or self._vectors.shape[0] < self._rows:
+            self._vectors = np.memmap(
+                self._vectors_path, dtype=self.dtype, mode="r", shape=(self._rows, self.dimension)
+            )
+        return self._vectors
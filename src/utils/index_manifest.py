@@ -0,0 +1,205 @@
+"""
+增量索引清单
+记录每个已索引文档的内容哈希、索引参数指纹和生成的块 ID，
+用于判断文档是否需要重新分块和 embedding
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+from src.core.models import Document
+
+
+class ManifestEntry(NamedTuple):
+    """清单中的一条记录"""
+    content_hash: str  # 文档内容与元数据的哈希
+    fingerprint: str  # 分块参数与 embedding 模型的指纹
+    chunk_ids: List[str]  # 写入向量数据库和 BM25 的块 ID
+
+
+class IndexManifest:
+    """
+    持久化的增量索引清单（SQLite）
+    
+    每次同步开始时通过 begin_run() 获得一个运行编号，
+    本次见到的文档都会被标记为该编号，同步结束后编号落后的记录即为已删除的文档。
+    """
+    
+    # SQLite 单条语句的参数数量上限较低，批量操作时分段执行
+    _MAX_VARIABLES = 900
+    
+    def __init__(self, path: str):
+        """
+        打开（或创建）清单
+        
+        Args:
+            path: SQLite 文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                run_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_run ON documents (run_id);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+    
+    @staticmethod
+    def compute_hash(document: Document) -> str:
+        """
+        计算文档内容哈希（内容 + 元数据）
+        
+        Args:
+            document: 文档
+        
+        Returns:
+            十六进制哈希字符串
+        """
+        hasher = hashlib.sha256(document.content.encode("utf-8"))
+        hasher.update(b"\0")
+        hasher.update(json.dumps(document.metadata, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        return hasher.hexdigest()
+    
+    @staticmethod
+    def compute_fingerprint(params: Dict) -> str:
+        """
+        计算索引参数指纹（分块参数、embedding 模型等）
+        
+        Args:
+            params: 参数字典
+        
+        Returns:
+            指纹字符串
+        """
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    
+    def begin_run(self) -> int:
+        """
+        开始一次同步
+        
+        Returns:
+            本次同步的运行编号
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'last_run'").fetchone()
+            run_id = (int(row[0]) if row else 0) + 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_run', ?)",
+                (str(run_id),)
+            )
+            self._conn.commit()
+        return run_id
+    
+    def get_many(self, doc_ids: List[str]) -> Dict[str, ManifestEntry]:
+        """
+        批量读取清单记录
+        
+        Args:
+            doc_ids: 文档 ID 列表
+        
+        Returns:
+            文档 ID 到记录的映射（不存在的 ID 不出现在结果中）
+        """
+        entries = {}
+        with self._lock:
+            for part in self._chunks(doc_ids):
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT doc_id, content_hash, fingerprint, chunk_ids FROM documents "
+                    f"WHERE doc_id IN ({placeholders})",
+                    part
+                )
+                for doc_id, content_hash, fingerprint, chunk_ids in rows:
+                    entries[doc_id] = ManifestEntry(content_hash, fingerprint, json.loads(chunk_ids))
+        return entries
+    
+    def put_many(self, entries: Dict[str, ManifestEntry], run_id: int):
+        """
+        批量写入清单记录
+        
+        Args:
+            entries: 文档 ID 到记录的映射
+            run_id: 当前同步的运行编号
+        """
+        rows = [
+            (doc_id, entry.content_hash, entry.fingerprint, json.dumps(entry.chunk_ids), run_id)
+            for doc_id, entry in entries.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (doc_id, content_hash, fingerprint, chunk_ids, run_id) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+    
+    def touch_many(self, doc_ids: List[str], run_id: int):
+        """
+        将未变化的文档标记为本次同步已见
+        
+        Args:
+            doc_ids: 文档 ID 列表
+            run_id: 当前同步的运行编号
+        """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE documents SET run_id = ? WHERE doc_id = ?",
+                [(run_id, doc_id) for doc_id in doc_ids]
+            )
+            self._conn.commit()
+    
+    def stale_entries(self, run_id: int) -> List[Tuple[str, List[str]]]:
+        """
+        获取本次同步未见到的文档（即已从语料中删除的文档）
+        
+        Args:
+            run_id: 当前同步的运行编号
+        
+        Returns:
+            [(文档 ID, 块 ID 列表), ...]
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, chunk_ids FROM documents WHERE run_id < ?",
+                (run_id,)
+            ).fetchall()
+        return [(doc_id, json.loads(chunk_ids)) for doc_id, chunk_ids in rows]
+    
+    def delete_many(self, doc_ids: Iterable[str]):
+        """
+        删除清单记录
+        
+        Args:
+            doc_ids: 文档 ID 列表
+        """
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM documents WHERE doc_id = ?",
+                [(doc_id,) for doc_id in doc_ids]
+            )
+            self._conn.commit()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    
+    def close(self):
+        """关闭清单文件"""
+        with self._lock:
+            self._conn.close()
+    
+    def _chunks(self, items: List[str]) -> Iterable[List[str]]:
+        """按 SQLite 参数数量上限分段"""
+        for start in range(0, len(items), self._MAX_VARIABLES):
+            yield items[start:start + self._MAX_VARIABLES]
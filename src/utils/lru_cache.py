@@ -0,0 +1,94 @@
+"""
+线程安全的 LRU 缓存（可选过期时间）
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    有界 LRU 缓存
+    
+    超过容量时淘汰最久未使用的条目；设置 ttl 时，写入超过 ttl 秒的条目视为不存在。
+    """
+    
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        """
+        初始化缓存
+        
+        Args:
+            max_size: 最大条目数，0 表示不缓存
+            ttl: 条目有效期（秒），None 或 0 表示不过期
+        """
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()  # 键 -> (写入时间, 值)
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        读取条目（命中时移到最近使用的位置）
+        
+        Args:
+            key: 键
+            default: 未命中时的返回值
+        
+        Returns:
+            缓存的值或 default
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and self.ttl is not None and time.monotonic() - item[0] > self.ttl:
+                del self._items[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+    
+    def put(self, key: Hashable, value: Any):
+        """
+        写入条目
+        
+        Args:
+            key: 键
+            value: 值
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+    
+    def clear(self):
+        """清空缓存（不重置命中统计）"""
+        with self._lock:
+            self._items.clear()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        命中统计
+        
+        Returns:
+            条目数、命中数、未命中数和命中率
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,166 @@
+"""
+流式多阶段流水线
+每个阶段运行在独立线程中，阶段之间通过有界队列连接，
+使各阶段可以同时工作，并且内存占用与输入规模无关
+"""
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# 队列结束标记
+_SENTINEL = object()
+
+
+def iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """
+    将任意可迭代对象切分为批次（惰性读取，不会一次性载入内存）
+    
+    Args:
+        items: 可迭代对象（列表、生成器等）
+        batch_size: 每批数量
+    
+    Returns:
+        批次迭代器
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class StageStats:
+    """单个流水线阶段的吞吐统计"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0  # 处理的条目数（输入批次长度之和）
+        self.batches = 0  # 处理的批次数
+        self.busy_seconds = 0.0  # 实际处理耗时（不含等待队列的时间）
+    
+    def record(self, items: int, seconds: float):
+        """记录一个批次"""
+        self.items += items
+        self.batches += 1
+        self.busy_seconds += seconds
+    
+    @property
+    def throughput(self) -> float:
+        """每秒处理条目数"""
+        return self.items / self.busy_seconds if self.busy_seconds > 0 else 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "items": self.items,
+            "batches": self.batches,
+            "busy_seconds": round(self.busy_seconds, 4),
+            "throughput": round(self.throughput, 2),
+        }
+
+
+class StreamingPipeline:
+    """
+    多阶段流式流水线
+    
+    每个阶段是一个函数：接收一个批次，返回交给下一阶段的批次（返回 None 则不再传递）。
+    任一阶段抛出异常时流水线停止，剩余批次被丢弃，异常在 run() 中重新抛出。
+    """
+    
+    def __init__(
+        self,
+        stages: List[Tuple[str, Callable[[Any], Any]]],
+        queue_size: int = 4
+    ):
+        """
+        初始化流水线
+        
+        Args:
+            stages: [(阶段名, 处理函数), ...]，按执行顺序排列
+            queue_size: 阶段之间队列的最大批次数（控制内存上限）
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats: Dict[str, StageStats] = {name: StageStats(name) for name, _ in stages}
+        self._error: Optional[BaseException] = None
+        self._stopped = threading.Event()
+    
+    def run(self, batches: Iterable[Any]) -> Dict[str, StageStats]:
+        """
+        运行流水线直到输入耗尽
+        
+        Args:
+            batches: 输入批次的可迭代对象
+        
+        Returns:
+            各阶段统计信息
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+        for i, (name, func) in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            thread = threading.Thread(
+                target=self._run_stage,
+                args=(name, func, queues[i], outbox),
+                name=f"pipeline-{name}",
+                daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+        
+        try:
+            for batch in batches:
+                if self._stopped.is_set():
+                    break
+                queues[0].put(batch)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            queues[0].put(_SENTINEL)
+            for thread in threads:
+                thread.join()
+        
+        if self._error is not None:
+            raise self._error
+        return self.stats
+    
+    def _run_stage(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue]
+    ):
+        """阶段线程主循环"""
+        stats = self.stats[name]
+        while True:
+            batch = inbox.get()
+            if batch is _SENTINEL:
+                break
+            # 出错后继续消费输入，避免上游阻塞在满队列上
+            if self._stopped.is_set():
+                continue
+            
+            start = time.perf_counter()
+            try:
+                output = func(batch)
+            except BaseException as e:
+                self._fail(e)
+                continue
+            stats.record(len(batch), time.perf_counter() - start)
+            
+            if outbox is not None and output is not None:
+                outbox.put(output)
+        
+        if outbox is not None:
+            outbox.put(_SENTINEL)
+    
+    def _fail(self, error: BaseException):
+        """记录第一个异常并停止流水线"""
+        if self._error is None:
+            self._error = error
+        self._stopped.set()
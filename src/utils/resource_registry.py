@@ -0,0 +1,121 @@
+"""
+进程级共享资源注册表
+embedding 模型、LLM 客户端、向量数据库连接按配置（key）在进程内共享并引用计数：
+N 个引擎实例只加载一份模型；最后一个使用方 release 时才关闭资源
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Entry:
+    """注册表条目"""
+    
+    __slots__ = ("instance", "refcount", "lock")
+    
+    def __init__(self):
+        self.instance: Optional[Any] = None
+        self.refcount = 0
+        # 创建实例时只锁当前条目，加载一个模型不会阻塞其他资源的获取
+        self.lock = threading.Lock()
+
+
+class ResourceRegistry:
+    """
+    引用计数的共享资源注册表（线程安全）
+    
+    同一 key 只调用一次 factory；每次 acquire 都要对应一次 release，
+    计数归零时调用资源的 close()（如果有）并移除条目，之后再 acquire 会重新创建。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, _Entry] = {}
+    
+    def acquire(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        获取共享资源（不存在时用 factory 创建）
+        
+        Args:
+            key: 资源标识（应包含决定资源行为的全部配置）
+            factory: 无参创建函数
+        
+        Returns:
+            共享的资源实例
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry()
+                self._entries[key] = entry
+            entry.refcount += 1
+        
+        with entry.lock:
+            if entry.instance is None:
+                try:
+                    entry.instance = factory()
+                except BaseException:
+                    self._discard(key, entry)
+                    raise
+        return entry.instance
+    
+    def release(self, key: Hashable) -> bool:
+        """
+        释放一次引用
+        
+        Args:
+            key: 资源标识
+        
+        Returns:
+            是否因计数归零而关闭了资源
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            entry.refcount -= 1
+            if entry.refcount > 0:
+                return False
+            del self._entries[key]
+        
+        self._close(entry.instance)
+        return True
+    
+    def refcount(self, key: Hashable) -> int:
+        """资源当前的引用数（未注册时为 0）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.refcount if entry is not None else 0
+    
+    def stats(self) -> Dict[Hashable, int]:
+        """已注册的资源及其引用数"""
+        with self._lock:
+            return {key: entry.refcount for key, entry in self._entries.items()}
+    
+    def clear(self):
+        """忽略引用计数，关闭并移除全部资源（用于进程退出前或测试）"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close(entry.instance)
+    
+    def _discard(self, key: Hashable, entry: _Entry):
+        """创建失败时撤销本次引用"""
+        with self._lock:
+            entry.refcount -= 1
+            if entry.refcount <= 0 and self._entries.get(key) is entry:
+                del self._entries[key]
+    
+    @staticmethod
+    def _close(instance: Any):
+        """调用资源的 close()（如果有）"""
+        close = getattr(instance, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"✗ 关闭共享资源失败: {e}")
+
+
+# 全局注册表实例
+registry = ResourceRegistry()
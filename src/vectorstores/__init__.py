@@ -1,14 +1,38 @@
 """
 向量数据库模块
+各后端在首次访问时才导入（只用 Chroma 时不会加载 pymilvus、qdrant_client）
 """
+import importlib
 from .vector_store_base import RAGVectorStore
-from .vector_store_milvus import MilvusVectorStore
-from .vector_store_qdrant import QdrantVectorStore
-from .vector_store_chroma import ChromaVectorStore
+
+# 导出名 -> 所在子模块
+_BACKENDS = {
+    "MilvusVectorStore": ".vector_store_milvus",
+    "QdrantVectorStore": ".vector_store_qdrant",
+    "ChromaVectorStore": ".vector_store_chroma",
+    "NumpyVectorStore": ".vector_store_numpy",
+    "IVFPQVectorStore": ".vector_store_ivfpq",
+}
 
 __all__ = [
     "RAGVectorStore",
     "MilvusVectorStore",
     "QdrantVectorStore",
     "ChromaVectorStore",
+    "NumpyVectorStore",
+    "IVFPQVectorStore",
 ]
+
+
+def __getattr__(name: str):
+    """按需导入向量数据库后端（PEP 562）"""
+    if name in _BACKENDS:
+        value = getattr(importlib.import_module(_BACKENDS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    """包含尚未导入的导出名"""
+    return sorted(set(globals()) | set(__all__))
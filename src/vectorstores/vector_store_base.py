@@ -1,9 +1,13 @@
 """
 向量数据库抽象接口定义
 """
+import asyncio
+import functools
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
-from src.core.models import Document, SearchResult
+from concurrent.futures import Executor
+from typing import List, Dict, Any, Optional, Callable
+import numpy as np
+from src.core.models import Document, Hit, SearchResult
 
 
 class RAGVectorStore(ABC):
@@ -17,6 +21,8 @@ class RAGVectorStore(ABC):
             collection_name: 集合/表名称
         """
         self.collection_name = collection_name
+        # 异步接口回退到同步实现时使用的线程池（None 表示事件循环默认线程池）
+        self._executor: Optional[Executor] = None
     
     @abstractmethod
     def batch_upsert(self, documents: List[Document]) -> bool:
@@ -36,7 +42,8 @@ class RAGVectorStore(ABC):
         self,
         query_embedding: List[float],
         top_k: int = 10,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
     ) -> List[SearchResult]:
         """
         相似度检索
@@ -45,12 +52,82 @@ class RAGVectorStore(ABC):
             query_embedding: 查询向量
             top_k: 返回结果数量
             filters: 元数据过滤条件，例如 {"category": "tech"}
+            with_content: 是否返回文档内容和元数据；为 False 时只取回 ID 和分数
+                （content 为空字符串），内容由调用方从文档库中补全
         
         Returns:
             检索结果列表
         """
         pass
     
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
+    ) -> List[List[SearchResult]]:
+        """
+        批量相似度检索
+        
+        默认实现逐条调用 search，支持批量查询的子类应覆盖此方法，
+        在一次请求中完成所有查询。
+        
+        Args:
+            query_embeddings: 查询向量列表
+            top_k: 每个查询返回的结果数量
+            filters: 元数据过滤条件（对所有查询生效）
+            with_content: 是否返回文档内容和元数据
+        
+        Returns:
+            与查询一一对应的检索结果列表
+        """
+        return [self.search(q, top_k, filters, with_content) for q in query_embeddings]
+    
+    def search_hits(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Hit]:
+        """
+        相似度检索，只返回 ID 和分数（引擎检索热路径使用，内容由文档库补全）
+        
+        Args:
+            query_embedding: 查询向量
+            top_k: 返回结果数量
+            filters: 元数据过滤条件
+        
+        Returns:
+            命中列表
+        """
+        return self.search_hits_batch([query_embedding], top_k, filters)[0]
+    
+    def search_hits_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Hit]]:
+        """
+        批量相似度检索，只返回 ID 和分数
+        
+        默认实现由 search_batch 的结果转换而来，子类应覆盖此方法，
+        直接从客户端响应构造命中，不经过 pydantic 模型。
+        
+        Args:
+            query_embeddings: 查询向量列表
+            top_k: 每个查询返回的结果数量
+            filters: 元数据过滤条件（对所有查询生效）
+        
+        Returns:
+            与查询一一对应的命中列表
+        """
+        return [
+            [Hit.from_search_result(result) for result in results]
+            for results in self.search_batch(query_embeddings, top_k, filters, with_content=False)
+        ]
+    
     @abstractmethod
     def delete(self, doc_ids: List[str]) -> bool:
         """
@@ -64,6 +141,21 @@ class RAGVectorStore(ABC):
         """
         pass
     
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, Document]:
+        """
+        按 ID 读取文档内容和元数据（不含向量）
+        
+        引擎在文档库中缺少检索结果时用它补全并回填文档库（如由其他进程或升级前索引的集合）；
+        默认实现不支持按 ID 读取，返回空映射。
+        
+        Args:
+            doc_ids: 文档 ID 列表
+        
+        Returns:
+            文档 ID 到文档的映射（不存在的 ID 不出现在结果中）
+        """
+        return {}
+    
     @abstractmethod
     def get_collection_stats(self) -> Dict[str, Any]:
         """
@@ -96,3 +188,120 @@ class RAGVectorStore(ABC):
             是否成功
         """
         pass
+    
+    def close(self):
+        """释放连接等资源（默认无操作；共享连接只释放本实例的引用）"""
+        pass
+    
+    async def aclose(self):
+        """
+        在事件循环中释放资源（使用过异步接口时调用）
+        
+        异步客户端绑定创建它的事件循环，需要在该循环中关闭；默认实现等同 close()。
+        """
+        self.close()
+    
+    async def abatch_upsert(self, documents: List[Document]) -> bool:
+        """
+        异步批量插入或更新文档
+        
+        默认实现将同步的 batch_upsert 放到线程池中执行，
+        支持原生异步客户端的子类应覆盖此方法。
+        
+        Args:
+            documents: 文档列表
+        
+        Returns:
+            是否成功
+        """
+        return await self._run_in_executor(self.batch_upsert, documents)
+    
+    async def asearch(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
+    ) -> List[SearchResult]:
+        """
+        异步相似度检索
+        
+        默认实现将同步的 search 放到线程池中执行，
+        支持原生异步客户端的子类应覆盖此方法。
+        
+        Args:
+            query_embedding: 查询向量
+            top_k: 返回结果数量
+            filters: 元数据过滤条件
+            with_content: 是否返回文档内容和元数据
+        
+        Returns:
+            检索结果列表
+        """
+        return await self._run_in_executor(self.search, query_embedding, top_k, filters, with_content)
+    
+    async def asearch_hits(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Hit]:
+        """
+        异步相似度检索，只返回 ID 和分数
+        
+        默认实现由 asearch 的结果转换而来，支持原生异步客户端的子类应覆盖此方法。
+        
+        Args:
+            query_embedding: 查询向量
+            top_k: 返回结果数量
+            filters: 元数据过滤条件
+        
+        Returns:
+            命中列表
+        """
+        results = await self.asearch(query_embedding, top_k, filters, with_content=False)
+        return [Hit.from_search_result(result) for result in results]
+    
+    async def adelete(self, doc_ids: List[str]) -> bool:
+        """
+        异步删除指定文档
+        
+        Args:
+            doc_ids: 文档 ID 列表
+        
+        Returns:
+            是否成功
+        """
+        return await self._run_in_executor(self.delete, doc_ids)
+    
+    @staticmethod
+    def _embedding_matrix(documents: List[Document]) -> np.ndarray:
+        """
+        将文档向量拼成一个连续的 float32 矩阵，供客户端批量写入
+        
+        Args:
+            documents: 文档列表（均已生成 embedding）
+        
+        Returns:
+            (len(documents), dimension) 矩阵
+        """
+        return np.stack([doc.embedding for doc in documents]).astype(np.float32, copy=False)
+    
+    @staticmethod
+    def _close_async_client(client: Any):
+        """
+        在同步的 close() 中关闭异步客户端
+        
+        没有运行中的事件循环时临时启动一个循环关闭它；在事件循环中应改用 await aclose()。
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(client.close())
+            return
+        print("✗ 事件循环中请使用 await vector_store.aclose() 关闭异步客户端")
+    
+    async def _run_in_executor(self, func: Callable, *args) -> Any:
+        """在线程池中执行阻塞调用，避免阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
@@ -1,24 +1,40 @@
 """
 Chroma 向量数据库实现
 """
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 import chromadb
 from chromadb.config import Settings
 from src.vectorstores.vector_store_base import RAGVectorStore
-from src.core.models import Document, SearchResult
+from src.core.models import Document, Hit, SearchResult
 from src.core.config import settings as app_settings
+from src.utils.resource_registry import registry
 
 
 class ChromaVectorStore(RAGVectorStore):
-    """Chroma 向量数据库实现"""
+    """
+    Chroma 向量数据库实现
+    
+    Chroma 客户端没有异步接口，asearch / abatch_upsert / adelete
+    在专用的有界线程池中执行同步调用。
+    """
     
     def __init__(self, collection_name: str = "rag_collection"):
         super().__init__(collection_name)
-        self.client = chromadb.PersistentClient(
-            path=app_settings.chroma_persist_directory,
-            settings=Settings(anonymized_telemetry=False)
+        # 同一持久化目录的多个集合共享一个客户端
+        self._client_key = ("chroma", app_settings.chroma_persist_directory)
+        self.client = registry.acquire(
+            self._client_key,
+            lambda: chromadb.PersistentClient(
+                path=app_settings.chroma_persist_directory,
+                settings=Settings(anonymized_telemetry=False)
+            )
         )
         self.collection = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=app_settings.chroma_async_workers,
+            thread_name_prefix="chroma"
+        )
         print(f"✓ 成功初始化 Chroma: {app_settings.chroma_persist_directory}")
     
     def create_collection(self, dimension: int) -> bool:
@@ -51,7 +67,8 @@ class ChromaVectorStore(RAGVectorStore):
             
             # 准备数据
             ids = [doc.id for doc in documents]
-            embeddings = [doc.embedding for doc in documents]
+            # 旧版 chromadb 只接受列表：从连续矩阵一次性转换
+            embeddings = self._embedding_matrix(documents).tolist()
             metadatas = []
             documents_text = []
             
@@ -86,52 +103,101 @@ class ChromaVectorStore(RAGVectorStore):
         self,
         query_embedding: List[float],
         top_k: int = 10,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
     ) -> List[SearchResult]:
         """相似度检索"""
+        return self.search_batch([query_embedding], top_k, filters, with_content)[0]
+    
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
+    ) -> List[List[SearchResult]]:
+        """批量相似度检索（一次 query 请求）"""
         try:
-            if not self.collection:
-                self.collection = self.client.get_collection(self.collection_name)
-            
-            # 构建过滤条件
-            where = None
-            if filters:
-                where = {}
-                for key, value in filters.items():
-                    where[key] = value
-            
-            # 执行搜索
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k,
-                where=where,
-                include=["documents", "metadatas", "distances"]
+            results = self._query(
+                query_embeddings, top_k, filters,
+                ["documents", "metadatas", "distances"] if with_content else ["distances"]
             )
             
-            # 转换结果
-            search_results = []
-            if results["ids"]:
-                for i, doc_id in enumerate(results["ids"][0]):
-                    doc = Document(
-                        id=doc_id,
-                        content=results["documents"][0][i],
-                        metadata=results["metadatas"][0][i]
-                    )
-                    # Chroma 返回的是距离，需要转换为相似度（距离越小相似度越高）
-                    distance = results["distances"][0][i]
-                    score = 1.0 / (1.0 + distance)  # 转换为相似度分数
-                    
-                    search_results.append(
-                        SearchResult(
-                            document=doc,
-                            score=float(score)
+            # 转换结果，每个查询对应一组命中
+            batch_results = []
+            for q in range(len(query_embeddings)):
+                search_results = []
+                if results["ids"]:
+                    for i, doc_id in enumerate(results["ids"][q]):
+                        doc = Document(
+                            id=doc_id,
+                            content=results["documents"][q][i] if with_content else "",
+                            metadata=results["metadatas"][q][i] if with_content else {}
                         )
-                    )
+                        # Chroma 返回的是距离，需要转换为相似度（距离越小相似度越高）
+                        score = self._to_score(results["distances"][q][i])
+                        
+                        search_results.append(
+                            SearchResult(
+                                document=doc,
+                                score=score
+                            )
+                        )
+                batch_results.append(search_results)
             
-            return search_results
+            return batch_results
+        except Exception as e:
+            print(f"✗ 检索失败: {e}")
+            return [[] for _ in query_embeddings]
+    
+    def search_hits_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Hit]]:
+        """批量相似度检索，只取回 ID 和分数"""
+        try:
+            results = self._query(query_embeddings, top_k, filters, ["distances"])
+            if not results["ids"]:
+                return [[] for _ in query_embeddings]
+            return [
+                [Hit(doc_id, self._to_score(distance)) for doc_id, distance in zip(ids, distances)]
+                for ids, distances in zip(results["ids"], results["distances"])
+            ]
         except Exception as e:
             print(f"✗ 检索失败: {e}")
-            return []
+            return [[] for _ in query_embeddings]
+    
+    def _query(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        include: List[str]
+    ) -> Dict[str, Any]:
+        """执行一次 query 请求，返回原始结果"""
+        if not self.collection:
+            self.collection = self.client.get_collection(self.collection_name)
+        
+        # 构建过滤条件
+        where = None
+        if filters:
+            where = {}
+            for key, value in filters.items():
+                where[key] = value
+        
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            where=where,
+            include=include
+        )
+    
+    @staticmethod
+    def _to_score(distance: float) -> float:
+        """将 Chroma 返回的距离转换为相似度分数"""
+        return float(1.0 / (1.0 + distance))
     
     def delete(self, doc_ids: List[str]) -> bool:
         """删除文档"""
@@ -146,6 +212,23 @@ class ChromaVectorStore(RAGVectorStore):
             print(f"✗ 删除失败: {e}")
             return False
     
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, Document]:
+        """按 ID 读取文档（get 请求，不取回向量）"""
+        if not doc_ids:
+            return {}
+        try:
+            if not self.collection:
+                self.collection = self.client.get_collection(self.collection_name)
+            
+            results = self.collection.get(ids=list(doc_ids), include=["documents", "metadatas"])
+            return {
+                doc_id: Document(id=doc_id, content=content or "", metadata=metadata or {})
+                for doc_id, content, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+            }
+        except Exception as e:
+            print(f"✗ 按 ID 读取文档失败: {e}")
+            return {}
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """获取集合统计信息"""
         try:
@@ -170,3 +253,10 @@ class ChromaVectorStore(RAGVectorStore):
         except Exception as e:
             print(f"✗ 删除集合失败: {e}")
             return False
+    
+    def close(self):
+        """关闭异步线程池并释放共享客户端的引用"""
+        self._executor.shutdown(wait=True)
+        if self.client is not None:
+            registry.release(self._client_key)
+            self.client = None
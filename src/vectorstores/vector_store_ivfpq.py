@@ -0,0 +1,424 @@
+"""
+IVF-PQ 向量数据库实现（进程内，压缩索引）
+在 NumpyVectorStore 的存储之上增加倒排乘积量化索引：
+- IVF: k-means 粗聚类，查询只扫描最近的 nprobe 个聚类
+- PQ: 向量减去所属聚类中心后的残差切成 m 段，每段用 256 个码字的码本编码为 1 字节
+- 检索: 每个查询先算出各段与全部码字的内积表（非对称距离），候选分数 = 与聚类中心的内积 + 查表求和；
+  可选从磁盘上的全精度向量文件取出前若干候选精排
+常驻内存每条约 m + 25 字节（编码 + 倒排表行号 + NumpyVectorStore 的行状态和 ID 索引），
+聚类号、全精度向量、ID、内容和元数据只保留在文件中。倒排表按聚类分别存放，新写入的行追加到所属聚类的数组末尾。
+
+集合目录在 NumpyVectorStore 的基础上增加（训练后才存在）：
+- ivfpq.<代次>.npz: 聚类中心和 PQ 码本
+- codes.<代次>.u8: (行数, m) 的 PQ 编码，只追加
+- lists.<代次>.i32: 每行所属的聚类号，只追加
+"""
+import os
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from src.vectorstores.vector_store_numpy import NumpyVectorStore, normalize_rows, grow_rows
+from src.core.config import settings
+
+
+# 计算最近聚类中心时每块的行数（限制 行数 × 聚类数 的临时矩阵大小）
+ASSIGN_BLOCK = 8192
+
+
+def nearest_centroids(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    按 L2 距离为每行找最近的中心
+    
+    Args:
+        data: (行数, 维度) 矩阵
+        centroids: (中心数, 维度) 矩阵
+    
+    Returns:
+        每行最近中心的编号（int32）
+    """
+    # argmin ||x - c||² = argmax (x·c - ||c||²/2)
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), ASSIGN_BLOCK):
+        block = np.asarray(data[start:start + ASSIGN_BLOCK], dtype=np.float32)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return labels
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """
+    Lloyd k-means（随机样本初始化，空簇用随机样本重新播种）
+    
+    Args:
+        data: (样本数, 维度) 训练数据
+        k: 中心数（超过样本数时取样本数）
+        iterations: 迭代次数
+        seed: 随机种子
+    
+    Returns:
+        (k, 维度) 的 float32 中心矩阵
+    """
+    data = np.asarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    
+    for _ in range(iterations):
+        labels = nearest_centroids(data, centroids)
+        # 按簇号排序后分段求和，比 np.add.at 快得多
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+    return centroids
+
+
+def pq_encode(residuals: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    """
+    PQ 编码
+    
+    Args:
+        residuals: (行数, 维度) 残差矩阵
+        codebooks: (m, 码字数, 维度 / m) 码本
+    
+    Returns:
+        (行数, m) 的 uint8 编码
+    """
+    m, _, sub_dim = codebooks.shape
+    codes = np.empty((len(residuals), m), dtype=np.uint8)
+    for j in range(m):
+        codes[:, j] = nearest_centroids(residuals[:, j * sub_dim:(j + 1) * sub_dim], codebooks[j])
+    return codes
+
+
+class IVFPQVectorStore(NumpyVectorStore):
+    """
+    IVF-PQ 向量数据库实现
+    
+    有效行达到 ivfpq_train_min_rows 时自动训练（也可手动调用 train()），训练前按精确暴力检索；
+    训练后新写入的向量在写入时编码。分数为余弦相似度（未精排时为近似值）。
+    """
+    
+    DISPLAY_NAME = "IVF-PQ"
+    # 过滤后剩余行数不超过该值时直接精确检索这些行
+    EXACT_MAX_ROWS = 4096
+    
+    def __init__(
+        self,
+        collection_name: str = "rag_collection",
+        directory: Optional[str] = None,
+        read_only: bool = False,
+        nprobe: Optional[int] = None,
+        rerank_factor: Optional[int] = None
+    ):
+        """
+        打开集合（集合不存在时需先调用 create_collection）
+        
+        Args:
+            collection_name: 集合名称
+            directory: 存储根目录，默认使用配置（settings.numpy_store_directory）
+            read_only: 只读打开（供其他进程共享写进程维护的集合）
+            nprobe: 每个查询扫描的聚类数，默认使用配置
+            rerank_factor: 精排候选数为 top_k 的倍数，0 表示不精排，默认使用配置
+        """
+        self.nprobe = nprobe or settings.ivfpq_nprobe
+        self.rerank_factor = settings.ivfpq_rerank_factor if rerank_factor is None else rerank_factor
+        super().__init__(collection_name, directory, read_only)
+    
+    def batch_upsert(self, documents) -> bool:
+        """批量插入或更新文档（有效行达到阈值且尚未训练时自动训练）"""
+        if not super().batch_upsert(documents):
+            return False
+        min_rows = settings.ivfpq_train_min_rows
+        if self.centroids is None and min_rows > 0 and len(self._index_hashes) >= min_rows:
+            # 训练失败不影响已写入的数据，继续按精确检索
+            self.train()
+        return True
+    
+    def train(self, sample_size: Optional[int] = None) -> bool:
+        """
+        用有效行的随机样本训练聚类中心和 PQ 码本，并把全部有效行编码写入下一代文件
+        
+        Args:
+            sample_size: 训练样本数，默认使用配置（settings.ivfpq_train_size）
+        
+        Returns:
+            是否成功
+        """
+        try:
+            self._check_writable()
+            with self._lock:
+                self._refresh()
+                self._require_collection()
+                m = settings.ivfpq_m
+                if self.dimension % m:
+                    raise ValueError(f"向量维度 {self.dimension} 不能被 PQ 子空间数 {m} 整除")
+                
+                live_rows = np.flatnonzero(self._alive[:self._rows])
+                if not len(live_rows):
+                    raise ValueError("集合为空，无法训练")
+                rng = np.random.default_rng(0)
+                sample_size = min(sample_size or settings.ivfpq_train_size, len(live_rows))
+                sample_rows = np.sort(rng.choice(live_rows, sample_size, replace=False))
+                sample = np.asarray(self._vectors[sample_rows], dtype=np.float32)
+                
+                # 每个聚类至少约 32 个训练样本
+                nlist = max(1, min(settings.ivfpq_nlist, sample_size // 32))
+                print(f"正在训练 IVF-PQ: {sample_size} 个样本，{nlist} 个聚类，{m} 个子空间")
+                centroids = kmeans(sample, nlist)
+                residuals = sample - centroids[nearest_centroids(sample, centroids)]
+                sub_dim = self.dimension // m
+                # 每段 256 个码字（样本更少时取样本数），编码为 1 字节
+                codebooks = np.stack([
+                    kmeans(residuals[:, j * sub_dim:(j + 1) * sub_dim], 256, seed=j)
+                    for j in range(m)
+                ])
+                
+                self._staged_quantizer = (centroids, codebooks)
+                try:
+                    num_live = self._rewrite_generation()
+                finally:
+                    self._staged_quantizer = None
+            
+            print(f"✓ IVF-PQ 训练完成: {self.collection_name}（已编码 {num_live} 行）")
+            return True
+        except Exception as e:
+            print(f"✗ IVF-PQ 训练失败: {e}")
+            return False
+    
+    def evaluate_recall(self, query_embeddings: List[List[float]], top_k: int = 10) -> float:
+        """
+        recall@k：IVF-PQ 结果与精确暴力检索结果的平均重合比例
+        
+        Args:
+            query_embeddings: 查询向量列表
+            top_k: 比较前 k 个结果
+        
+        Returns:
+            平均召回率
+        """
+        with self._lock:
+            self._refresh()
+            self._require_collection()
+            vectors = self._vectors
+            mask = self._alive[:self._rows].copy()
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        approx_rows, _ = self._top_k(queries, vectors, top_k, mask)
+        exact_rows, _ = super()._top_k(queries, vectors, top_k, mask)
+        recalls = [
+            len(set(approx.tolist()) & set(exact.tolist())) / len(exact)
+            for approx, exact in zip(approx_rows, exact_rows) if len(exact)
+        ]
+        return float(np.mean(recalls)) if recalls else 1.0
+    
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """获取集合统计信息（含索引参数和每条向量的常驻内存）"""
+        stats = super().get_collection_stats()
+        if stats:
+            with self._lock:
+                trained = self.centroids is not None
+                stats.update({
+                    "trained": trained,
+                    "nlist": len(self.centroids) if trained else 0,
+                    "m": self.codebooks.shape[0] if trained else 0,
+                    "nprobe": self.nprobe,
+                    "rerank_factor": self.rerank_factor,
+                    # 按实际数组计算（含扩展余量、量化器和过滤掩码缓存，不含内存映射的全精度向量）
+                    "bytes_per_vector": round(stats["resident_bytes"] / max(stats["num_entities"], 1), 1),
+                })
+        return stats
+    
+    def _top_k(
+        self,
+        queries: np.ndarray,
+        vectors: np.ndarray,
+        top_k: int,
+        mask: np.ndarray
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """IVF-PQ 近似检索（可选精排）；未训练或过滤后候选很少时精确检索"""
+        with self._lock:
+            centroids, codebooks = self.centroids, self.codebooks
+            if centroids is not None:
+                # 倒排表扩展时替换为新数组，复制引用和行数即为快照
+                codes = self._codes
+                lists, sizes = list(self._lists), self._list_sizes.copy()
+        if centroids is None or int(mask.sum()) <= self.EXACT_MAX_ROWS:
+            return super()._top_k(queries, vectors, top_k, mask)
+        
+        m, _, sub_dim = codebooks.shape
+        nprobe = min(self.nprobe, len(centroids))
+        num_candidates = top_k * self.rerank_factor if self.rerank_factor > 0 else top_k
+        # 每个查询各段与全部码字的内积表: (查询数, m, 码字数)
+        tables = np.einsum("qjd,jkd->qjk", queries.reshape(len(queries), m, sub_dim), codebooks)
+        coarse = queries @ centroids.T
+        
+        all_rows, all_scores = [], []
+        for q in range(len(queries)):
+            probe = np.argpartition(-coarse[q], nprobe - 1)[:nprobe]
+            rows = np.concatenate([lists[l][:sizes[l]] for l in probe])
+            labels = np.repeat(probe, sizes[probe])
+            # 倒排表可能包含快照之后写入的行
+            keep = rows < len(mask)
+            rows, labels = rows[keep], labels[keep]
+            keep = mask[rows]
+            rows, labels = rows[keep], labels[keep]
+            if not len(rows):
+                all_rows.append(np.empty(0, dtype=np.int64))
+                all_scores.append(np.empty(0, dtype=np.float32))
+                continue
+            
+            scores = coarse[q, labels] + tables[q, np.arange(m), codes[rows]].sum(axis=1)
+            if len(rows) > num_candidates:
+                part = np.argpartition(-scores, num_candidates - 1)[:num_candidates]
+                rows, scores = rows[part], scores[part]
+            
+            if self.rerank_factor > 0:
+                # 按行号顺序读取内存映射，减少随机访问
+                rows = np.sort(rows)
+                scores = np.asarray(vectors[rows], dtype=np.float32) @ queries[q]
+            
+            best = np.argsort(-scores, kind="stable")[:top_k]
+            all_rows.append(rows[best].astype(np.int64))
+            all_scores.append(scores[best].astype(np.float32))
+        return all_rows, all_scores
+    
+    def _append_to_lists(self, first_row: int, assign: np.ndarray):
+        """
+        把新编码的行追加到所属聚类的倒排表（调用方持有锁）
+        
+        Args:
+            first_row: 第一行的行号
+            assign: 各行的聚类号
+        """
+        order = np.argsort(assign, kind="stable")
+        labels, starts, counts = np.unique(assign[order], return_index=True, return_counts=True)
+        rows = (first_row + order).astype(np.int32)
+        for label, start, count in zip(labels.tolist(), starts.tolist(), counts.tolist()):
+            size = int(self._list_sizes[label])
+            # 检索快照只读取各表原有的行数，在余量中追加不影响进行中的检索
+            self._lists[label] = grow_rows(self._lists[label], size + count)
+            self._lists[label][size:size + count] = rows[start:start + count]
+            self._list_sizes[label] = size + count
+    
+    def _resident_bytes(self) -> int:
+        """常驻内存的数组字节数（加上编码、倒排表和量化器）"""
+        total = super()._resident_bytes() + self._codes.nbytes + self._list_sizes.nbytes
+        total += sum(rows.nbytes for rows in self._lists)
+        if self.centroids is not None:
+            total += self.centroids.nbytes + self.codebooks.nbytes
+        return total
+    
+    def _codes_path(self, generation: int) -> str:
+        """指定代次的 PQ 编码文件路径"""
+        return self._path(f"codes.{generation}.u8")
+    
+    def _assign_path(self, generation: int) -> str:
+        """指定代次的聚类号文件路径"""
+        return self._path(f"lists.{generation}.i32")
+    
+    def _quantizer_path(self, generation: int) -> str:
+        """指定代次的聚类中心和码本文件路径"""
+        return self._path(f"ivfpq.{generation}.npz")
+    
+    def _generation_files(self, generation: int) -> List[str]:
+        """指定代次的全部数据文件"""
+        return super()._generation_files(generation) + [
+            self._codes_path(generation),
+            self._assign_path(generation),
+            self._quantizer_path(generation),
+        ]
+    
+    def _reset(self):
+        """清空内存状态"""
+        super()._reset()
+        self.centroids: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None
+        self._codes = np.zeros((0, 0), dtype=np.uint8)
+        self._coded_rows = 0
+        # 每个聚类的行号数组（带扩展余量）和其中的有效行数；聚类号本身只保存在文件中
+        self._lists: List[np.ndarray] = []
+        self._list_sizes = np.zeros(0, dtype=np.int64)
+        self._staged_quantizer: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    
+    def _encode(
+        self,
+        matrix: np.ndarray,
+        centroids: np.ndarray,
+        codebooks: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """计算聚类号和残差的 PQ 编码"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        assign = nearest_centroids(matrix, centroids)
+        return assign, pq_encode(matrix - centroids[assign], codebooks)
+    
+    def _append_row_data(self, first_row: int, matrix: np.ndarray):
+        """训练后写入的向量立即编码，追加到编码文件（截断到 first_row，与向量文件对齐）"""
+        if self.centroids is None:
+            return
+        assign, codes = self._encode(matrix, self.centroids, self.codebooks)
+        m = self.codebooks.shape[0]
+        for path, data, row_bytes in (
+            (self._assign_path(self.generation), assign, 4),
+            (self._codes_path(self.generation), codes, m),
+        ):
+            with open(path, "ab") as f:
+                f.truncate(first_row * row_bytes)
+                f.write(np.ascontiguousarray(data).tobytes())
+    
+    def _write_generation_data(self, generation: int, live_rows: np.ndarray):
+        """写入下一代的量化器和编码：训练时重新编码全部有效行，压缩时沿用已有编码"""
+        if self._staged_quantizer is not None:
+            centroids, codebooks = self._staged_quantizer
+        elif self.centroids is not None:
+            centroids, codebooks = self.centroids, self.codebooks
+        else:
+            return
+        
+        np.savez(self._quantizer_path(generation), centroids=centroids, codebooks=codebooks)
+        old_assign = np.memmap(
+            self._assign_path(self.generation), dtype=np.int32, mode="r", shape=(self._coded_rows,)
+        ) if self._staged_quantizer is None and self._coded_rows else None
+        with open(self._assign_path(generation), "wb") as assign_file, \
+                open(self._codes_path(generation), "wb") as codes_file:
+            for start in range(0, len(live_rows), self.block_rows):
+                rows = live_rows[start:start + self.block_rows]
+                if self._staged_quantizer is not None:
+                    assign, codes = self._encode(self._vectors[rows], centroids, codebooks)
+                else:
+                    assign, codes = old_assign[rows], self._codes[rows]
+                assign_file.write(np.ascontiguousarray(assign).tobytes())
+                codes_file.write(np.ascontiguousarray(codes).tobytes())
+    
+    def _load_row_data(self):
+        """加载当前代次的量化器和新行的编码"""
+        if self.centroids is None:
+            quantizer_path = self._quantizer_path(self.generation)
+            if not os.path.exists(quantizer_path):
+                return
+            with np.load(quantizer_path) as data:
+                self.centroids = data["centroids"]
+                self.codebooks = data["codebooks"]
+            self._codes = np.zeros((0, self.codebooks.shape[0]), dtype=np.uint8)
+            self._lists = [np.zeros(0, dtype=np.int32) for _ in range(len(self.centroids))]
+            self._list_sizes = np.zeros(len(self.centroids), dtype=np.int64)
+        
+        new_rows = self._rows - self._coded_rows
+        if new_rows <= 0:
+            return
+        m = self.codebooks.shape[0]
+        assign = np.fromfile(
+            self._assign_path(self.generation), dtype=np.int32, count=new_rows, offset=self._coded_rows * 4
+        )
+        codes = np.fromfile(
+            self._codes_path(self.generation), dtype=np.uint8, count=new_rows * m, offset=self._coded_rows * m
+        ).reshape(new_rows, m)
+        
+        self._codes = grow_rows(self._codes, self._rows)
+        self._codes[self._coded_rows:self._rows] = codes
+        self._append_to_lists(self._coded_rows, assign)
+        self._coded_rows = self._rows
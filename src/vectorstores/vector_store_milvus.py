@@ -1,20 +1,31 @@
 """
 Milvus 向量数据库实现
 """
+import json
 from typing import List, Dict, Any, Optional
 from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType, utility
 from src.vectorstores.vector_store_base import RAGVectorStore
-from src.core.models import Document, SearchResult
+from src.core.models import Document, Hit, SearchResult
 from src.core.config import settings
 
 
 class MilvusVectorStore(RAGVectorStore):
     """Milvus 向量数据库实现"""
     
+    # 检索参数
+    SEARCH_PARAMS = {
+        "metric_type": "L2",
+        "params": {"nprobe": 10}
+    }
+    OUTPUT_FIELDS = ["id", "content", "category", "metadata_json"]
+    # 只取回 ID（内容由文档库补全）
+    ID_FIELDS = ["id"]
+    
     def __init__(self, collection_name: str = "rag_collection"):
         super().__init__(collection_name)
         self._connect()
         self.collection: Optional[Collection] = None
+        self._async_client = None
     
     def _connect(self):
         """连接到 Milvus 服务"""
@@ -29,6 +40,35 @@ class MilvusVectorStore(RAGVectorStore):
             print(f"✗ Milvus 连接失败: {e}")
             raise
     
+    def _get_async_client(self):
+        """
+        获取异步客户端（首次使用时创建）
+        
+        Returns:
+            AsyncMilvusClient 实例；pymilvus 版本不支持时返回 None
+        """
+        if self._async_client is None:
+            try:
+                from pymilvus import AsyncMilvusClient
+            except ImportError:
+                return None
+            self._async_client = AsyncMilvusClient(
+                uri=f"http://{settings.milvus_host}:{settings.milvus_port}"
+            )
+        return self._async_client
+    
+    async def aclose(self):
+        """关闭异步客户端（须在使用它的事件循环中调用）"""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+    
+    def close(self):
+        """关闭异步客户端（同步连接为全局的 default 别名，不在此断开）"""
+        if self._async_client is not None:
+            self._close_async_client(self._async_client)
+            self._async_client = None
+    
     def create_collection(self, dimension: int) -> bool:
         """创建 Milvus 集合"""
         try:
@@ -79,12 +119,10 @@ class MilvusVectorStore(RAGVectorStore):
             if not self.collection:
                 self.collection = Collection(self.collection_name)
             
-            import json
-            
             # 准备数据
             ids = [doc.id for doc in documents]
             contents = [doc.content for doc in documents]
-            embeddings = [doc.embedding for doc in documents]
+            embeddings = self._embedding_matrix(documents)
             categories = [doc.metadata.get("category", "default") for doc in documents]
             metadata_jsons = [json.dumps(doc.metadata, ensure_ascii=False) for doc in documents]
             
@@ -113,55 +151,119 @@ class MilvusVectorStore(RAGVectorStore):
         self,
         query_embedding: List[float],
         top_k: int = 10,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
     ) -> List[SearchResult]:
         """相似度检索"""
+        return self.search_batch([query_embedding], top_k, filters, with_content)[0]
+    
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
+    ) -> List[List[SearchResult]]:
+        """批量相似度检索（一次 search 请求）"""
         try:
-            if not self.collection:
-                self.collection = Collection(self.collection_name)
-                self.collection.load()
-            
-            # 构建过滤表达式
-            expr = None
-            if filters:
-                conditions = []
-                for key, value in filters.items():
-                    if key == "category":
-                        conditions.append(f'category == "{value}"')
-                if conditions:
-                    expr = " && ".join(conditions)
-            
-            # 执行搜索
-            search_params = {
-                "metric_type": "L2",
-                "params": {"nprobe": 10}
-            }
+            results = self._search(
+                query_embeddings, top_k, filters,
+                self.OUTPUT_FIELDS if with_content else self.ID_FIELDS
+            )
             
-            results = self.collection.search(
-                data=[query_embedding],
-                anns_field="embedding",
-                param=search_params,
-                limit=top_k,
-                expr=expr,
-                output_fields=["id", "content", "category", "metadata_json"]
+            # 转换结果，每个查询对应一组命中
+            return [
+                [self._to_search_result(hit.entity.get, hit.distance) for hit in hits]
+                for hits in results
+            ]
+        except Exception as e:
+            print(f"✗ 检索失败: {e}")
+            return [[] for _ in query_embeddings]
+    
+    def search_hits_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Hit]]:
+        """批量相似度检索，只取回 ID 和距离"""
+        try:
+            results = self._search(query_embeddings, top_k, filters, self.ID_FIELDS)
+            return [[Hit(hit.id, float(hit.distance)) for hit in hits] for hits in results]
+        except Exception as e:
+            print(f"✗ 检索失败: {e}")
+            return [[] for _ in query_embeddings]
+    
+    def _search(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        output_fields: List[str]
+    ):
+        """执行一次 search 请求，返回 pymilvus 原始结果"""
+        if not self.collection:
+            self.collection = Collection(self.collection_name)
+            self.collection.load()
+        
+        return self.collection.search(
+            data=query_embeddings,
+            anns_field="embedding",
+            param=self.SEARCH_PARAMS,
+            limit=top_k,
+            expr=self._build_expr(filters),
+            output_fields=output_fields
+        )
+    
+    async def abatch_upsert(self, documents: List[Document]) -> bool:
+        """异步批量插入文档（使用 AsyncMilvusClient）"""
+        client = self._get_async_client()
+        if client is None:
+            return await super().abatch_upsert(documents)
+        
+        try:
+            rows = [
+                {
+                    "id": doc.id,
+                    "content": doc.content,
+                    "embedding": doc.embedding,
+                    "category": doc.metadata.get("category", "default"),
+                    "metadata_json": json.dumps(doc.metadata, ensure_ascii=False),
+                }
+                for doc in documents
+            ]
+            await client.insert(collection_name=self.collection_name, data=rows)
+            await client.load_collection(collection_name=self.collection_name)
+            
+            print(f"✓ 成功插入 {len(documents)} 条文档到 Milvus")
+            return True
+        except Exception as e:
+            print(f"✗ 批量插入失败: {e}")
+            return False
+    
+    async def asearch(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
+    ) -> List[SearchResult]:
+        """异步相似度检索（使用 AsyncMilvusClient）"""
+        client = self._get_async_client()
+        if client is None:
+            return await super().asearch(query_embedding, top_k, filters, with_content)
+        
+        try:
+            results = await self._asearch(
+                client, query_embedding, top_k, filters,
+                self.OUTPUT_FIELDS if with_content else self.ID_FIELDS
             )
             
-            # 转换结果
-            import json
             search_results = []
             for hits in results:
                 for hit in hits:
-                    metadata = json.loads(hit.entity.get("metadata_json", "{}"))
-                    doc = Document(
-                        id=hit.entity.get("id"),
-                        content=hit.entity.get("content"),
-                        metadata=metadata
-                    )
                     search_results.append(
-                        SearchResult(
-                            document=doc,
-                            score=float(hit.distance)
-                        )
+                        self._to_search_result(hit["entity"].get, hit["distance"])
                     )
             
             return search_results
@@ -169,6 +271,87 @@ class MilvusVectorStore(RAGVectorStore):
             print(f"✗ 检索失败: {e}")
             return []
     
+    async def asearch_hits(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Hit]:
+        """异步相似度检索，只取回 ID 和距离（使用 AsyncMilvusClient）"""
+        client = self._get_async_client()
+        if client is None:
+            return await super().asearch_hits(query_embedding, top_k, filters)
+        
+        try:
+            results = await self._asearch(client, query_embedding, top_k, filters, self.ID_FIELDS)
+            return [Hit(hit["id"], float(hit["distance"])) for hits in results for hit in hits]
+        except Exception as e:
+            print(f"✗ 检索失败: {e}")
+            return []
+    
+    async def _asearch(
+        self,
+        client,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        output_fields: List[str]
+    ):
+        """通过异步客户端执行一次 search 请求，返回原始结果"""
+        return await client.search(
+            collection_name=self.collection_name,
+            data=[query_embedding],
+            anns_field="embedding",
+            search_params=self.SEARCH_PARAMS,
+            limit=top_k,
+            filter=self._build_expr(filters) or "",
+            output_fields=output_fields
+        )
+    
+    async def adelete(self, doc_ids: List[str]) -> bool:
+        """异步删除文档（使用 AsyncMilvusClient）"""
+        client = self._get_async_client()
+        if client is None:
+            return await super().adelete(doc_ids)
+        
+        try:
+            await client.delete(collection_name=self.collection_name, ids=doc_ids)
+            print(f"✓ 成功删除 {len(doc_ids)} 条文档")
+            return True
+        except Exception as e:
+            print(f"✗ 删除失败: {e}")
+            return False
+    
+    @staticmethod
+    def _build_expr(filters: Optional[Dict[str, Any]]) -> Optional[str]:
+        """构建过滤表达式"""
+        if not filters:
+            return None
+        
+        conditions = []
+        for key, value in filters.items():
+            if key == "category":
+                conditions.append(f'category == "{value}"')
+        
+        return " && ".join(conditions) if conditions else None
+    
+    @staticmethod
+    def _to_search_result(get_field, distance: float) -> SearchResult:
+        """
+        将 Milvus 命中结果转换为 SearchResult
+        
+        Args:
+            get_field: 按字段名读取实体字段的函数（未取回的字段返回 None）
+            distance: 距离
+        """
+        metadata = json.loads(get_field("metadata_json") or "{}")
+        doc = Document(
+            id=get_field("id"),
+            content=get_field("content") or "",
+            metadata=metadata
+        )
+        return SearchResult(document=doc, score=float(distance))
+    
     def delete(self, doc_ids: List[str]) -> bool:
         """删除文档"""
         try:
@@ -183,6 +366,20 @@ class MilvusVectorStore(RAGVectorStore):
             print(f"✗ 删除失败: {e}")
             return False
     
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, Document]:
+        """按 ID 读取文档（query 请求，不取回向量）"""
+        if not doc_ids:
+            return {}
+        try:
+            if not self.collection:
+                self.collection = Collection(self.collection_name)
+            
+            rows = self.collection.query(expr=f'id in {list(doc_ids)}', output_fields=self.OUTPUT_FIELDS)
+            return {row["id"]: self._to_search_result(row.get, 0.0).document for row in rows}
+        except Exception as e:
+            print(f"✗ 按 ID 读取文档失败: {e}")
+            return {}
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """获取集合统计信息"""
         try:
@@ -0,0 +1,727 @@
+"""
+NumPy 向量数据库实现（进程内，无需外部服务）
+向量归一化为 float32 后追加写入内存映射文件，ID、内容和元数据以 JSON Lines 记录追加在旁；
+检索为分块矩阵乘 + argpartition 的精确 top-k，元数据过滤在检索前转换为行掩码。
+同一集合只允许一个写进程，其他进程可以只读方式共享（每次检索前读取新追加的记录）。
+
+内存中每行只保留有效标记和记录的字节偏移，另有按 ID 哈希排序的 (哈希, 行号) 索引（约 21 字节/行）；
+ID、内容和元数据在返回结果时按偏移从记录文件读取，哈希相同的 ID 读取记录核对。
+
+集合目录（settings.numpy_store_directory/<集合名>/）：
+- meta.json: {"dimension": 向量维度, "generation": 代次}，只在创建和压缩时整体替换
+- vectors.<代次>.f32: 行主序的 float32 向量矩阵，只追加
+- records.<代次>.jsonl: {"op": "put", "row", "id", "content", "metadata"} 或 {"op": "delete", "id"}，只追加
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from src.vectorstores.vector_store_base import RAGVectorStore
+from src.core.models import Document, Hit, SearchResult
+from src.core.config import settings
+
+
+# 过滤后剩余行数低于该比例时只取出这些行计算，否则按连续块计算再屏蔽
+GATHER_RATIO = 0.25
+# 读取新记录时每批应用的行数（限制加载大记录文件时的临时内存）
+APPLY_BATCH = 65536
+# 缓存行掩码的过滤条件数
+MASK_CACHE_SIZE = 16
+
+
+def id_hashes(doc_ids: List[str]) -> np.ndarray:
+    """ID 的 64 位哈希（int64），用于 ID 到行号的索引"""
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+         for doc_id in doc_ids],
+        dtype=np.int64
+    )
+
+
+def grow_rows(array: np.ndarray, size: int) -> np.ndarray:
+    """
+    行数不足 size 时扩展为新数组（复制已有行，新行为零），否则原样返回
+    
+    按 1/8 的余量扩展，限制常驻内存中的空闲容量；检索线程持有的旧数组不受影响。
+    """
+    if len(array) >= size:
+        return array
+    grown = np.zeros((max(size, len(array) + len(array) // 8),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def read_records_at(f, offsets: np.ndarray) -> List[Dict[str, Any]]:
+    """
+    按字节偏移读取记录（按偏移升序读取，减少随机访问）
+    
+    Args:
+        f: 以二进制模式打开的记录文件
+        offsets: 记录的字节偏移
+    
+    Returns:
+        与 offsets 顺序一致的记录列表
+    """
+    records: List[Optional[Dict[str, Any]]] = [None] * len(offsets)
+    for i in np.argsort(offsets, kind="stable").tolist():
+        f.seek(int(offsets[i]))
+        records[i] = json.loads(f.readline())
+    return records
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """按行 L2 归一化（全零行保持为零）"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def exact_top_k(
+    queries: np.ndarray,
+    vectors: np.ndarray,
+    top_k: int,
+    mask: Optional[np.ndarray] = None,
+    block_rows: int = 65536
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    分块内积精确 top-k
+    
+    每块做一次 (查询数 × 块行数) 的矩阵乘，块内用 argpartition 取前 k 后与已有候选合并，
+    内存占用与向量总数无关。
+    
+    Args:
+        queries: (查询数, 维度) 查询矩阵
+        vectors: (行数, 维度) 向量矩阵（可以是内存映射）
+        top_k: 每个查询返回的结果数
+        mask: 候选行掩码，None 表示全部行
+        block_rows: 每块的行数
+    
+    Returns:
+        (行号矩阵, 分数矩阵)，形状均为 (查询数, k)，按分数降序；k 为 top_k 与候选行数的较小值
+    """
+    num_rows = len(vectors)
+    candidates = None
+    count = num_rows
+    if mask is not None:
+        count = int(mask.sum())
+        if count < num_rows * GATHER_RATIO:
+            candidates = np.flatnonzero(mask)
+    
+    k = min(top_k, count)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    if k <= 0:
+        return best_rows, best_scores
+    
+    total = count if candidates is not None else num_rows
+    for start in range(0, total, block_rows):
+        if candidates is not None:
+            rows = candidates[start:start + block_rows]
+            scores = queries @ vectors[rows].T
+        else:
+            end = min(start + block_rows, num_rows)
+            block_mask = mask[start:end] if mask is not None else None
+            if block_mask is not None and not block_mask.any():
+                continue
+            rows = np.arange(start, end)
+            scores = queries @ np.asarray(vectors[start:end]).T
+            if block_mask is not None and not block_mask.all():
+                scores[:, ~block_mask] = -np.inf
+        
+        if scores.shape[1] > k:
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, part, axis=1)
+            rows = rows[part]
+        else:
+            rows = np.broadcast_to(rows, scores.shape)
+        
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        best_rows = np.concatenate([best_rows, rows], axis=1)
+        if best_scores.shape[1] > k:
+            part = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(best_scores, part, axis=1)
+            best_rows = np.take_along_axis(best_rows, part, axis=1)
+    
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+class NumpyVectorStore(RAGVectorStore):
+    """
+    NumPy 向量数据库实现
+    
+    分数为余弦相似度。更新和删除只追加记录、旧行标记为失效，
+    失效行占用的空间由 compact() 回收。
+    """
+    
+    # 日志中的后端名称
+    DISPLAY_NAME = "NumPy"
+    META_FILE = "meta.json"
+    
+    def __init__(
+        self,
+        collection_name: str = "rag_collection",
+        directory: Optional[str] = None,
+        read_only: bool = False
+    ):
+        """
+        打开集合（集合不存在时需先调用 create_collection）
+        
+        Args:
+            collection_name: 集合名称
+            directory: 存储根目录，默认使用配置（settings.numpy_store_directory）
+            read_only: 只读打开（供其他进程共享写进程维护的集合）
+        """
+        super().__init__(collection_name)
+        self.directory = os.path.join(directory or settings.numpy_store_directory, collection_name)
+        self.read_only = read_only
+        self.block_rows = settings.numpy_search_block_rows
+        self._lock = threading.RLock()
+        self._reset()
+        print(f"✓ 成功初始化 {self.DISPLAY_NAME} 向量库: {self.directory}")
+    
+    def create_collection(self, dimension: int) -> bool:
+        """创建集合"""
+        try:
+            self._check_writable()
+            with self._lock:
+                # 如果集合已存在，先删除
+                if os.path.exists(self.directory):
+                    shutil.rmtree(self.directory)
+                    print(f"已删除旧集合: {self.collection_name}")
+                self._reset()
+                
+                os.makedirs(self.directory)
+                self._write_generation(dimension, 0)
+            
+            print(f"✓ 成功创建 {self.DISPLAY_NAME} 集合: {self.collection_name}")
+            return True
+        except Exception as e:
+            print(f"✗ 创建集合失败: {e}")
+            return False
+    
+    def batch_upsert(self, documents: List[Document]) -> bool:
+        """批量插入或更新文档（先追加向量，再追加记录，读进程看到记录时向量一定已写入）"""
+        try:
+            self._check_writable()
+            with self._lock:
+                self._refresh()
+                self._require_collection()
+                matrix = normalize_rows(self._embedding_matrix(documents))
+                if matrix.shape[1] != self.dimension:
+                    raise ValueError(f"向量维度不一致: {matrix.shape[1]} vs {self.dimension}")
+                
+                # 行号以向量文件为准：上次写入中断时可能有多出的向量行没有对应记录
+                vectors_path = self._vectors_path(self.generation)
+                first_row = os.path.getsize(vectors_path) // (4 * self.dimension)
+                with open(vectors_path, "ab") as f:
+                    f.truncate(first_row * 4 * self.dimension)
+                    f.write(np.ascontiguousarray(matrix).tobytes())
+                self._append_row_data(first_row, matrix)
+                
+                records = [
+                    {"op": "put", "row": first_row + i, "id": doc.id, "content": doc.content, "metadata": doc.metadata}
+                    for i, doc in enumerate(documents)
+                ]
+                self._append_records(records)
+            
+            print(f"✓ 成功插入 {len(documents)} 条文档到 {self.DISPLAY_NAME} 向量库")
+            return True
+        except Exception as e:
+            print(f"✗ 批量插入失败: {e}")
+            return False
+    
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
+    ) -> List[SearchResult]:
+        """相似度检索"""
+        return self.search_batch([query_embedding], top_k, filters, with_content)[0]
+    
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
+    ) -> List[List[SearchResult]]:
+        """批量相似度检索（所有查询共用一次分块矩阵乘）"""
+        try:
+            rows, scores, records = self._search(query_embeddings, top_k, filters)
+            return [
+                [
+                    SearchResult(
+                        document=Document(
+                            id=records[row]["id"],
+                            content=records[row]["content"] if with_content else "",
+                            metadata=records[row]["metadata"] if with_content else {}
+                        ),
+                        score=float(score)
+                    )
+                    for row, score in zip(query_rows.tolist(), query_scores.tolist())
+                    if row in records
+                ]
+                for query_rows, query_scores in zip(rows, scores)
+            ]
+        except Exception as e:
+            print(f"✗ 检索失败: {e}")
+            return [[] for _ in query_embeddings]
+    
+    def search_hits_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Hit]]:
+        """批量相似度检索，只取回 ID 和分数"""
+        try:
+            rows, scores, records = self._search(query_embeddings, top_k, filters)
+            return [
+                [
+                    Hit(records[row]["id"], score)
+                    for row, score in zip(query_rows.tolist(), query_scores.tolist())
+                    if row in records
+                ]
+                for query_rows, query_scores in zip(rows, scores)
+            ]
+        except Exception as e:
+            print(f"✗ 检索失败: {e}")
+            return [[] for _ in query_embeddings]
+    
+    def _search(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        filters: Optional[Dict[str, Any]]
+    ) -> Tuple[List[np.ndarray], List[np.ndarray], Dict[int, Dict[str, Any]]]:
+        """执行检索，返回每个查询的行号和分数，以及结果行的记录（行号 → 记录）"""
+        with self._lock:
+            self._refresh()
+            self._require_collection()
+            vectors = self._vectors
+            mask = self._alive[:self._rows].copy()
+            if filters:
+                mask = mask & self._filter_mask(filters)
+            # 只在锁内取快照，矩阵乘在锁外进行（扩展时替换为新数组，快照内的行不会改变）；
+            # 记录文件在锁内打开，压缩删除旧代次文件后仍可读取
+            offsets = self._offsets
+            records_file = open(self._records_path(self.generation), "rb")
+        
+        try:
+            queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+            rows, scores = self._top_k(queries, vectors, top_k, mask)
+            result_rows = np.unique(np.concatenate(
+                [np.zeros(0, dtype=np.int64)] + [np.asarray(query_rows, dtype=np.int64) for query_rows in rows]
+            ))
+            result_rows = result_rows[mask[result_rows]]
+            records = dict(zip(result_rows.tolist(), read_records_at(records_file, offsets[result_rows])))
+        finally:
+            records_file.close()
+        return rows, scores, records
+    
+    def _top_k(
+        self,
+        queries: np.ndarray,
+        vectors: np.ndarray,
+        top_k: int,
+        mask: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """在候选行中检索 top-k（精确暴力检索，子类可替换为近似索引）"""
+        return exact_top_k(queries, vectors, top_k, mask, self.block_rows)
+    
+    def _filter_mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        元数据等值过滤条件对应的行掩码（调用方持有锁）
+        
+        按条件缓存最近使用的 MASK_CACHE_SIZE 个掩码；每行的元数据写入后不再改变，
+        有新记录时只扫描记录文件中新追加的部分。
+        """
+        key = tuple(sorted((name, repr(value)) for name, value in filters.items()))
+        mask, scanned = self._mask_cache.pop(key, (np.zeros(0, dtype=bool), 0))
+        if scanned < self._records_offset:
+            mask = grow_rows(mask, self._rows)
+            with open(self._records_path(self.generation), "rb") as f:
+                f.seek(scanned)
+                for line in f:
+                    if scanned >= self._records_offset:
+                        break
+                    scanned += len(line)
+                    record = json.loads(line)
+                    if record["op"] == "put":
+                        metadata = record["metadata"]
+                        mask[record["row"]] = all(metadata.get(name) == value for name, value in filters.items())
+        
+        self._mask_cache[key] = (mask, scanned)
+        if len(self._mask_cache) > MASK_CACHE_SIZE:
+            del self._mask_cache[next(iter(self._mask_cache))]
+        return mask[:self._rows]
+    
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, Document]:
+        """按 ID 读取文档（不取回向量）"""
+        try:
+            with self._lock:
+                self._refresh()
+                self._require_collection()
+                found = self._find(doc_ids)
+            return {
+                doc_id: Document(id=doc_id, content=record["content"], metadata=record["metadata"])
+                for doc_id, (_, record) in found.items()
+            }
+        except Exception as e:
+            print(f"✗ 按 ID 读取文档失败: {e}")
+            return {}
+    
+    def delete(self, doc_ids: List[str]) -> bool:
+        """删除文档"""
+        try:
+            self._check_writable()
+            with self._lock:
+                self._refresh()
+                self._require_collection()
+                self._append_records([{"op": "delete", "id": doc_id} for doc_id in self._find(doc_ids)])
+            print(f"✓ 成功删除 {len(doc_ids)} 条文档")
+            return True
+        except Exception as e:
+            print(f"✗ 删除失败: {e}")
+            return False
+    
+    def compact(self) -> bool:
+        """
+        回收失效行：只保留有效行写入下一代文件，再替换 meta.json 切换代次
+        
+        只读进程下次检索时检测到 meta.json 变化后重新加载；已映射旧文件的检索不受影响。
+        
+        Returns:
+            是否成功
+        """
+        try:
+            self._check_writable()
+            with self._lock:
+                self._refresh()
+                self._require_collection()
+                num_live = self._rewrite_generation()
+            
+            print(f"✓ 已压缩 {self.DISPLAY_NAME} 集合: {self.collection_name}（有效行 {num_live}）")
+            return True
+        except Exception as e:
+            print(f"✗ 压缩集合失败: {e}")
+            return False
+    
+    def _rewrite_generation(self) -> int:
+        """
+        将有效行写入下一代文件并切换代次（调用方持有锁）
+        
+        Returns:
+            有效行数
+        """
+        live_rows = np.flatnonzero(self._alive[:self._rows])
+        generation = self.generation + 1
+        
+        with open(self._vectors_path(generation), "wb") as f:
+            for start in range(0, len(live_rows), self.block_rows):
+                f.write(np.ascontiguousarray(self._vectors[live_rows[start:start + self.block_rows]]).tobytes())
+        
+        with open(self._records_path(self.generation), "rb") as old_file, \
+                open(self._records_path(generation), "w", encoding="utf-8") as f:
+            for start in range(0, len(live_rows), self.block_rows):
+                records = read_records_at(old_file, self._offsets[live_rows[start:start + self.block_rows]])
+                for new_row, record in enumerate(records, start):
+                    record["row"] = new_row
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._write_generation_data(generation, live_rows)
+        
+        old_generation = self.generation
+        self._write_meta(self.dimension, generation)
+        self._reset()
+        for path in self._generation_files(old_generation):
+            if os.path.exists(path):
+                os.remove(path)
+        self._refresh()
+        return len(live_rows)
+    
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """获取集合统计信息"""
+        try:
+            with self._lock:
+                self._refresh()
+                self._require_collection()
+                return {
+                    "name": self.collection_name,
+                    "num_entities": len(self._index_hashes),
+                    "dimension": self.dimension,
+                    "rows": self._rows,
+                    "disk_bytes": self._rows * self.dimension * 4,
+                    "resident_bytes": self._resident_bytes()
+                }
+        except Exception as e:
+            print(f"✗ 获取统计信息失败: {e}")
+            return {}
+    
+    def drop_collection(self) -> bool:
+        """删除集合"""
+        try:
+            self._check_writable()
+            with self._lock:
+                self._reset()
+                shutil.rmtree(self.directory)
+            print(f"✓ 成功删除集合: {self.collection_name}")
+            return True
+        except Exception as e:
+            print(f"✗ 删除集合失败: {e}")
+            return False
+    
+    def close(self):
+        """释放内存映射"""
+        with self._lock:
+            self._reset()
+    
+    def _resident_bytes(self) -> int:
+        """常驻内存的数组字节数（不含内存映射的向量文件和固定的对象开销，子类加上自己的数组）"""
+        return (
+            self._alive.nbytes + self._offsets.nbytes + self._index_hashes.nbytes + self._index_rows.nbytes
+            + sum(mask.nbytes for mask, _ in self._mask_cache.values())
+        )
+    
+    def _path(self, name: str) -> str:
+        """集合目录下的文件路径"""
+        return os.path.join(self.directory, name)
+    
+    def _vectors_path(self, generation: int) -> str:
+        """指定代次的向量文件路径"""
+        return self._path(f"vectors.{generation}.f32")
+    
+    def _records_path(self, generation: int) -> str:
+        """指定代次的记录文件路径"""
+        return self._path(f"records.{generation}.jsonl")
+    
+    def _generation_files(self, generation: int) -> List[str]:
+        """指定代次的全部数据文件（压缩后删除旧代次时使用）"""
+        return [self._vectors_path(generation), self._records_path(generation)]
+    
+    def _append_row_data(self, first_row: int, matrix: np.ndarray):
+        """
+        向量写入之后、记录写入之前调用，子类在此追加每行的附加数据（调用方持有锁）
+        
+        Args:
+            first_row: 第一行的行号
+            matrix: 归一化后的向量矩阵
+        """
+        pass
+    
+    def _write_generation_data(self, generation: int, live_rows: np.ndarray):
+        """
+        压缩时调用，子类在此写入下一代的附加数据（调用方持有锁）
+        
+        Args:
+            generation: 下一代代次
+            live_rows: 按新行号排列的旧行号
+        """
+        pass
+    
+    def _load_row_data(self):
+        """读取新记录并重新映射向量之后调用，子类在此加载新行的附加数据（调用方持有锁）"""
+        pass
+    
+    def _write_generation(self, dimension: int, generation: int):
+        """创建一代空文件并切换到该代次"""
+        open(self._vectors_path(generation), "wb").close()
+        open(self._records_path(generation), "wb").close()
+        self._write_meta(dimension, generation)
+    
+    def _write_meta(self, dimension: int, generation: int):
+        """原子替换 meta.json"""
+        tmp_path = self._path(self.META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dimension": dimension, "generation": generation}, f)
+        os.replace(tmp_path, self._path(self.META_FILE))
+    
+    def _require_collection(self):
+        """集合不存在时报错"""
+        if self.dimension is None:
+            raise RuntimeError(f"集合不存在: {self.collection_name}")
+    
+    def _check_writable(self):
+        """只读打开时拒绝写操作"""
+        if self.read_only:
+            raise PermissionError(f"{self.DISPLAY_NAME} 集合以只读方式打开: {self.collection_name}")
+    
+    def _reset(self):
+        """清空内存状态（下次访问时从文件重新加载）"""
+        self.dimension: Optional[int] = None
+        self.generation = 0
+        self._meta_version: Optional[Tuple[int, int]] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._rows = 0
+        self._alive = np.zeros(0, dtype=bool)
+        # 每行 put 记录在记录文件中的字节偏移
+        self._offsets = np.zeros(0, dtype=np.int64)
+        # 有效 ID 的哈希（升序）和对应行号
+        self._index_hashes = np.zeros(0, dtype=np.int64)
+        self._index_rows = np.zeros(0, dtype=np.int32)
+        # 过滤条件 → (行掩码, 已扫描到的记录文件偏移)，按最近使用排序
+        self._mask_cache: Dict[tuple, Tuple[np.ndarray, int]] = {}
+        self._records_offset = 0
+    
+    def _append_records(self, records: List[Dict[str, Any]]):
+        """追加记录（一次写入）并应用到内存状态"""
+        if not records:
+            return
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with open(self._records_path(self.generation), "a", encoding="utf-8") as f:
+            f.write(data)
+        self._refresh()
+    
+    def _refresh(self):
+        """检查 meta.json 是否被替换，读取新追加的记录，并按需重新映射向量文件（调用方持有锁）"""
+        meta_path = self._path(self.META_FILE)
+        for _ in range(2):
+            try:
+                stat = os.stat(meta_path)
+            except FileNotFoundError:
+                if self.dimension is not None:
+                    self._reset()
+                return
+            
+            # meta.json 只在创建集合和压缩时替换，此时全部重新加载
+            version = (stat.st_ino, stat.st_mtime_ns)
+            if version != self._meta_version:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                self._reset()
+                self.dimension = meta["dimension"]
+                self.generation = meta["generation"]
+                self._meta_version = version
+            
+            try:
+                self._read_records()
+                return
+            except FileNotFoundError:
+                # 读取 meta.json 之后写进程完成了压缩并删除了旧代次的文件，重新读取 meta.json
+                self._meta_version = None
+        raise RuntimeError(f"集合正在被替换，请重试: {self.collection_name}")
+    
+    def _read_records(self):
+        """读取当前代次记录文件中新追加的完整行，按批应用到内存状态"""
+        records_path = self._records_path(self.generation)
+        if os.path.getsize(records_path) == self._records_offset:
+            return
+        
+        with open(records_path, "rb") as f:
+            f.seek(self._records_offset)
+            offset = self._records_offset
+            records, offsets = [], []
+            for line in f:
+                # 只处理完整的行，写进程正在写入的半行留到下次
+                if not line.endswith(b"\n"):
+                    break
+                records.append(json.loads(line))
+                offsets.append(offset)
+                offset += len(line)
+                if len(records) >= APPLY_BATCH:
+                    self._apply(records, offsets)
+                    self._records_offset = offset
+                    records, offsets = [], []
+            if records:
+                self._apply(records, offsets)
+                self._records_offset = offset
+        
+        if self._vectors is None or len(self._vectors) < self._rows:
+            self._vectors = np.memmap(
+                self._vectors_path(self.generation), dtype=np.float32, mode="r", shape=(self._rows, self.dimension)
+            ) if self._rows else np.zeros((0, self.dimension), dtype=np.float32)
+        self._load_row_data()
+    
+    def _apply(self, records: List[Dict[str, Any]], offsets: List[int]):
+        """
+        将一批记录应用到内存状态（批内按顺序生效）
+        
+        Args:
+            records: 记录列表
+            offsets: 每条记录在记录文件中的字节偏移
+        """
+        # 本批内每个 ID 最后写入的行号（删除为 None）
+        latest: Dict[str, Optional[int]] = {}
+        for record, offset in zip(records, offsets):
+            doc_id = record["id"]
+            old_row = latest.get(doc_id)
+            if old_row is not None:
+                self._alive[old_row] = False
+            if record["op"] != "put":
+                latest[doc_id] = None
+                continue
+            
+            row = record["row"]
+            # 行号连续递增；中断的写入可能留下没有记录的行，保持为失效行
+            if row >= self._rows:
+                self._rows = row + 1
+                self._alive = grow_rows(self._alive, self._rows)
+                self._offsets = grow_rows(self._offsets, self._rows)
+            self._alive[row] = True
+            self._offsets[row] = offset
+            latest[doc_id] = row
+        
+        # 本批之前写入的同 ID 行失效，并从索引中移除
+        doc_ids = list(latest)
+        hashes = id_hashes(doc_ids)
+        found = self._find(doc_ids, hashes)
+        index_hashes, index_rows = self._index_hashes, self._index_rows
+        if found:
+            positions = np.array([position for position, _ in found.values()], dtype=np.int64)
+            self._alive[index_rows[positions]] = False
+            index_hashes = np.delete(index_hashes, positions)
+            index_rows = np.delete(index_rows, positions)
+        
+        new = [i for i, doc_id in enumerate(doc_ids) if latest[doc_id] is not None]
+        if new:
+            new_hashes = hashes[new]
+            new_rows = np.array([latest[doc_ids[i]] for i in new], dtype=np.int32)
+            order = np.argsort(new_hashes, kind="stable")
+            positions = np.searchsorted(index_hashes, new_hashes[order])
+            index_hashes = np.insert(index_hashes, positions, new_hashes[order])
+            index_rows = np.insert(index_rows, positions, new_rows[order])
+        self._index_hashes, self._index_rows = index_hashes, index_rows
+    
+    def _find(
+        self,
+        doc_ids: List[str],
+        hashes: Optional[np.ndarray] = None
+    ) -> Dict[str, Tuple[int, Dict[str, Any]]]:
+        """
+        查找有效 ID：按哈希在索引中取候选行，再读取记录核对 ID（调用方持有锁）
+        
+        Args:
+            doc_ids: ID 列表
+            hashes: 对应的 ID 哈希，None 时计算
+        
+        Returns:
+            存在的 ID 到 (索引位置, 记录) 的映射
+        """
+        doc_ids = list(doc_ids)
+        if not doc_ids or not len(self._index_hashes):
+            return {}
+        if hashes is None:
+            hashes = id_hashes(doc_ids)
+        starts = np.searchsorted(self._index_hashes, hashes, side="left").tolist()
+        ends = np.searchsorted(self._index_hashes, hashes, side="right").tolist()
+        candidates = [
+            (doc_id, position)
+            for doc_id, start, end in zip(doc_ids, starts, ends)
+            for position in range(start, end)
+        ]
+        if not candidates:
+            return {}
+        
+        rows = self._index_rows[[position for _, position in candidates]]
+        with open(self._records_path(self.generation), "rb") as f:
+            records = read_records_at(f, self._offsets[rows])
+        return {
+            doc_id: (position, record)
+            for (doc_id, position), record in zip(candidates, records)
+            if record["id"] == doc_id
+        }
@@ -1,25 +1,43 @@
 """
 Qdrant 向量数据库实现
 """
+import uuid
 from typing import List, Dict, Any, Optional
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, SearchRequest
 from src.vectorstores.vector_store_base import RAGVectorStore
-from src.core.models import Document, SearchResult
+from src.core.models import Document, Hit, SearchResult
 from src.core.config import settings
+from src.utils.resource_registry import registry
 
 
 class QdrantVectorStore(RAGVectorStore):
     """Qdrant 向量数据库实现"""
     
+    # 只取回 ID 时的 payload 字段（内容由文档库补全）
+    ID_PAYLOAD = ["id"]
+    
     def __init__(self, collection_name: str = "rag_collection"):
         super().__init__(collection_name)
-        self.client = QdrantClient(
-            host=settings.qdrant_host,
-            port=settings.qdrant_port
+        # 同一服务地址的多个集合共享一个客户端连接
+        self._client_key = ("qdrant", settings.qdrant_host, settings.qdrant_port)
+        self.client = registry.acquire(
+            self._client_key,
+            lambda: QdrantClient(host=settings.qdrant_host, port=settings.qdrant_port)
         )
+        self._async_client: Optional[AsyncQdrantClient] = None
         print(f"✓ 成功连接到 Qdrant: {settings.qdrant_host}:{settings.qdrant_port}")
     
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        """异步客户端（首次使用时创建）"""
+        if self._async_client is None:
+            self._async_client = AsyncQdrantClient(
+                host=settings.qdrant_host,
+                port=settings.qdrant_port
+            )
+        return self._async_client
+    
     def create_collection(self, dimension: int) -> bool:
         """创建 Qdrant 集合"""
         try:
@@ -47,23 +65,13 @@ class QdrantVectorStore(RAGVectorStore):
     def batch_upsert(self, documents: List[Document]) -> bool:
         """批量插入文档"""
         try:
-            points = []
-            for doc in documents:
-                point = PointStruct(
-                    id=hash(doc.id) % (10 ** 10),  # 转换为整数 ID
-                    vector=doc.embedding,
-                    payload={
-                        "id": doc.id,
-                        "content": doc.content,
-                        "metadata": doc.metadata
-                    }
-                )
-                points.append(point)
-            
-            # 批量插入
-            self.client.upsert(
+            # 批量插入：向量矩阵直接交给客户端，不逐点构造 PointStruct
+            self.client.upload_collection(
                 collection_name=self.collection_name,
-                points=points
+                vectors=self._embedding_matrix(documents),
+                payload=[self._payload(doc) for doc in documents],
+                ids=[self._point_id(doc.id) for doc in documents],
+                wait=True
             )
             
             print(f"✓ 成功插入 {len(documents)} 条文档到 Qdrant")
@@ -76,61 +84,91 @@ class QdrantVectorStore(RAGVectorStore):
         self,
         query_embedding: List[float],
         top_k: int = 10,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
     ) -> List[SearchResult]:
         """相似度检索"""
         try:
-            # 构建过滤条件
-            query_filter = None
-            if filters:
-                must_conditions = []
-                for key, value in filters.items():
-                    must_conditions.append(
-                        FieldCondition(
-                            key=f"metadata.{key}",
-                            match=MatchValue(value=value)
-                        )
-                    )
-                if must_conditions:
-                    query_filter = Filter(must=must_conditions)
-            
-            # 执行搜索
             results = self.client.search(
                 collection_name=self.collection_name,
                 query_vector=query_embedding,
                 limit=top_k,
-                query_filter=query_filter
+                query_filter=self._build_filter(filters),
+                with_payload=True if with_content else self.ID_PAYLOAD
             )
-            
-            # 转换结果
-            search_results = []
-            for result in results:
-                doc = Document(
-                    id=result.payload["id"],
-                    content=result.payload["content"],
-                    metadata=result.payload.get("metadata", {})
-                )
-                search_results.append(
-                    SearchResult(
-                        document=doc,
-                        score=float(result.score)
-                    )
-                )
-            
-            return search_results
+            return [self._to_search_result(result) for result in results]
         except Exception as e:
             print(f"✗ 检索失败: {e}")
             return []
     
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
+    ) -> List[List[SearchResult]]:
+        """批量相似度检索（一次 search_batch 请求）"""
+        try:
+            batch_results = self._search_batch(
+                query_embeddings, top_k, filters,
+                True if with_content else self.ID_PAYLOAD
+            )
+            return [
+                [self._to_search_result(result) for result in results]
+                for results in batch_results
+            ]
+        except Exception as e:
+            print(f"✗ 检索失败: {e}")
+            return [[] for _ in query_embeddings]
+    
+    def search_hits_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Hit]]:
+        """批量相似度检索，只取回 ID 和分数"""
+        try:
+            batch_results = self._search_batch(query_embeddings, top_k, filters, self.ID_PAYLOAD)
+            return [
+                [Hit(point.payload["id"], float(point.score)) for point in results]
+                for results in batch_results
+            ]
+        except Exception as e:
+            print(f"✗ 检索失败: {e}")
+            return [[] for _ in query_embeddings]
+    
+    def _search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        with_payload
+    ):
+        """执行一次 search_batch 请求，返回原始结果"""
+        query_filter = self._build_filter(filters)
+        requests = [
+            SearchRequest(
+                vector=query_embedding,
+                limit=top_k,
+                filter=query_filter,
+                with_payload=with_payload
+            )
+            for query_embedding in query_embeddings
+        ]
+        
+        return self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=requests
+        )
+    
     def delete(self, doc_ids: List[str]) -> bool:
         """删除文档"""
         try:
-            # 将字符串 ID 转换为整数 ID
-            point_ids = [hash(doc_id) % (10 ** 10) for doc_id in doc_ids]
-            
             self.client.delete(
                 collection_name=self.collection_name,
-                points_selector=point_ids
+                points_selector=[self._point_id(doc_id) for doc_id in doc_ids]
             )
             
             print(f"✓ 成功删除 {len(doc_ids)} 条文档")
@@ -139,6 +177,218 @@ class QdrantVectorStore(RAGVectorStore):
             print(f"✗ 删除失败: {e}")
             return False
     
+    async def abatch_upsert(self, documents: List[Document]) -> bool:
+        """异步批量插入文档（使用 AsyncQdrantClient）"""
+        try:
+            await self.async_client.upsert(
+                collection_name=self.collection_name,
+                points=self._to_points(documents)
+            )
+            
+            print(f"✓ 成功插入 {len(documents)} 条文档到 Qdrant")
+            return True
+        except Exception as e:
+            print(f"✗ 批量插入失败: {e}")
+            return False
+    
+    async def asearch(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        with_content: bool = True
+    ) -> List[SearchResult]:
+        """异步相似度检索（使用 AsyncQdrantClient）"""
+        try:
+            results = await self.async_client.search(
+                collection_name=self.collection_name,
+                query_vector=query_embedding,
+                limit=top_k,
+                query_filter=self._build_filter(filters),
+                with_payload=True if with_content else self.ID_PAYLOAD
+            )
+            return [self._to_search_result(result) for result in results]
+        except Exception as e:
+            print(f"✗ 检索失败: {e}")
+            return []
+    
+    async def asearch_hits(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Hit]:
+        """异步相似度检索，只取回 ID 和分数（使用 AsyncQdrantClient）"""
+        try:
+            results = await self.async_client.search(
+                collection_name=self.collection_name,
+                query_vector=query_embedding,
+                limit=top_k,
+                query_filter=self._build_filter(filters),
+                with_payload=self.ID_PAYLOAD
+            )
+            return [Hit(point.payload["id"], float(point.score)) for point in results]
+        except Exception as e:
+            print(f"✗ 检索失败: {e}")
+            return []
+    
+    async def adelete(self, doc_ids: List[str]) -> bool:
+        """异步删除文档（使用 AsyncQdrantClient）"""
+        try:
+            await self.async_client.delete(
+                collection_name=self.collection_name,
+                points_selector=[self._point_id(doc_id) for doc_id in doc_ids]
+            )
+            
+            print(f"✓ 成功删除 {len(doc_ids)} 条文档")
+            return True
+        except Exception as e:
+            print(f"✗ 删除失败: {e}")
+            return False
+    
+    def migrate_point_ids(self, batch_size: int = 256) -> int:
+        """
+        将旧版本写入的点（按 hash(doc_id) 生成的整数 ID）改为 uuid5 ID
+        
+        旧 ID 按进程加盐，升级后无法再按文档 ID 更新或删除这些点，重新写入还会产生重复点。
+        先扫描出全部整数 ID 的点（迁移过程中集合会变化，不能边扫描边改），再逐批按 payload 中的
+        文档 ID 以新 ID 重新写入并删除旧点；新 ID 已存在时说明文档已重新写入过，旧点是过期副本，直接删除。
+        只需在升级后执行一次，中途失败可重新执行。
+        
+        Args:
+            batch_size: 每批处理的点数
+        
+        Returns:
+            迁移（或清理）的旧点数量
+        """
+        old_ids = []
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            old_ids.extend(point.id for point in points if isinstance(point.id, int))
+            if offset is None:
+                break
+        
+        migrated = 0
+        try:
+            for start in range(0, len(old_ids), batch_size):
+                old_points = self.client.retrieve(
+                    collection_name=self.collection_name,
+                    ids=old_ids[start:start + batch_size],
+                    with_payload=True,
+                    with_vectors=True
+                )
+                new_ids = {point.id: self._point_id(point.payload["id"]) for point in old_points}
+                existing = {
+                    str(point.id) for point in self.client.retrieve(
+                        collection_name=self.collection_name,
+                        ids=list(new_ids.values()),
+                        with_payload=False
+                    )
+                }
+                rekeyed = [
+                    PointStruct(id=new_ids[point.id], vector=point.vector, payload=point.payload)
+                    for point in old_points if new_ids[point.id] not in existing
+                ]
+                if rekeyed:
+                    self.client.upsert(collection_name=self.collection_name, points=rekeyed, wait=True)
+                self.client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=[point.id for point in old_points],
+                    wait=True
+                )
+                migrated += len(old_points)
+        except Exception as e:
+            print(f"✗ 点 ID 迁移失败（已迁移 {migrated} 个，可重新执行）: {e}")
+            raise
+        
+        print(f"✓ Qdrant 集合 {self.collection_name} 已迁移 {migrated} 个旧 ID 的点")
+        return migrated
+    
+    @staticmethod
+    def _point_id(doc_id: str) -> str:
+        """
+        将字符串 ID 转换为 Qdrant 点 ID
+        
+        使用 uuid5 保证跨进程稳定（内置 hash() 对字符串按进程加盐，重启后同一文档会得到不同 ID）
+        """
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, doc_id))
+    
+    @classmethod
+    def _to_points(cls, documents: List[Document]) -> List[PointStruct]:
+        """将文档转换为 Qdrant 点（PointStruct 只接受列表形式的向量）"""
+        return [
+            PointStruct(
+                id=cls._point_id(doc.id),
+                vector=doc.embedding.tolist(),
+                payload=cls._payload(doc)
+            )
+            for doc in documents
+        ]
+    
+    @staticmethod
+    def _payload(doc: Document) -> Dict[str, Any]:
+        """文档的 Qdrant payload"""
+        return {
+            "id": doc.id,
+            "content": doc.content,
+            "metadata": doc.metadata
+        }
+    
+    @staticmethod
+    def _build_filter(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+        """构建过滤条件"""
+        if not filters:
+            return None
+        
+        must_conditions = [
+            FieldCondition(
+                key=f"metadata.{key}",
+                match=MatchValue(value=value)
+            )
+            for key, value in filters.items()
+        ]
+        return Filter(must=must_conditions)
+    
+    @staticmethod
+    def _to_search_result(point) -> SearchResult:
+        """将 Qdrant 检索命中转换为 SearchResult（payload 只含 id 时内容为空）"""
+        doc = Document(
+            id=point.payload["id"],
+            content=point.payload.get("content", ""),
+            metadata=point.payload.get("metadata", {})
+        )
+        return SearchResult(document=doc, score=float(point.score))
+    
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, Document]:
+        """按 ID 读取文档（retrieve 请求，不取回向量）"""
+        if not doc_ids:
+            return {}
+        try:
+            points = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=[self._point_id(doc_id) for doc_id in doc_ids],
+                with_payload=True,
+                with_vectors=False
+            )
+            return {
+                point.payload["id"]: Document(
+                    id=point.payload["id"],
+                    content=point.payload.get("content", ""),
+                    metadata=point.payload.get("metadata", {})
+                )
+                for point in points
+            }
+        except Exception as e:
+            print(f"✗ 按 ID 读取文档失败: {e}")
+            return {}
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """获取集合统计信息"""
         try:
@@ -162,3 +412,19 @@ class QdrantVectorStore(RAGVectorStore):
         except Exception as e:
             print(f"✗ 删除集合失败: {e}")
             return False
+    
+    async def aclose(self):
+        """关闭异步客户端（须在使用它的事件循环中调用），并释放共享客户端的引用"""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+        self.close()
+    
+    def close(self):
+        """关闭异步客户端，释放共享客户端的引用"""
+        if self._async_client is not None:
+            self._close_async_client(self._async_client)
+            self._async_client = None
+        if self.client is not None:
+            registry.release(self._client_key)
+            self.client = None
@@ -9,12 +9,17 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+import subprocess
+import textwrap
 import time
 from typing import List, Dict
-from src.vectorstores import MilvusVectorStore, QdrantVectorStore, ChromaVectorStore
+import numpy as np
+from src.vectorstores import MilvusVectorStore, QdrantVectorStore, ChromaVectorStore, NumpyVectorStore, IVFPQVectorStore
 from src.rag_engine import AdvancedRAGEngine
 from src.core.models import Document, QueryRequest
 from src.core.config import settings
+from src.llm.embedding_backends import BACKENDS, cosine_parity, load_model, onnx_export_dir
+from src.llm.embedding_manager import encode_texts
 import json
 
 
@@ -137,7 +142,7 @@ class RAGBenchmark:
             results["avg_search_time"] = avg_search_time
             
             print(f"\n✓ 平均检索时间: {avg_search_time:.3f} 秒")
-            
+        
         except Exception as e:
             error_msg = f"评测失败: {str(e)}"
             print(f"✗ {error_msg}")
@@ -187,6 +192,189 @@ class RAGBenchmark:
         # 清理
         vector_store.drop_collection()
     
+    def benchmark_embedding_backends(self, num_texts: int = 200, min_cosine: float = 0.99):
+        """
+        评测 embedding 推理后端：单条查询编码延迟、批量编码吞吐、模型文件大小，
+        以及与 torch 输出的余弦一致性
+        
+        Args:
+            num_texts: 批量编码的文档数
+            min_cosine: 一致性检查的最小余弦相似度
+        """
+        print(f"\n{'='*60}")
+        print(f"评测 Embedding 推理后端: {settings.embedding_model}")
+        print(f"{'='*60}")
+        
+        texts = [doc.content for doc in self.test_documents[:num_texts]]
+        queries = self.test_queries * 4
+        reference = None
+        rows = []
+        
+        for backend in BACKENDS:
+            try:
+                model = load_model(settings.embedding_model, backend, device="cpu")
+            except Exception as e:
+                print(f"✗ {backend} 加载失败: {e}")
+                continue
+            
+            # 预热
+            model.encode(queries[:1])
+            
+            start_time = time.perf_counter()
+            for query in queries:
+                model.encode([query])
+            query_ms = (time.perf_counter() - start_time) / len(queries) * 1000
+            
+            start_time = time.perf_counter()
+            embeddings = encode_texts(model, texts, 32, settings.embedding_token_budget)
+            throughput = len(texts) / (time.perf_counter() - start_time)
+            
+            # torch 排在第一个，作为一致性检查的参考
+            if reference is None:
+                reference = embeddings
+            parity = cosine_parity(reference, embeddings)
+            if parity["min"] < min_cosine:
+                print(f"✗ {backend} 与 torch 输出不一致: 最小余弦 {parity['min']:.4f}（第 {parity['argmin']} 条）")
+            
+            rows.append((backend, query_ms, throughput, parity, self._model_size_mb(backend)))
+        
+        print(f"\n{'后端':<12} {'查询延迟(毫秒)':<16} {'批量吞吐(条/秒)':<18} {'平均余弦':<10} {'最小余弦':<10} {'模型(MB)':<10}")
+        print("-" * 80)
+        for backend, query_ms, throughput, parity, size_mb in rows:
+            size = f"{size_mb:.1f}" if size_mb is not None else "-"
+            print(f"{backend:<12} {query_ms:<16.2f} {throughput:<18.1f} "
+                  f"{parity['mean']:<10.4f} {parity['min']:<10.4f} {size:<10}")
+    
+    @staticmethod
+    def _model_size_mb(backend: str):
+        """ONNX 后端导出的模型文件大小（MB），torch 后端返回 None"""
+        if backend == "torch":
+            return None
+        file_name = "model.onnx" if backend == "onnx" else f"model_qint8_{settings.embedding_onnx_quantization}.onnx"
+        path = os.path.join(onnx_export_dir(settings.embedding_model), "onnx", file_name)
+        return os.path.getsize(path) / 1024 / 1024 if os.path.exists(path) else None
+    
+    def benchmark_ivfpq(self, num_vectors: int = 50000, num_queries: int = 100, top_k: int = 10):
+        """
+        评测 IVF-PQ：每条向量的常驻内存、recall@k（精排 / 不精排）和查询延迟，与精确暴力检索对比
+        
+        使用低秩加噪声的合成向量（谱衰减接近真实 embedding，无需加载模型），维度取 settings.embedding_dimension
+        
+        Args:
+            num_vectors: 向量数
+            num_queries: 查询数
+            top_k: 召回率比较的结果数
+        """
+        print(f"\n{'='*60}")
+        print(f"评测 IVF-PQ: {num_vectors} 条 {settings.embedding_dimension} 维向量")
+        print(f"{'='*60}")
+        
+        rng = np.random.default_rng(0)
+        dimension = settings.embedding_dimension
+        basis = rng.standard_normal((64, dimension)).astype(np.float32)
+        latent = rng.standard_normal((num_vectors, 64)).astype(np.float32) * (0.9 ** np.arange(64)).astype(np.float32)
+        vectors = latent @ basis + 0.1 * rng.standard_normal((num_vectors, dimension)).astype(np.float32)
+        queries = vectors[rng.integers(0, num_vectors, num_queries)] + 0.3 * rng.standard_normal((num_queries, dimension)).astype(np.float32)
+        documents = [
+            Document(id=f"vec_{i}", content="", embedding=vectors[i])
+            for i in range(num_vectors)
+        ]
+        
+        store = IVFPQVectorStore("benchmark_ivfpq")
+        try:
+            store.create_collection(dimension)
+            for start in range(0, num_vectors, 10000):
+                store.batch_upsert(documents[start:start + 10000])
+            if store.centroids is None and not store.train():
+                return
+            
+            stats = store.get_collection_stats()
+            print(f"  每条向量常驻内存: {stats['bytes_per_vector']} 字节（全精度 {dimension * 4} 字节）")
+            
+            # 同一集合目录以 NumpyVectorStore 只读打开即为精确暴力检索
+            exact_store = NumpyVectorStore("benchmark_ivfpq", read_only=True)
+            rerank_factor = store.rerank_factor
+            print(f"\n{'模式':<20} {'recall@' + str(top_k):<12} {'查询延迟(毫秒)':<16}")
+            print("-" * 50)
+            for name, factor in (("精确暴力检索", None), ("IVF-PQ + 精排", rerank_factor or 10), ("IVF-PQ 不精排", 0)):
+                if factor is None:
+                    recall, search_store = 1.0, exact_store
+                else:
+                    store.rerank_factor = factor
+                    recall, search_store = store.evaluate_recall(queries.tolist(), top_k), store
+                start_time = time.perf_counter()
+                for query in queries:
+                    search_store.search_hits(query.tolist(), top_k)
+                query_ms = (time.perf_counter() - start_time) / num_queries * 1000
+                print(f"{name:<20} {recall:<12.3f} {query_ms:<16.2f}")
+            store.rerank_factor = rerank_factor
+            exact_store.close()
+        finally:
+            store.drop_collection()
+    
+    # 冷启动时不应被导入的重量级依赖（只在首次使用对应组件时导入）
+    HEAVY_MODULES = ("torch", "sentence_transformers", "openai", "pymilvus", "qdrant_client", "chromadb")
+    
+    def benchmark_startup(self, runs: int = 3, max_import_seconds: float = 1.0) -> Dict:
+        """
+        评测冷启动：在全新的解释器中导入 src.rag_engine 和 src.vectorstores 并构造引擎，
+        检查这一过程没有导入重量级依赖（见 HEAVY_MODULES）
+        
+        Args:
+            runs: 重复次数（取最小值）
+            max_import_seconds: 导入耗时上限，超过时给出警告
+        
+        Returns:
+            导入耗时、构造耗时（毫秒）和被提前导入的重量级依赖
+        """
+        print(f"\n{'='*60}")
+        print("评测冷启动")
+        print(f"{'='*60}")
+        
+        # 引擎构造不连接向量数据库（vector_store=None），文档库放在临时目录
+        script = textwrap.dedent(f"""
+            import json, sys, tempfile, time
+            start = time.perf_counter()
+            import src.rag_engine
+            import src.vectorstores
+            imported = time.perf_counter()
+            with tempfile.TemporaryDirectory() as tmp:
+                engine = src.rag_engine.AdvancedRAGEngine(None, document_store_path=tmp + "/docs.db")
+                constructed = time.perf_counter()
+                engine.close()
+            print(json.dumps({{
+                "import_ms": (imported - start) * 1000,
+                "construct_ms": (constructed - imported) * 1000,
+                "heavy": [name for name in {self.HEAVY_MODULES!r} if name in sys.modules],
+            }}))
+        """)
+        
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", script],
+                cwd=project_root,
+                capture_output=True,
+                text=True,
+                check=True
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+        
+        result = {
+            "import_ms": min(sample["import_ms"] for sample in samples),
+            "construct_ms": min(sample["construct_ms"] for sample in samples),
+            "heavy": sorted({name for sample in samples for name in sample["heavy"]}),
+        }
+        print(f"  导入耗时: {result['import_ms']:.1f} 毫秒")
+        print(f"  引擎构造耗时: {result['construct_ms']:.1f} 毫秒")
+        if result["heavy"]:
+            print(f"✗ 冷启动时导入了重量级依赖: {', '.join(result['heavy'])}")
+        else:
+            print("✓ 冷启动未导入重量级依赖")
+        if result["import_ms"] > max_import_seconds * 1000:
+            print(f"✗ 导入耗时超过 {max_import_seconds} 秒")
+        return result
+    
     def run_full_benchmark(self):
         """运行完整评测"""
         print("\n" + "="*60)
@@ -195,6 +383,12 @@ class RAGBenchmark:
         
         all_results = []
         
+        # 评测冷启动（在子进程中进行，不受本进程已导入模块的影响）
+        try:
+            self.benchmark_startup()
+        except Exception as e:
+            print(f"✗ 冷启动评测失败: {e}")
+        
         # 评测 Chroma（最容易设置，不需要额外服务）
         print("\n\n>>> 评测 Chroma <<<")
         try:
@@ -205,6 +399,16 @@ class RAGBenchmark:
         except Exception as e:
             print(f"✗ Chroma 评测跳过: {e}")
         
+        # 评测 NumPy（进程内暴力检索，不需要额外服务）
+        print("\n\n>>> 评测 NumPy <<<")
+        try:
+            numpy_store = NumpyVectorStore("benchmark_numpy")
+            numpy_results = self.benchmark_vector_store("NumPy", numpy_store)
+            all_results.append(numpy_results)
+            numpy_store.drop_collection()
+        except Exception as e:
+            print(f"✗ NumPy 评测跳过: {e}")
+        
         # 评测 Qdrant（需要 Qdrant 服务运行）
         print("\n\n>>> 评测 Qdrant <<<")
         try:
@@ -233,6 +437,18 @@ class RAGBenchmark:
             self.benchmark_reranking()
         except Exception as e:
             print(f"✗ 重排序评测失败: {e}")
+        
+        # 评测 IVF-PQ 压缩索引
+        try:
+            self.benchmark_ivfpq()
+        except Exception as e:
+            print(f"✗ IVF-PQ 评测失败: {e}")
+        
+        # 评测 embedding 推理后端
+        try:
+            self.benchmark_embedding_backends()
+        except Exception as e:
+            print(f"✗ Embedding 后端评测失败: {e}")
     
     def _print_summary(self, results: List[Dict]):
         """打印评测汇总"""
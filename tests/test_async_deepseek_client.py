@@ -0,0 +1,162 @@
+"""
+AsyncDeepSeekClient 测试
+在本地启动一个 OpenAI 兼容的桩服务，验证并发上限、失败重试，以及同一实例可在多个事件循环中使用
+
+运行：python -m pytest tests/test_async_deepseek_client.py 或 python tests/test_async_deepseek_client.py
+"""
+import sys
+import os
+
+# 获取项目根目录的绝对路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.llm.deepseek_client import AsyncDeepSeekClient
+
+
+class StubServer:
+    """OpenAI 兼容的 /chat/completions 桩服务（记录请求数和最大并发数）"""
+    
+    def __init__(self, delay: float = 0.05, failures: int = 0):
+        """
+        启动桩服务
+        
+        Args:
+            delay: 每个请求的处理时间（秒）
+            failures: 前若干个请求返回 500
+        """
+        self.delay = delay
+        self.failures = failures
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+    
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+    
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def _handler(self):
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests += 1
+                    fail = stub.requests <= stub.failures
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                time.sleep(stub.delay)
+                with stub._lock:
+                    stub.in_flight -= 1
+                
+                if fail:
+                    payload, status = {"error": {"message": "stub failure"}}, 500
+                else:
+                    payload, status = {
+                        "id": "stub",
+                        "object": "chat.completion",
+                        "created": 0,
+                        "model": body["model"],
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": body["messages"][-1]["content"]},
+                            "finish_reason": "stop",
+                        }],
+                    }, 200
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+        
+        return Handler
+
+
+def _make_client(server: StubServer, **kwargs) -> AsyncDeepSeekClient:
+    return AsyncDeepSeekClient(api_key="test", base_url=server.base_url, model="stub", **kwargs)
+
+
+def test_concurrency_limit():
+    """同时发起的请求数不超过 max_concurrency"""
+    server = StubServer(delay=0.05)
+    client = _make_client(server, max_concurrency=3)
+    
+    async def run():
+        messages = [[{"role": "user", "content": f"q{i}"}] for i in range(12)]
+        results = await asyncio.gather(*(client.chat(m) for m in messages))
+        await client.aclose()
+        return results
+    
+    try:
+        results = asyncio.run(run())
+        assert results == [f"q{i}" for i in range(12)]
+        assert server.max_in_flight <= 3
+    finally:
+        server.close()
+
+
+def test_retry_on_server_error():
+    """服务端错误按退避重试，成功后返回结果"""
+    server = StubServer(delay=0, failures=2)
+    client = _make_client(server, max_retries=3, backoff_base=0.01)
+    
+    async def run():
+        result = await client.chat([{"role": "user", "content": "hello"}])
+        await client.aclose()
+        return result
+    
+    try:
+        assert asyncio.run(run()) == "hello"
+        assert server.requests == 3
+    finally:
+        server.close()
+
+
+def test_multiple_event_loops():
+    """同一实例先后在多个 asyncio.run() 和另一个线程的事件循环中使用"""
+    server = StubServer(delay=0.01)
+    client = _make_client(server, max_concurrency=2)
+    
+    async def run(tag: str):
+        return await asyncio.gather(*(client.chat([{"role": "user", "content": f"{tag}{i}"}]) for i in range(4)))
+    
+    results = {}
+    
+    def in_thread():
+        results["thread"] = asyncio.run(run("t"))
+    
+    try:
+        assert asyncio.run(run("a")) == ["a0", "a1", "a2", "a3"]
+        assert asyncio.run(run("b")) == ["b0", "b1", "b2", "b3"]
+        thread = threading.Thread(target=in_thread)
+        thread.start()
+        thread.join()
+        assert results["thread"] == ["t0", "t1", "t2", "t3"]
+        assert server.max_in_flight <= 2
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    for test in (test_concurrency_limit, test_retry_on_server_error, test_multiple_event_loops):
+        test()
+        print(f"✓ {test.__name__}")
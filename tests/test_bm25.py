@@ -0,0 +1,319 @@
+"""
+BM25 检索测试
+与按 rank_bm25（BM25Okapi）公式实现的参考打分对比：每个结果的分数、top-k 的分数序列，以及增删文档后的结果
+
+运行：python -m pytest tests/test_bm25.py 或 python tests/test_bm25.py
+"""
+import sys
+import os
+
+# 获取项目根目录的绝对路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import math
+import random
+import tempfile
+from collections import Counter
+from typing import Dict, List, Tuple
+import pytest
+from src.retrievers.bm25_retriever import BM25Retriever
+from src.retrievers.bm25_segments import SegmentedIndex
+from src.retrievers.bm25_shards import ShardedIndex
+
+
+def word(i: int) -> str:
+    """第 i 个词（纯字母，各种分词模式下都保持为一个词）"""
+    return "w" + "".join(chr(ord("a") + int(digit)) for digit in str(i))
+
+
+# 覆盖单词、多词、重复词、负 idf 的高频词和不存在的词
+QUERIES = [
+    [word(0)],
+    [word(3), word(50)],
+    ["common", word(1), word(120)],
+    [word(7), word(7), word(9)],
+    ["missing"],
+]
+
+
+def reference_scores(
+    corpus: List[List[str]],
+    query: List[str],
+    k1: float = 1.5,
+    b: float = 0.75,
+    epsilon: float = 0.25
+) -> List[float]:
+    """参考 BM25 打分（与 rank_bm25.BM25Okapi.get_scores 相同：负 idf 取 epsilon × 平均 idf）"""
+    num_docs = len(corpus)
+    avgdl = sum(len(tokens) for tokens in corpus) / num_docs
+    df = Counter(term for tokens in corpus for term in set(tokens))
+    idf = {term: math.log(num_docs - freq + 0.5) - math.log(freq + 0.5) for term, freq in df.items()}
+    floor = epsilon * sum(idf.values()) / len(idf)
+    idf = {term: value if value >= 0 else floor for term, value in idf.items()}
+    
+    scores = []
+    for tokens in corpus:
+        tf = Counter(tokens)
+        norm = k1 * (1 - b + b * len(tokens) / avgdl)
+        scores.append(sum(idf.get(term, 0.0) * tf[term] * (k1 + 1) / (tf[term] + norm) for term in query))
+    return scores
+
+
+def make_corpus(num_docs: int, seed: int = 0, prefix: str = "doc") -> Dict[str, List[str]]:
+    """合成语料：词按 Zipf 分布抽取，"common" 出现在约 80% 的文档中（idf 为负）"""
+    rng = random.Random(seed)
+    vocab = [word(i) for i in range(200)]
+    weights = [1 / (i + 1) for i in range(len(vocab))]
+    corpus = {}
+    for i in range(num_docs):
+        tokens = rng.choices(vocab, weights, k=rng.randrange(5, 40))
+        if rng.random() < 0.8:
+            tokens.append("common")
+        corpus[f"{prefix}{i}"] = tokens
+    return corpus
+
+
+def as_documents(corpus: Dict[str, List[str]]) -> List[dict]:
+    return [{"id": doc_id, "content": " ".join(tokens)} for doc_id, tokens in corpus.items()]
+
+
+def assert_matches_reference(
+    results: List[Tuple[str, float]],
+    corpus: Dict[str, List[str]],
+    query: List[str],
+    top_k: int
+):
+    """得分为正的结果是参考打分的 top-k（同分文档的先后不限），且每个结果的分数与参考一致"""
+    scores = dict(zip(corpus, reference_scores(list(corpus.values()), query)))
+    expected = sorted((score for score in scores.values() if score > 0), reverse=True)[:top_k]
+    positive = [(doc_id, score) for doc_id, score in results if score > 0]
+    assert [score for _, score in positive] == pytest.approx(expected, rel=1e-6)
+    for doc_id, score in positive:
+        assert score == pytest.approx(scores[doc_id], rel=1e-6)
+
+
+def test_scores_match_reference():
+    """全部查询的 top-10 和全量结果都与参考打分一致"""
+    corpus = make_corpus(500)
+    retriever = BM25Retriever()
+    retriever.index_documents(as_documents(corpus))
+    
+    for query in QUERIES:
+        for top_k in (10, len(corpus)):
+            assert_matches_reference(retriever.search(" ".join(query), top_k), corpus, query, top_k)
+
+
+def test_add_and_delete_documents():
+    """追加和删除文档后，统计量和结果按存活文档重新计算"""
+    corpus = make_corpus(300)
+    retriever = BM25Retriever()
+    retriever.index_documents(as_documents(corpus))
+    
+    added = make_corpus(100, seed=1, prefix="new")
+    retriever.add_documents(as_documents(added))
+    corpus.update(added)
+    deleted = [f"doc{i}" for i in range(0, 300, 3)] + ["new5"]
+    retriever.delete_documents(deleted)
+    for doc_id in deleted:
+        del corpus[doc_id]
+    
+    assert len(retriever) == len(corpus)
+    assert "doc1" in retriever and "new6" in retriever
+    assert "doc0" not in retriever and "new5" not in retriever
+    for query in QUERIES:
+        results = retriever.search(" ".join(query), 20)
+        assert not set(doc_id for doc_id, _ in results) & set(deleted)
+        assert_matches_reference(results, corpus, query, 20)
+
+
+
+def test_pruning_matches_exhaustive():
+    """MaxScore 剪枝的结果与穷举打分完全相同"""
+    # 倒排表总长度超过剪枝阈值；稀有词 + 中频词的查询会跳过大部分块
+    corpus = make_corpus(20000, seed=2)
+    pruned = BM25Retriever(enable_pruning=True)
+    exhaustive = BM25Retriever(enable_pruning=False)
+    for retriever in (pruned, exhaustive):
+        retriever.index_documents(as_documents(corpus))
+    
+    queries = [
+        [word(150), word(6), word(8), word(10)],
+        [word(199), word(5), word(5)],
+        [word(120), word(12), word(14), word(16), word(18)],
+        ["common", word(0), word(150)],
+    ]
+    for query in queries:
+        for top_k in (1, 10, 100):
+            results = pruned.search(" ".join(query), top_k)
+            assert results == exhaustive.search(" ".join(query), top_k)
+        assert_matches_reference(results, corpus, query, top_k)
+
+
+
+def test_save_load_round_trip():
+    """保存后重新加载，检索结果不变，且加载后可以继续增删文档"""
+    corpus = make_corpus(500, seed=3)
+    retriever = BM25Retriever()
+    retriever.index_documents(as_documents(corpus))
+    retriever.delete_documents(["doc0", "doc1"])
+    del corpus["doc0"], corpus["doc1"]
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bm25.idx")
+        retriever.save(path)
+        loaded = BM25Retriever()
+        loaded.load(path)
+        
+        assert len(loaded) == len(corpus)
+        assert "doc2" in loaded and "doc0" not in loaded
+        for query in QUERIES:
+            assert loaded.search(" ".join(query), 20) == retriever.search(" ".join(query), 20)
+        
+        added = make_corpus(50, seed=4, prefix="new")
+        loaded.add_documents(as_documents(added))
+        loaded.delete_documents(["doc2"])
+        corpus.update(added)
+        del corpus["doc2"]
+        assert len(loaded) == len(corpus)
+        for query in QUERIES:
+            assert_matches_reference(loaded.search(" ".join(query), 20), corpus, query, 20)
+
+
+
+def test_retriever_updates_existing_ids():
+    """再次索引已存在的 ID 时替换旧版本，不产生重复结果"""
+    corpus = make_corpus(200, seed=5)
+    retriever = BM25Retriever()
+    retriever.index_documents(as_documents(corpus))
+    updated = make_corpus(50, seed=6)
+    retriever.index_documents(as_documents(updated))
+    corpus.update(updated)
+    
+    assert len(retriever) == len(corpus)
+    for query in QUERIES:
+        results = retriever.search(" ".join(query), len(corpus))
+        assert len(set(doc_id for doc_id, _ in results)) == len(results)
+        assert_matches_reference(results, corpus, query, len(corpus))
+
+
+def _fill_segments(index: SegmentedIndex, corpus: Dict[str, List[str]], batch_size: int = 25):
+    """按批写入（每批不足 flush_docs，多批后刷成一个段）"""
+    doc_ids = list(corpus)
+    for start in range(0, len(doc_ids), batch_size):
+        batch = doc_ids[start:start + batch_size]
+        index.add(batch, [corpus[doc_id] for doc_id in batch])
+
+
+def test_segmented_index_update_delete_merge():
+    """多段索引在更新、删除和合并后，统计量与结果都按存活文档计算"""
+    corpus = make_corpus(400, seed=7)
+    index = SegmentedIndex(flush_docs=50, merge_factor=3, background_merge=False)
+    _fill_segments(index, corpus)
+    
+    # 更新分布在早期段中的文档，删除集中在中间的几个段（触发重写）
+    updated = make_corpus(40, seed=8)
+    index.add(list(updated), list(updated.values()))
+    corpus.update(updated)
+    deleted = [f"doc{i}" for i in range(150, 260)]
+    assert index.delete(deleted + ["missing"]) == len(deleted)
+    for doc_id in deleted:
+        del corpus[doc_id]
+    index.refresh()
+    
+    # 8 次刷新的段经过合并后段数更少
+    assert 1 <= index.num_segments < 8
+    assert len(index) == len(corpus)
+    assert "doc0" in index and "doc150" not in index
+    for query in QUERIES:
+        for top_k in (10, len(corpus)):
+            results = index.top_k(query, top_k)
+            assert len(set(doc_id for doc_id, _ in results)) == len(results)
+            assert_matches_reference(results, corpus, query, top_k)
+    index.close()
+
+
+def test_segmented_index_background_merge():
+    """后台合并线程合并段时，检索结果不变"""
+    corpus = make_corpus(600, seed=9)
+    index = SegmentedIndex(flush_docs=20, merge_factor=4, background_merge=True)
+    try:
+        _fill_segments(index, corpus, batch_size=20)
+        index.delete([f"doc{i}" for i in range(0, 600, 5)])
+        for doc_id in [f"doc{i}" for i in range(0, 600, 5)]:
+            del corpus[doc_id]
+        before = {tuple(query): index.top_k(query, 20) for query in QUERIES}
+        
+        index.wait_for_merges()
+        assert index.num_segments < 30
+        for query in QUERIES:
+            assert index.top_k(query, 20) == before[tuple(query)]
+            assert_matches_reference(index.top_k(query, 20), corpus, query, 20)
+    finally:
+        index.close()
+
+
+
+def test_sharded_index_matches_single_index():
+    """分片索引按全局统计打分，scatter-gather 合并后的结果与单个索引相同"""
+    corpus = make_corpus(600, seed=10)
+    single = SegmentedIndex(flush_docs=50, background_merge=False)
+    sharded = ShardedIndex(3, flush_docs=50, background_merge=False)
+    try:
+        for index in (single, sharded):
+            _fill_segments(index, corpus, batch_size=40)
+            index.add(["doc1", "doc2"], [[word(3), word(50)], [word(3)]])
+            index.delete([f"doc{i}" for i in range(100, 200)])
+        corpus.update({"doc1": [word(3), word(50)], "doc2": [word(3)]})
+        for i in range(100, 200):
+            del corpus[f"doc{i}"]
+        
+        assert len(sharded) == len(single) == len(corpus)
+        assert "doc1" in sharded and "doc150" not in sharded
+        for query in QUERIES:
+            for top_k in (1, 10, len(corpus)):
+                results = sharded.top_k(query, top_k)
+                assert results == single.top_k(query, top_k)
+                assert_matches_reference(results, corpus, query, top_k)
+    finally:
+        single.close()
+        sharded.close()
+
+
+def test_sharded_save_load_round_trip():
+    """分片索引保存为清单 + 分片文件，加载后分片数和检索结果不变"""
+    corpus = make_corpus(300, seed=11)
+    retriever = BM25Retriever(num_shards=2)
+    loaded = BM25Retriever()
+    try:
+        retriever.index_documents(as_documents(corpus))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bm25.idx")
+            retriever.save(path)
+            loaded.load(path)
+            
+            assert loaded.num_shards == 2
+            assert len(loaded) == len(corpus)
+            for query in QUERIES:
+                assert loaded.search(" ".join(query), 20) == retriever.search(" ".join(query), 20)
+    finally:
+        retriever.close()
+        loaded.close()
+
+
+if __name__ == "__main__":
+    tests = (
+        test_scores_match_reference,
+        test_add_and_delete_documents,
+        test_pruning_matches_exhaustive,
+        test_save_load_round_trip,
+        test_retriever_updates_existing_ids,
+        test_segmented_index_update_delete_merge,
+        test_segmented_index_background_merge,
+        test_sharded_index_matches_single_index,
+        test_sharded_save_load_round_trip,
+    )
+    for test in tests:
+        test()
+        print(f"✓ {test.__name__}")
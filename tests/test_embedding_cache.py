@@ -0,0 +1,129 @@
+"""
+EmbeddingCache 测试
+验证读写往返、重复文本只写一次、重新打开后的持久化、不同模型隔离，以及中途退出留下的不完整行被截掉
+
+运行：python -m pytest tests/test_embedding_cache.py 或 python tests/test_embedding_cache.py
+"""
+import sys
+import os
+
+# 获取项目根目录的绝对路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import tempfile
+import numpy as np
+import pytest
+from src.utils.embedding_cache import EmbeddingCache
+
+
+DIMENSION = 16
+
+
+def random_embeddings(count: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, DIMENSION)).astype(np.float32)
+
+
+def test_round_trip_and_misses():
+    """命中的向量按输入顺序返回（float32 无损，float16 在半精度误差内），未缓存的为 None"""
+    texts = ["alpha", "beta", "gamma"]
+    embeddings = random_embeddings(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype, tolerance in (("float32", 0), ("float16", 1e-2)):
+            cache = EmbeddingCache(tmp, "model", DIMENSION, dtype=dtype)
+            assert cache.get_many(texts) == [None, None, None]
+            cache.put_many(texts, embeddings)
+            
+            results = cache.get_many(["gamma", "delta", "alpha"])
+            assert results[1] is None
+            assert results[0].dtype == np.float32
+            np.testing.assert_allclose(results[0], embeddings[2], atol=tolerance)
+            np.testing.assert_allclose(results[2], embeddings[0], atol=tolerance)
+            assert cache.stats() == {"size": 3, "hits": 2, "misses": 4, "hit_rate": 2 / 6}
+            cache.close()
+
+
+def test_duplicates_written_once():
+    """同一批中的重复文本和已缓存的文本都不会再写入"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(tmp, "model", DIMENSION, dtype="float32")
+        embeddings = random_embeddings(3)
+        cache.put_many(["a", "b", "a"], embeddings)
+        assert len(cache) == 2
+        # 重复文本以第一次出现的向量为准
+        np.testing.assert_array_equal(cache.get_many(["a"])[0], embeddings[0])
+        
+        cache.put_many(["b", "c"], random_embeddings(2, seed=1))
+        assert len(cache) == 3
+        np.testing.assert_array_equal(cache.get_many(["b"])[0], embeddings[1])
+        
+        vectors_file = os.path.join(cache.directory, "vectors-float32.bin")
+        assert os.path.getsize(vectors_file) == 3 * DIMENSION * 4
+        cache.close()
+
+
+def test_reopen_and_model_isolation():
+    """重新打开后缓存仍然可用；不同模型互不混用，维度不一致或精度不支持时报错"""
+    embeddings = random_embeddings(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(tmp, "model-a", DIMENSION, dtype="float32")
+        cache.put_many(["x", "y"], embeddings)
+        cache.close()
+        
+        reopened = EmbeddingCache(tmp, "model-a", DIMENSION, dtype="float32")
+        assert len(reopened) == 2
+        np.testing.assert_array_equal(np.stack(reopened.get_many(["x", "y"])), embeddings)
+        # 重新打开后继续追加
+        reopened.put_many(["z"], random_embeddings(1, seed=2))
+        assert reopened.get_many(["z"])[0] is not None
+        reopened.close()
+        
+        other = EmbeddingCache(tmp, "model-b", DIMENSION, dtype="float32")
+        assert other.get_many(["x"]) == [None]
+        other.close()
+        
+        with pytest.raises(ValueError):
+            EmbeddingCache(tmp, "model-a", DIMENSION * 2)
+        with pytest.raises(ValueError):
+            EmbeddingCache(tmp, "model-c", DIMENSION, dtype="int8")
+
+
+def test_partial_rows_truncated_on_open():
+    """进程中途退出留下的不完整向量行和没有向量的键在打开时被截掉"""
+    embeddings = random_embeddings(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(tmp, "model", DIMENSION, dtype="float32")
+        cache.put_many(["x", "y"], embeddings)
+        cache.close()
+        
+        keys_file = os.path.join(cache.directory, "keys-float32.bin")
+        vectors_file = os.path.join(cache.directory, "vectors-float32.bin")
+        with open(vectors_file, "ab") as f:
+            f.write(b"\1" * (DIMENSION * 4 + 5))  # 一整行向量加半行
+        with open(keys_file, "ab") as f:
+            f.write(b"\2" * 3)  # 键只写了一部分
+        
+        reopened = EmbeddingCache(tmp, "model", DIMENSION, dtype="float32")
+        assert len(reopened) == 2
+        assert os.path.getsize(vectors_file) == 2 * DIMENSION * 4
+        assert os.path.getsize(keys_file) == 2 * EmbeddingCache.KEY_BYTES
+        np.testing.assert_array_equal(np.stack(reopened.get_many(["x", "y"])), embeddings)
+        
+        reopened.put_many(["z"], random_embeddings(1, seed=3))
+        reopened.close()
+        final = EmbeddingCache(tmp, "model", DIMENSION, dtype="float32")
+        assert len(final) == 3
+        final.close()
+
+
+if __name__ == "__main__":
+    tests = (
+        test_round_trip_and_misses,
+        test_duplicates_written_once,
+        test_reopen_and_model_isolation,
+        test_partial_rows_truncated_on_open,
+    )
+    for test in tests:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,213 @@
+"""
+增量索引测试
+验证 IndexManifest 的运行编号与过期记录，以及 sync_documents 对新增、未变化、更新、删除和写入失败文档的处理
+
+运行：python -m pytest tests/test_index_manifest.py 或 python tests/test_index_manifest.py
+"""
+import sys
+import os
+
+# 获取项目根目录的绝对路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import hashlib
+import tempfile
+import numpy as np
+import src.rag_engine as rag_engine
+from typing import Dict, List
+from src.core.models import Document
+from src.utils.index_manifest import IndexManifest, ManifestEntry
+from src.vectorstores.vector_store_base import RAGVectorStore
+
+
+DIMENSION = 8
+
+
+class FakeEmbeddingManager:
+    """按文本哈希生成固定向量，替代真实 embedding 模型"""
+    
+    dimension = DIMENSION
+    
+    def __init__(self):
+        self.encoded = 0  # 已编码的文本数
+    
+    def encode_array(self, texts, batch_size: int = 32, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        self.encoded += len(texts)
+        rows = [
+            np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest()[:DIMENSION], dtype=np.uint8)
+            for text in texts
+        ]
+        return np.array(rows, dtype=np.float32).reshape(len(texts), DIMENSION)
+    
+    def encode(self, texts, **kwargs) -> List[List[float]]:
+        return self.encode_array(texts, **kwargs).tolist()
+    
+    def encode_query(self, texts, **kwargs) -> np.ndarray:
+        embeddings = self.encode_array(texts)
+        return embeddings[0] if isinstance(texts, str) else embeddings
+    
+    def close(self):
+        pass
+
+
+class MemoryVectorStore(RAGVectorStore):
+    """内存向量库，可以让写入失败"""
+    
+    def __init__(self, collection_name: str = "sync_test"):
+        super().__init__(collection_name)
+        self.documents: Dict[str, Document] = {}
+        self.fail_upserts = False
+    
+    def batch_upsert(self, documents: List[Document]) -> bool:
+        if self.fail_upserts:
+            return False
+        for doc in documents:
+            self.documents[doc.id] = doc
+        return True
+    
+    def search(self, query_embedding, top_k: int = 10, filters=None):
+        return []
+    
+    def delete(self, doc_ids: List[str]) -> bool:
+        for doc_id in doc_ids:
+            self.documents.pop(doc_id, None)
+        return True
+    
+    def get_collection_stats(self):
+        return {"num_entities": len(self.documents)}
+    
+    def create_collection(self, dimension: int) -> bool:
+        return True
+    
+    def drop_collection(self) -> bool:
+        self.documents.clear()
+        return True
+
+
+def run_in_tempdir(test_body):
+    """在临时目录中创建引擎并运行测试（清单和文档库文件都写到临时目录）"""
+    original_cwd = os.getcwd()
+    original_manager = rag_engine.EmbeddingManager
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        rag_engine.EmbeddingManager = FakeEmbeddingManager
+        store = MemoryVectorStore()
+        engine = rag_engine.AdvancedRAGEngine(store, manifest_path=os.path.join(tmp, "manifest.db"))
+        try:
+            test_body(engine, store)
+        finally:
+            engine.close()
+            rag_engine.EmbeddingManager = original_manager
+            os.chdir(original_cwd)
+
+
+def corpus(**contents) -> List[Document]:
+    return [Document(id=doc_id, content=content, metadata={"source": doc_id}) for doc_id, content in contents.items()]
+
+
+def test_manifest_runs_and_stale_entries():
+    """本次同步未标记的记录即为过期记录，删除后不再出现"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = IndexManifest(os.path.join(tmp, "manifest.db"))
+        first = manifest.begin_run()
+        manifest.put_many(
+            {
+                "a": ManifestEntry("h1", "f", ["a"]),
+                "b": ManifestEntry("h2", "f", ["b#0", "b#1"]),
+                "c": ManifestEntry("h3", "f", ["c"]),
+            },
+            first
+        )
+        assert len(manifest) == 3
+        assert manifest.get_many(["b", "x"]) == {"b": ManifestEntry("h2", "f", ["b#0", "b#1"])}
+        
+        second = manifest.begin_run()
+        assert second == first + 1
+        manifest.touch_many(["a"], second)
+        manifest.put_many({"c": ManifestEntry("h4", "f", ["c"])}, second)
+        assert manifest.stale_entries(second) == [("b", ["b#0", "b#1"])]
+        
+        manifest.delete_many(["b"])
+        assert manifest.stale_entries(second) == []
+        assert set(manifest.get_many(["a", "b", "c"])) == {"a", "c"}
+        manifest.close()
+        
+        # 运行编号持久化，重新打开后继续递增
+        reopened = IndexManifest(os.path.join(tmp, "manifest.db"))
+        assert reopened.begin_run() == second + 1
+        assert len(reopened) == 2
+        reopened.close()
+
+
+def test_hash_and_fingerprint():
+    """内容或元数据变化时哈希变化，元数据键的顺序不影响哈希；指纹与参数顺序无关"""
+    doc = Document(id="a", content="text", metadata={"x": 1, "y": 2})
+    same = Document(id="b", content="text", metadata={"y": 2, "x": 1})
+    assert IndexManifest.compute_hash(doc) == IndexManifest.compute_hash(same)
+    assert IndexManifest.compute_hash(doc) != IndexManifest.compute_hash(Document(id="a", content="text!", metadata={"x": 1, "y": 2}))
+    assert IndexManifest.compute_hash(doc) != IndexManifest.compute_hash(Document(id="a", content="text", metadata={"x": 2, "y": 2}))
+    
+    assert IndexManifest.compute_fingerprint({"a": 1, "b": 2}) == IndexManifest.compute_fingerprint({"b": 2, "a": 1})
+    assert IndexManifest.compute_fingerprint({"a": 1}) != IndexManifest.compute_fingerprint({"a": 2})
+
+
+def test_sync_counts_added_unchanged_updated_deleted():
+    """第二次同步只重新 embedding 变化的文档，删除未出现的文档"""
+    def body(engine, store):
+        counts = engine.sync_documents(corpus(a="alpha", b="beta", c="gamma"), batch_size=2, show_progress=False)
+        assert counts == {"unchanged": 0, "added": 3, "updated": 0, "deleted": 0, "failed": 0}
+        assert set(store.documents) == {"a", "b", "c"}
+        assert len(engine.manifest) == 3
+        encoded = engine.embedding_manager.encoded
+        
+        counts = engine.sync_documents(corpus(a="alpha", b="beta v2", d="delta"), batch_size=2, show_progress=False)
+        assert counts == {"unchanged": 1, "added": 1, "updated": 1, "deleted": 1, "failed": 0}
+        assert engine.embedding_manager.encoded - encoded == 2
+        assert set(store.documents) == {"a", "b", "d"}
+        assert store.documents["b"].content == "beta v2"
+        assert set(engine.manifest.get_many(["a", "b", "c", "d"])) == {"a", "b", "d"}
+        assert "c" not in engine.bm25_retriever
+        
+        # 不传 delete_missing 时保留未出现的文档
+        counts = engine.sync_documents(corpus(a="alpha"), delete_missing=False, show_progress=False)
+        assert counts["unchanged"] == 1 and counts["deleted"] == 0
+        assert set(store.documents) == {"a", "b", "d"}
+    
+    run_in_tempdir(body)
+
+
+def test_failed_write_keeps_old_chunks_for_retry():
+    """写入失败时旧块和清单记录都保留，文档不会被当作已删除清理，下次同步重试"""
+    def body(engine, store):
+        engine.sync_documents(corpus(a="alpha", b="beta"), show_progress=False)
+        old_entry = engine.manifest.get_many(["a"])["a"]
+        
+        store.fail_upserts = True
+        counts = engine.sync_documents(corpus(a="alpha v2", b="beta", c="gamma"), show_progress=False)
+        assert counts == {"unchanged": 1, "added": 0, "updated": 0, "deleted": 0, "failed": 2}
+        assert store.documents["a"].content == "alpha"
+        assert engine.manifest.get_many(["a", "c"]) == {"a": old_entry}
+        
+        store.fail_upserts = False
+        counts = engine.sync_documents(corpus(a="alpha v2", b="beta", c="gamma"), show_progress=False)
+        assert counts == {"unchanged": 1, "added": 1, "updated": 1, "deleted": 0, "failed": 0}
+        assert store.documents["a"].content == "alpha v2"
+        assert set(store.documents) == {"a", "b", "c"}
+    
+    run_in_tempdir(body)
+
+
+if __name__ == "__main__":
+    tests = (
+        test_manifest_runs_and_stale_entries,
+        test_hash_and_fingerprint,
+        test_sync_counts_added_unchanged_updated_deleted,
+        test_failed_write_keeps_old_chunks_for_retry,
+    )
+    for test in tests:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,108 @@
+"""
+LRUCache 测试
+验证容量淘汰顺序、过期时间、命中统计和多线程并发读写
+
+运行：python -m pytest tests/test_lru_cache.py 或 python tests/test_lru_cache.py
+"""
+import sys
+import os
+
+# 获取项目根目录的绝对路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import threading
+import time
+from src.utils.lru_cache import LRUCache
+
+
+def test_evicts_least_recently_used():
+    """超过容量时淘汰最久未使用的条目，读取和覆盖写入都会刷新使用顺序"""
+    cache = LRUCache(max_size=3)
+    for key in "abc":
+        cache.put(key, key.upper())
+    
+    assert cache.get("a") == "A"  # a 变为最近使用
+    cache.put("d", "D")  # 淘汰 b
+    assert cache.get("b") is None
+    assert len(cache) == 3
+    
+    cache.put("c", "C2")  # 覆盖写入也刷新顺序
+    cache.put("e", "E")  # 淘汰 a
+    assert cache.get("a", "missing") == "missing"
+    assert [cache.get(key) for key in "cde"] == ["C2", "D", "E"]
+
+
+def test_zero_size_disables_cache():
+    cache = LRUCache(max_size=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_expires_entries():
+    """超过 ttl 的条目视为不存在并被移除；ttl 为 0 时不过期"""
+    cache = LRUCache(max_size=10, ttl=0.05)
+    cache.put("old", 1)
+    time.sleep(0.1)
+    cache.put("new", 2)
+    assert cache.get("old") is None
+    assert cache.get("new") == 2
+    assert len(cache) == 1
+    
+    no_expiry = LRUCache(max_size=10, ttl=0)
+    no_expiry.put("a", 1)
+    time.sleep(0.06)
+    assert no_expiry.get("a") == 1
+
+
+def test_stats_count_hits_and_misses():
+    """命中统计在 clear() 之后保留"""
+    cache = LRUCache(max_size=10)
+    assert cache.stats() == {"size": 0, "hits": 0, "misses": 0, "hit_rate": 0.0}
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+    cache.clear()
+    cache.get("a")
+    assert cache.stats() == {"size": 0, "hits": 2, "misses": 2, "hit_rate": 0.5}
+
+
+def test_concurrent_access_stays_bounded():
+    """多线程同时读写时容量不超限，统计数与调用次数一致"""
+    cache = LRUCache(max_size=50)
+    threads_count, operations = 8, 2000
+    barrier = threading.Barrier(threads_count)
+    
+    def worker(seed):
+        barrier.wait()
+        for i in range(operations):
+            key = (seed * 7 + i) % 100
+            if cache.get(key) is None:
+                cache.put(key, key)
+    
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    stats = cache.stats()
+    assert len(cache) == 50
+    assert stats["hits"] + stats["misses"] == threads_count * operations
+    assert all(cache.get(key, key) == key for key in range(100))
+
+
+if __name__ == "__main__":
+    tests = (
+        test_evicts_least_recently_used,
+        test_zero_size_disables_cache,
+        test_ttl_expires_entries,
+        test_stats_count_hits_and_misses,
+        test_concurrent_access_stays_bounded,
+    )
+    for test in tests:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,128 @@
+"""
+StreamingPipeline 测试
+验证批次顺序、阶段并行、有界队列的背压、异常传播，以及 iter_batches 的惰性切分
+
+运行：python -m pytest tests/test_pipeline.py 或 python tests/test_pipeline.py
+"""
+import sys
+import os
+
+# 获取项目根目录的绝对路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import itertools
+import threading
+import time
+import pytest
+from src.utils.pipeline import StreamingPipeline, iter_batches
+
+
+def test_iter_batches_is_lazy():
+    """按需从生成器读取，最后一批可以不满"""
+    consumed = []
+    
+    def numbers():
+        for i in range(10):
+            consumed.append(i)
+            yield i
+    
+    batches = iter_batches(numbers(), 4)
+    assert next(batches) == [0, 1, 2, 3]
+    assert consumed == [0, 1, 2, 3]
+    assert list(batches) == [[4, 5, 6, 7], [8, 9]]
+    assert list(iter_batches([], 4)) == []
+
+
+def test_batches_flow_through_stages_in_order():
+    """每个阶段按输入顺序处理批次，返回 None 的批次不再传递，统计按输入批次长度累计"""
+    output = []
+    pipeline = StreamingPipeline(
+        [
+            ("double", lambda batch: [x * 2 for x in batch]),
+            ("drop_first", lambda batch: None if batch[0] == 0 else batch),
+            ("collect", output.extend),
+        ],
+        queue_size=2
+    )
+    stats = pipeline.run(iter_batches(range(20), 3))
+    
+    assert output == [x * 2 for x in range(3, 20)]
+    assert stats["double"].items == 20 and stats["double"].batches == 7
+    assert stats["drop_first"].items == 20
+    assert stats["collect"].items == 17 and stats["collect"].batches == 6
+
+
+def test_stages_run_concurrently():
+    """下游处理第 1 批时上游已在处理第 2 批（串行执行时会等待超时）"""
+    second_batch_started = threading.Event()
+    overlapped = []
+    
+    def produce(batch):
+        if batch == [1]:
+            second_batch_started.set()
+        return batch
+    
+    def consume(batch):
+        if batch == [0]:
+            overlapped.append(second_batch_started.wait(timeout=5))
+    
+    StreamingPipeline([("produce", produce), ("consume", consume)]).run([[0], [1], [2]])
+    assert overlapped == [True]
+
+
+def test_bounded_queues_limit_items_in_flight():
+    """最后一个阶段阻塞时，已读取的输入批次不超过 队列长度 × 阶段数 + 阶段数 + 1"""
+    queue_size = 2
+    read = itertools.count()
+    release = threading.Event()
+    
+    def batches():
+        for i in range(100):
+            next(read)
+            yield [i]
+    
+    def slow(batch):
+        release.wait(timeout=5)
+    
+    pipeline = StreamingPipeline([("a", lambda b: b), ("b", lambda b: b), ("slow", slow)], queue_size=queue_size)
+    thread = threading.Thread(target=pipeline.run, args=(batches(),))
+    thread.start()
+    try:
+        # 等待上游填满队列
+        time.sleep(0.5)
+        assert next(read) <= queue_size * 3 + 3 + 1
+    finally:
+        release.set()
+        thread.join(timeout=10)
+    assert not thread.is_alive()
+
+
+def test_error_stops_pipeline_and_is_raised():
+    """阶段抛出的异常在 run() 中重新抛出，之后的批次不再处理，无限输入也不会挂起"""
+    processed = []
+    
+    def fail_on_three(batch):
+        if batch[0] == 3:
+            raise ValueError("boom")
+        return batch
+    
+    pipeline = StreamingPipeline([("check", fail_on_three), ("collect", processed.extend)], queue_size=1)
+    with pytest.raises(ValueError, match="boom"):
+        pipeline.run([i] for i in itertools.count())
+    assert 3 not in processed
+    assert processed == list(range(len(processed)))
+
+
+if __name__ == "__main__":
+    tests = (
+        test_iter_batches_is_lazy,
+        test_batches_flow_through_stages_in_order,
+        test_stages_run_concurrently,
+        test_bounded_queues_limit_items_in_flight,
+        test_error_stops_pipeline_and_is_raised,
+    )
+    for test in tests:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,238 @@
+"""
+NumpyVectorStore 测试
+验证精确检索、更新与删除、元数据过滤、压缩、只读共享和多线程并发写入
+
+运行：python -m pytest tests/test_vector_store_numpy.py 或 python tests/test_vector_store_numpy.py
+"""
+import sys
+import os
+
+# 获取项目根目录的绝对路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import tempfile
+import threading
+import numpy as np
+import pytest
+from typing import Dict, List, Optional
+from src.core.models import Document
+from src.vectorstores.vector_store_numpy import NumpyVectorStore
+
+
+DIMENSION = 16
+
+
+def make_documents(count: int, seed: int = 0, prefix: str = "doc") -> List[Document]:
+    rng = np.random.default_rng(seed)
+    return [
+        Document(
+            id=f"{prefix}{i}",
+            content=f"{prefix} content {i}",
+            metadata={"group": i % 3, "lang": "zh" if i % 2 else "en"},
+            embedding=rng.standard_normal(DIMENSION).tolist()
+        )
+        for i in range(count)
+    ]
+
+
+def brute_force(documents: Dict[str, Document], query: List[float], top_k: int,
+                filters: Optional[Dict] = None) -> List[str]:
+    """按余弦相似度排序的参考结果"""
+    query = np.asarray(query) / np.linalg.norm(query)
+    scored = []
+    for doc in documents.values():
+        if filters and any(doc.metadata.get(name) != value for name, value in filters.items()):
+            continue
+        vector = np.asarray(doc.embedding) / np.linalg.norm(doc.embedding)
+        scored.append((-float(vector @ query), doc.id))
+    return [doc_id for _, doc_id in sorted(scored)[:top_k]]
+
+
+def assert_matches(store: NumpyVectorStore, documents: Dict[str, Document], queries, top_k: int = 5,
+                   filters: Optional[Dict] = None):
+    for query in queries:
+        results = store.search(query, top_k=top_k, filters=filters)
+        assert [result.document.id for result in results] == brute_force(documents, query, top_k, filters)
+        for result in results:
+            doc = documents[result.document.id]
+            assert result.document.content == doc.content
+            assert result.document.metadata == doc.metadata
+
+
+def open_store(directory: str, **kwargs) -> NumpyVectorStore:
+    return NumpyVectorStore("test", directory=directory, **kwargs)
+
+
+def test_search_update_delete():
+    """检索结果与暴力计算一致；同 ID 写入覆盖旧文档，删除后不再返回"""
+    queries = [doc.embedding for doc in make_documents(5, seed=99)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        assert store.create_collection(DIMENSION)
+        documents = {doc.id: doc for doc in make_documents(200)}
+        assert store.batch_upsert(list(documents.values()))
+        assert_matches(store, documents, queries)
+        
+        updates = make_documents(50, seed=1)
+        assert store.batch_upsert(updates)
+        documents.update({doc.id: doc for doc in updates})
+        assert store.delete(["doc3", "doc150", "missing"])
+        del documents["doc3"], documents["doc150"]
+        assert_matches(store, documents, queries)
+        
+        stats = store.get_collection_stats()
+        assert stats["num_entities"] == 198
+        assert stats["rows"] == 250
+        
+        fetched = store.get_documents(["doc1", "doc3", "doc199"])
+        assert set(fetched) == {"doc1", "doc199"}
+        assert fetched["doc1"].content == documents["doc1"].content
+        assert fetched["doc1"].metadata == documents["doc1"].metadata
+        store.close()
+
+
+def test_filters_follow_updates():
+    """过滤条件在追加、更新元数据和删除之后仍与暴力计算一致"""
+    queries = [doc.embedding for doc in make_documents(3, seed=99)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.create_collection(DIMENSION)
+        documents = {doc.id: doc for doc in make_documents(120)}
+        store.batch_upsert(list(documents.values()))
+        for filters in ({"group": 1}, {"group": 2, "lang": "zh"}, {"group": 7}):
+            assert_matches(store, documents, queries, filters=filters)
+        
+        # 修改元数据、删除并追加新文档后，已缓存的过滤条件需要更新
+        moved = Document(id="doc4", content="moved", metadata={"group": 2, "lang": "zh"},
+                         embedding=documents["doc4"].embedding)
+        store.batch_upsert([moved] + make_documents(30, seed=2, prefix="new"))
+        store.delete(["doc5"])
+        documents["doc4"] = moved
+        documents.update({doc.id: doc for doc in make_documents(30, seed=2, prefix="new")})
+        del documents["doc5"]
+        for filters in ({"group": 1}, {"group": 2, "lang": "zh"}):
+            assert_matches(store, documents, queries, top_k=10, filters=filters)
+        
+        hits = store.search_hits_batch(queries, top_k=4, filters={"lang": "en"})
+        assert [[hit.id for hit in query_hits] for query_hits in hits] == [
+            brute_force(documents, query, 4, {"lang": "en"}) for query in queries
+        ]
+        store.close()
+
+
+def test_compaction_and_reopen():
+    """压缩后只保留有效行、检索结果不变，可以继续写入；重新打开后数据一致"""
+    queries = [doc.embedding for doc in make_documents(4, seed=99)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.create_collection(DIMENSION)
+        documents = {doc.id: doc for doc in make_documents(100)}
+        store.batch_upsert(list(documents.values()))
+        updates = make_documents(40, seed=3)
+        store.batch_upsert(updates)
+        documents.update({doc.id: doc for doc in updates})
+        store.delete([f"doc{i}" for i in range(60, 80)])
+        for i in range(60, 80):
+            del documents[f"doc{i}"]
+        
+        assert store.compact()
+        assert store.get_collection_stats()["rows"] == len(documents) == 80
+        assert_matches(store, documents, queries)
+        assert_matches(store, documents, queries, filters={"group": 0})
+        
+        extra = make_documents(10, seed=4, prefix="extra")
+        assert store.batch_upsert(extra)
+        documents.update({doc.id: doc for doc in extra})
+        assert_matches(store, documents, queries)
+        store.close()
+        
+        reopened = open_store(tmp)
+        assert reopened.get_collection_stats()["num_entities"] == 90
+        assert_matches(reopened, documents, queries)
+        reopened.close()
+
+
+def test_read_only_reader_sees_writes():
+    """只读实例在检索前读取写进程新追加的记录和压缩后的新代次，自身不能写入"""
+    queries = [doc.embedding for doc in make_documents(3, seed=99)]
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = open_store(tmp)
+        writer.create_collection(DIMENSION)
+        documents = {doc.id: doc for doc in make_documents(50)}
+        writer.batch_upsert(list(documents.values()))
+        
+        reader = open_store(tmp, read_only=True)
+        assert_matches(reader, documents, queries)
+        assert not reader.batch_upsert(make_documents(1, seed=5, prefix="r"))
+        assert not reader.delete(["doc1"])
+        
+        more = make_documents(20, seed=6, prefix="more")
+        writer.batch_upsert(more)
+        writer.delete(["doc0"])
+        documents.update({doc.id: doc for doc in more})
+        del documents["doc0"]
+        assert_matches(reader, documents, queries)
+        
+        writer.compact()
+        assert_matches(reader, documents, queries)
+        assert reader.get_collection_stats()["rows"] == 69
+        reader.close()
+        writer.close()
+
+
+def test_concurrent_upserts_and_searches():
+    """多个线程同时写入和检索，结束后所有文档都在且各自检索命中自身"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.create_collection(DIMENSION)
+        writers, batches, batch_size = 4, 5, 20
+        errors = []
+        done = threading.Event()
+        
+        def write(worker):
+            for batch in range(batches):
+                docs = make_documents(batch_size, seed=worker * 100 + batch, prefix=f"w{worker}b{batch}-")
+                if not store.batch_upsert(docs):
+                    errors.append((worker, batch))
+        
+        def search():
+            query = make_documents(1, seed=99)[0].embedding
+            while not done.is_set():
+                results = store.search(query, top_k=5, filters={"group": 1})
+                if any(result.document.metadata["group"] != 1 for result in results):
+                    errors.append("filter")
+        
+        searcher = threading.Thread(target=search)
+        searcher.start()
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        done.set()
+        searcher.join()
+        
+        assert errors == []
+        total = writers * batches * batch_size
+        assert store.get_collection_stats()["num_entities"] == total
+        for worker in range(writers):
+            doc = make_documents(batch_size, seed=worker * 100 + 2, prefix=f"w{worker}b2-")[7]
+            result = store.search(doc.embedding, top_k=1)[0]
+            assert result.document.id == doc.id
+            assert result.score == pytest.approx(1.0, abs=1e-5)
+        store.close()
+
+
+if __name__ == "__main__":
+    tests = (
+        test_search_update_delete,
+        test_filters_follow_updates,
+        test_compaction_and_reopen,
+        test_read_only_reader_sees_writes,
+        test_concurrent_upserts_and_searches,
+    )
+    for test in tests:
+        test()
+        print(f"✓ {test.__name__}")